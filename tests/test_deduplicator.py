@@ -0,0 +1,109 @@
+# Tests for Deduplicator: which files are taken for duplicates of which, and
+# how a duplicate is replaced by a link to its representative's conversion.
+# Run with python -m pytest, or python -m unittest from the directory above.
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video_container_convert as vcc
+
+
+class DeduplicatorTest(unittest.TestCase):
+	def setUp(self):
+		self.deduplicator = vcc.Deduplicator("hardlink")
+		self.directory = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def file_write(self, name, data):
+		path_file = os.path.join(self.directory.name, name)
+
+		with open(path_file, "wb") as file_video:
+			file_video.write(data)
+
+		return path_file
+
+	# The paths passed on, and the duplicates held back for each
+	def paths_filter(self, list_paths):
+		paths = [path_file for path_file, _ in self.deduplicator.paths_filter(
+			(path_file, None) for path_file in list_paths)]
+
+		return paths, {path_file: [path_duplicate for path_duplicate, _ in duplicates] for path_file, duplicates in
+		               self.deduplicator.dict_duplicates.items()}
+
+
+class PathsFilterTest(DeduplicatorTest):
+	def test_duplicates(self):
+		data = os.urandom(300 * 1024)
+		list_paths = [self.file_write(name, data) for name in ("a.avi", "b.avi", "c.avi")]
+
+		self.assertEqual(self.paths_filter(list_paths), ([list_paths[0]], {list_paths[0]: list_paths[1:]}))
+
+	def test_sizes_differ(self):
+		data = os.urandom(300 * 1024)
+		list_paths = [self.file_write("a.avi", data), self.file_write("b.avi", data + b"\0")]
+
+		self.assertEqual(self.paths_filter(list_paths), (list_paths, {}))
+
+	# Alike where the sampled hash looks (the start, middle and end), but not
+	# in between: only the full hash tells them apart
+	def test_sampled_collision(self):
+		data = bytearray(os.urandom(1024 * 1024))
+		path_a = self.file_write("a.avi", data)
+		data[300 * 1024] ^= 0xFF
+		path_b = self.file_write("b.avi", data)
+
+		self.assertEqual(self.deduplicator.hash_sampled_get(path_a, len(data)),
+		                 self.deduplicator.hash_sampled_get(path_b, len(data)))
+		self.assertNotEqual(self.deduplicator.hash_full_get(path_a), self.deduplicator.hash_full_get(path_b))
+		self.assertEqual(self.paths_filter([path_a, path_b]), ([path_a, path_b], {}))
+
+	# Of three alike where sampled, two alike in full
+	def test_sampled_collision_partial(self):
+		data = bytearray(os.urandom(1024 * 1024))
+		path_a = self.file_write("a.avi", data)
+		path_b = self.file_write("b.avi", data)
+		data[300 * 1024] ^= 0xFF
+		path_c = self.file_write("c.avi", data)
+
+		self.assertEqual(self.paths_filter([path_a, path_c, path_b]), ([path_a, path_c], {path_a: [path_b]}))
+
+	def test_same_file(self):
+		path_file = self.file_write("a.avi", os.urandom(1024))
+
+		self.assertEqual(self.paths_filter([path_file, os.path.join(self.directory.name, ".", "a.avi")]),
+		                 ([path_file], {}))
+
+
+class TargetLinkTest(DeduplicatorTest):
+	def setUp(self):
+		super().setUp()
+
+		self.path_target = self.file_write("a.mkv", b"converted")
+		self.path_duplicate = self.file_write("b.avi", b"source")
+		self.path_duplicate_target = os.path.join(self.directory.name, "b.mkv")
+		self.stat_duplicate = os.stat(self.path_duplicate)
+
+	def test_link(self):
+		self.deduplicator.target_link(self.path_target, self.path_duplicate, self.stat_duplicate, "mkv")
+
+		self.assertFalse(os.path.exists(self.path_duplicate))
+		self.assertTrue(os.path.samefile(self.path_target, self.path_duplicate_target))
+
+	# Modified since it was hashed: left be, for it to be converted on its own
+	def test_changed(self):
+		self.file_write("b.avi", b"source, edited")
+
+		with self.assertRaises(OSError):
+			self.deduplicator.target_link(self.path_target, self.path_duplicate, self.stat_duplicate, "mkv")
+
+		self.assertTrue(os.path.exists(self.path_duplicate))
+		self.assertEqual(sorted(os.listdir(self.directory.name)), ["a.mkv", "b.avi"])
+
+
+if __name__ == "__main__":
+	unittest.main()
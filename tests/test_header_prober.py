@@ -0,0 +1,486 @@
+# Tests for HeaderProber, on Matroska, MP4 and AVI headers built by hand. Each
+# codec mapping is checked by way of a file carrying it, so what's tested is
+# the parsing of the bytes as much as the tables. Run with python -m pytest,
+# or python -m unittest from the directory above.
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video_container_convert as vcc
+
+
+# Matroska: elements, with IDs as written (marker kept) and sizes as variable
+# length integers
+def ebml_size(size):
+	for length in range(1, 9):
+		if size < (1 << (7 * length)) - 1:
+			return ((1 << (7 * length)) | size).to_bytes(length, "big")
+
+
+def ebml_element(id_element, data):
+	return id_element.to_bytes((id_element.bit_length() + 7) // 8, "big") + ebml_size(len(data)) + data
+
+
+def ebml_uint(id_element, value):
+	return ebml_element(id_element, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def ebml_string(id_element, value):
+	return ebml_element(id_element, value.encode())
+
+
+# A track entry. Type 1 is video, 2 audio, 0x11 subtitles.
+def matroska_track(number, type_track, codec, codec_private = None, language = None, audio = b"", video = b""):
+	data = ebml_uint(0xD7, number) + ebml_uint(0x73C5, 1000 + number) + ebml_uint(0x83, type_track) + ebml_string(
+		0x86, codec)
+
+	if codec_private is not None:
+		data += ebml_element(0x63A2, codec_private)
+
+	if language:
+		data += ebml_element(0x22B59C, language.encode())
+
+	if video:
+		data += ebml_element(0xE0, video)
+
+	if audio:
+		data += ebml_element(0xE1, audio)
+
+	return ebml_element(0xAE, data)
+
+
+# A Matroska file with the tracks given, lasting seconds, with tags placed
+# after a cluster and found through the seek head
+def matroska_build(tracks, seconds = 5.0, tags = b""):
+	head = ebml_element(0x1A45DFA3, ebml_string(0x4282, "matroska"))
+	info = ebml_element(0x1549A966, ebml_uint(0x2AD7B1, 1000000) + ebml_element(0x4489, struct.pack(">d",
+	                                                                                                  seconds * 1000)))
+	tracks = ebml_element(0x1654AE6B, b"".join(tracks))
+	cluster = ebml_element(0x1F43B675, b"\0" * 256)
+	tags = ebml_element(0x1254C367, tags) if tags else b""
+
+	def seek_head_get(position):
+		return ebml_element(0x114D9B74, ebml_element(0x4DBB, ebml_element(0x53AB, (0x1254C367).to_bytes(4, "big")) +
+		                                             ebml_element(0x53AC, position.to_bytes(4, "big"))))
+
+	seek_head = seek_head_get(0)
+	seek_head = seek_head_get(len(seek_head) + len(info) + len(tracks) + len(cluster))
+	body = seek_head + info + tracks + cluster + tags
+
+	return head + b"\x18\x53\x80\x67" + ebml_size(len(body)) + body
+
+
+# AVI: RIFF chunks and lists, padded to an even size
+def riff_chunk(id_chunk, data):
+	return id_chunk + struct.pack("<I", len(data)) + data + (b"\0" if len(data) & 1 else b"")
+
+
+def riff_list(type_list, data):
+	return riff_chunk(b"LIST", type_list + data)
+
+
+def bitmap_info_get(fourcc, width = 320, height = 240):
+	return struct.pack("<IiiHH4s", 40, width, height, 1, 24, fourcc) + b"\0" * 20
+
+
+def wave_format_get(tag, channels = 2, sample_rate = 44100, bits = 16, subformat = None):
+	data = struct.pack("<HHIIHH", tag, channels, sample_rate, sample_rate * channels * bits // 8, channels * bits // 8,
+	                   bits)
+
+	if subformat is not None:
+		data += struct.pack("<HHI", 22, bits, 3) + struct.pack("<H", subformat) + b"\0" * 14
+
+	return data
+
+
+# A stream header and format, with length in units of scale/rate seconds
+def avi_stream(type_stream, handler, format_stream, scale, rate, length):
+	header = type_stream + handler + struct.pack("<IHHI", 0, 0, 0, 0) + struct.pack("<IIII", scale, rate, 0,
+	                                                                               length) + b"\0" * 16
+
+	return riff_list(b"strl", riff_chunk(b"strh", header) + riff_chunk(b"strf", format_stream))
+
+
+def avi_build(streams):
+	data = b"AVI " + riff_list(b"hdrl", riff_chunk(b"avih", b"\0" * 56) + b"".join(streams)) + riff_list(b"movi",
+	                                                                                                        b"\0" * 64)
+
+	return b"RIFF" + struct.pack("<I", len(data)) + data
+
+
+# MP4: boxes, and full boxes with a version and flags
+def mp4_box(type_box, data):
+	return struct.pack(">I", 8 + len(data)) + type_box + data
+
+
+def mp4_box_full(type_box, data, version = 0):
+	return mp4_box(type_box, bytes((version, 0, 0, 0)) + data)
+
+
+def mp4_entry_video(type_entry, width = 320, height = 240, extra = b""):
+	return mp4_box(type_entry.encode("latin-1"), b"\0" * 24 + struct.pack(">HH", width, height) + b"\0" * 50 + extra)
+
+
+def mp4_entry_audio(type_entry, channels = 2, bits = 16, sample_rate = 48000, extra = b""):
+	return mp4_box(type_entry.encode("latin-1"), b"\0" * 16 + struct.pack(">HHHHI", channels, bits, 0, 0,
+	                                                                     sample_rate << 16) + extra)
+
+
+# An elementary stream descriptor, with the ES descriptor flags given
+def mp4_esds_get(object_type, flags = 0):
+	descriptor_es = struct.pack(">HB", 1, flags)
+
+	if flags & 0x80:
+		descriptor_es += struct.pack(">H", 2)
+
+	if flags & 0x40:
+		descriptor_es += bytes((5,)) + b"a.url"
+
+	if flags & 0x20:
+		descriptor_es += struct.pack(">H", 3)
+
+	descriptor_config = bytes((0x04, 13, object_type, 0x15)) + b"\0" * 11
+
+	return mp4_box_full(b"esds", bytes((0x03, len(descriptor_es) + len(descriptor_config))) + descriptor_es +
+	                    descriptor_config)
+
+
+def mp4_language_get(language):
+	value = 0
+
+	for letter in language:
+		value = (value << 5) | (ord(letter) - 0x60)
+
+	return value
+
+
+def mp4_track(handler, entry, timescale, duration, language = "eng", count_samples = 100):
+	mdhd = mp4_box_full(b"mdhd", struct.pack(">IIIIHH", 0, 0, timescale, duration, mp4_language_get(language), 0))
+	hdlr = mp4_box_full(b"hdlr", struct.pack(">I", 0) + handler + b"\0" * 13)
+	stbl = mp4_box(b"stbl", mp4_box_full(b"stsd", struct.pack(">I", 1) + entry) + mp4_box_full(
+		b"stsz", struct.pack(">II", 0, count_samples)))
+
+	return mp4_box(b"trak", mp4_box_full(b"tkhd", b"\0" * 80) + mp4_box(b"mdia", mdhd + hdlr + mp4_box(
+		b"minf", stbl)))
+
+
+# An MP4 file with the tracks given, with the movie box at the end (as written
+# without faststart), or at the start
+def mp4_build(tracks, seconds = 5, moov_first = False):
+	ftyp = mp4_box(b"ftyp", b"isom\0\0\0\0isom")
+	moov = mp4_box(b"moov", mp4_box_full(b"mvhd", struct.pack(">IIII", 0, 0, 1000, seconds * 1000) + b"\0" * 80) +
+	               b"".join(tracks))
+	mdat = mp4_box(b"mdat", b"\0" * 256)
+
+	return ftyp + moov + mdat if moov_first else ftyp + mdat + moov
+
+
+class HeaderProberTest(unittest.TestCase):
+	def setUp(self):
+		self.prober = vcc.HeaderProber()
+		self.directory = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def probe(self, data, name = "video"):
+		path_file = os.path.join(self.directory.name, name)
+
+		with open(path_file, "wb") as file_video:
+			file_video.write(data)
+
+		return self.prober.probe(path_file)
+
+	def streams_get(self, data):
+		result = self.probe(data)
+
+		self.assertIsNotNone(result)
+
+		return result["streams"]
+
+
+class MatroskaTest(HeaderProberTest):
+	def test_format(self):
+		result = self.probe(matroska_build(
+			[matroska_track(1, 1, "V_MPEG4/ISO/AVC", video = ebml_uint(0xB0, 1920) + ebml_uint(0xBA, 1080)),
+			 matroska_track(2, 2, "A_AC3", language = "ger",
+			                audio = ebml_element(0xB5, struct.pack(">f", 48000.0)) + ebml_uint(0x9F, 6)),
+			 matroska_track(3, 0x11, "S_TEXT/UTF8")],
+			seconds = 12.5,
+			tags = ebml_element(0x7373, ebml_element(0x63C0, ebml_uint(0x63C5, 1002)) + ebml_element(
+				0x67C8, ebml_string(0x45A3, "DURATION") + ebml_string(0x4487, "00:00:12.480000000")))))
+
+		self.assertEqual(result["prober"], "header")
+		self.assertEqual(result["format"]["format_name"], "matroska,webm")
+		self.assertEqual(float(result["format"]["duration"]), 12.5)
+		self.assertEqual(result["format"]["nb_streams"], 3)
+
+		video, audio, subtitle = result["streams"]
+
+		self.assertEqual((video["index"], video["codec_type"], video["codec_name"]), (0, "video", "h264"))
+		self.assertEqual((video["width"], video["height"]), (1920, 1080))
+		self.assertEqual((audio["codec_type"], audio["codec_name"], audio["channels"], audio["sample_rate"]),
+		                 ("audio", "ac3", 6, "48000"))
+		self.assertEqual(audio["tags"]["language"], "ger")
+		self.assertAlmostEqual(vcc.stream_duration_get(audio), 12.48)
+		self.assertEqual((subtitle["codec_type"], subtitle["codec_name"]), ("subtitle", "subrip"))
+
+	def test_codecs(self):
+		for codec, codec_name in vcc.HeaderProber.dict_codecs_matroska.items():
+			type_track = {"V": 1, "A": 2, "S": 0x11}[codec[0]]
+
+			with self.subTest(codec = codec):
+				stream, = self.streams_get(matroska_build([matroska_track(1, type_track, codec)]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+				self.assertEqual(stream["codec_type"], {1: "video", 2: "audio", 0x11: "subtitle"}[type_track])
+
+	# Codec IDs with a profile on the end go by their family
+	def test_codec_profiles(self):
+		for codec, codec_name in (("A_AAC/MPEG4/LC", "aac"), ("A_AAC/MPEG2/LC/SBR", "aac"), ("A_DTS/EXPRESS", "dts")):
+			with self.subTest(codec = codec):
+				stream, = self.streams_get(matroska_build([matroska_track(1, 2, codec)]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	def test_pcm(self):
+		for codec, bits, codec_name in (("A_PCM/INT/LIT", 16, "pcm_s16le"), ("A_PCM/INT/LIT", 24, "pcm_s24le"),
+		                                ("A_PCM/INT/BIG", 16, "pcm_s16be"), ("A_PCM/INT/BIG", 32, "pcm_s32be"),
+		                                ("A_PCM/INT/LIT", 8, "pcm_u8"), ("A_PCM/FLOAT/IEEE", 32, "pcm_f32le")):
+			with self.subTest(codec = codec, bits = bits):
+				stream, = self.streams_get(matroska_build([matroska_track(1, 2, codec, audio = ebml_uint(0x6264, bits))]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	# Without a bit depth, there's no telling
+	def test_pcm_bits_unknown(self):
+		stream, = self.streams_get(matroska_build([matroska_track(1, 2, "A_PCM/INT/LIT")]))
+
+		self.assertIsNone(stream["codec_name"])
+
+	def test_codecs_fourcc(self):
+		for fourcc, codec_name in vcc.HeaderProber.dict_codecs_fourcc.items():
+			with self.subTest(fourcc = fourcc):
+				stream, = self.streams_get(matroska_build(
+					[matroska_track(1, 1, "V_MS/VFW/FOURCC", codec_private = bitmap_info_get(fourcc.encode()))]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	def test_codecs_wave(self):
+		for tag, codec_name in vcc.HeaderProber.dict_codecs_wave.items():
+			with self.subTest(tag = hex(tag)):
+				stream, = self.streams_get(matroska_build(
+					[matroska_track(1, 2, "A_MS/ACM", codec_private = wave_format_get(tag))]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	def test_truncated(self):
+		data = matroska_build([matroska_track(1, 1, "V_MPEG4/ISO/AVC"), matroska_track(2, 2, "A_AAC")])
+
+		for length in range(len(data)):
+			self.probe(data[:length])
+
+
+class AviTest(HeaderProberTest):
+	def test_format(self):
+		result = self.probe(avi_build(
+			[avi_stream(b"vids", b"XVID", bitmap_info_get(b"XVID", 640, -480), 1, 25, 250),
+			 avi_stream(b"auds", b"\0\0\0\0", wave_format_get(0x55), 1152, 44100, 382)]))
+
+		self.assertEqual(result["format"]["format_name"], "avi")
+
+		video, audio = result["streams"]
+
+		self.assertEqual((video["codec_type"], video["codec_name"], video["width"], video["height"]),
+		                 ("video", "mpeg4", 640, 480))
+		self.assertAlmostEqual(float(video["duration"]), 10.0)
+		self.assertEqual(video["nb_frames"], "250")
+		self.assertEqual((audio["codec_type"], audio["codec_name"], audio["channels"], audio["sample_rate"]),
+		                 ("audio", "mp3", 2, "44100"))
+		self.assertAlmostEqual(float(audio["duration"]), 382 * 1152 / 44100, places = 5)
+
+		# The container lasts as long as its longest stream
+		self.assertAlmostEqual(float(result["format"]["duration"]), 10.0)
+
+	def test_codecs_fourcc(self):
+		for fourcc, codec_name in vcc.HeaderProber.dict_codecs_fourcc.items():
+			with self.subTest(fourcc = fourcc):
+				# FOURCCs come in either case
+				stream, = self.streams_get(avi_build(
+					[avi_stream(b"vids", b"\0\0\0\0", bitmap_info_get(fourcc.lower().encode()), 1, 25, 25)]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+				self.assertEqual(stream["codec_type"], "subtitle" if codec_name == "xsub" else "video")
+
+	def test_codec_raw(self):
+		stream, = self.streams_get(avi_build([avi_stream(b"vids", b"DIB ", bitmap_info_get(b"\0\0\0\0"), 1, 25, 25)]))
+
+		self.assertEqual(stream["codec_name"], "rawvideo")
+
+	def test_codecs_wave(self):
+		for tag, codec_name in vcc.HeaderProber.dict_codecs_wave.items():
+			with self.subTest(tag = hex(tag)):
+				stream, = self.streams_get(avi_build([avi_stream(b"auds", b"\0\0\0\0", wave_format_get(tag), 1, 1, 1)]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	def test_pcm(self):
+		for format_stream, codec_name in ((wave_format_get(1, bits = 16), "pcm_s16le"),
+		                                  (wave_format_get(1, bits = 24), "pcm_s24le"),
+		                                  (wave_format_get(1, bits = 8), "pcm_u8"),
+		                                  (wave_format_get(0xFFFE, bits = 24, subformat = 1), "pcm_s24le"),
+		                                  (wave_format_get(0xFFFE, subformat = 0x2000), "ac3")):
+			with self.subTest(codec_name = codec_name):
+				stream, = self.streams_get(avi_build([avi_stream(b"auds", b"\0\0\0\0", format_stream, 1, 1, 1)]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	def test_truncated(self):
+		data = avi_build([avi_stream(b"vids", b"XVID", bitmap_info_get(b"XVID"), 1, 25, 250),
+		                  avi_stream(b"auds", b"\0\0\0\0", wave_format_get(0x55), 1152, 44100, 382)])
+
+		for length in range(len(data)):
+			self.probe(data[:length])
+
+
+class Mp4Test(HeaderProberTest):
+	def test_format(self):
+		for moov_first in (False, True):
+			with self.subTest(moov_first = moov_first):
+				result = self.probe(mp4_build(
+					[mp4_track(b"vide", mp4_entry_video("avc1", 1280, 720), 12800, 64000),
+					 mp4_track(b"soun", mp4_entry_audio("mp4a", extra = mp4_esds_get(0x40)), 48000, 240000, "fre")],
+					moov_first = moov_first))
+
+				self.assertEqual(result["format"]["format_name"], "mov,mp4,m4a,3gp,3g2,mj2")
+				self.assertEqual(float(result["format"]["duration"]), 5.0)
+
+				video, audio = result["streams"]
+
+				self.assertEqual((video["codec_type"], video["codec_name"], video["width"], video["height"]),
+				                 ("video", "h264", 1280, 720))
+				self.assertEqual(float(video["duration"]), 5.0)
+				self.assertEqual(video["nb_frames"], "100")
+				self.assertEqual((audio["codec_type"], audio["codec_name"], audio["channels"], audio["sample_rate"]),
+				                 ("audio", "aac", 2, "48000"))
+				self.assertEqual(audio["tags"]["language"], "fre")
+
+	def test_codecs(self):
+		for type_entry, codec_name in vcc.HeaderProber.dict_codecs_mp4.items():
+			if codec_name in ("mov_text", "webvtt", "eia_608", "ttml"):
+				handler, entry = b"text", mp4_box(type_entry.encode("latin-1"), b"\0" * 40)
+			elif codec_name.startswith("pcm_") or codec_name in ("ac3", "eac3", "opus", "flac", "alac", "mp3"):
+				handler, entry = b"soun", mp4_entry_audio(type_entry)
+			else:
+				handler, entry = b"vide", mp4_entry_video(type_entry)
+
+			with self.subTest(type_entry = type_entry):
+				stream, = self.streams_get(mp4_build([mp4_track(handler, entry, 1000, 5000)]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	def test_pcm(self):
+		for type_entry, bits, codec_name in (("sowt", 16, "pcm_s16le"), ("sowt", 24, "pcm_s24le"),
+		                                     ("twos", 16, "pcm_s16be"), ("twos", 8, "pcm_s8")):
+			with self.subTest(type_entry = type_entry, bits = bits):
+				stream, = self.streams_get(mp4_build([mp4_track(b"soun", mp4_entry_audio(type_entry, bits = bits), 1000,
+				                                                5000)]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	def test_object_types(self):
+		for object_type, codec_name in vcc.HeaderProber.dict_object_types_mp4.items():
+			with self.subTest(object_type = hex(object_type)):
+				stream, = self.streams_get(mp4_build(
+					[mp4_track(b"soun", mp4_entry_audio("mp4a", extra = mp4_esds_get(object_type)), 1000, 5000)]))
+
+				self.assertEqual(stream["codec_name"], codec_name)
+
+	# The ES descriptor's optional fields come before the decoder config, in
+	# every combination
+	def test_object_type_flags(self):
+		for flags in range(0, 0x100, 0x20):
+			with self.subTest(flags = hex(flags)):
+				stream, = self.streams_get(mp4_build(
+					[mp4_track(b"vide", mp4_entry_video("mp4v", extra = mp4_esds_get(0x20, flags)), 1000, 5000)]))
+
+				self.assertEqual(stream["codec_name"], "mpeg4")
+
+	# Fragmented files are left to ffprobe
+	def test_fragmented(self):
+		data = mp4_build([mp4_track(b"vide", mp4_entry_video("avc1"), 1000, 0)])
+		moov = data.index(b"moov") - 4
+		size, = struct.unpack_from(">I", data, moov)
+		mvex = mp4_box(b"mvex", mp4_box_full(b"trex", b"\0" * 20))
+
+		self.assertIsNone(self.probe(data[:moov] + struct.pack(">I", size + len(mvex)) + data[moov + 4:] + mvex))
+
+	def test_truncated(self):
+		data = mp4_build([mp4_track(b"vide", mp4_entry_video("avc1"), 1000, 5000)])
+
+		for length in range(len(data)):
+			self.probe(data[:length])
+
+
+class UnknownTest(HeaderProberTest):
+	def test_unknown(self):
+		self.assertIsNone(self.probe(b"\0\0\x01\xba" + b"\0" * 1024))
+		self.assertIsNone(self.probe(b""))
+
+
+# Verification across containers, off headers alone
+class StreamsCompareTest(HeaderProberTest):
+	def test_pcm_avi_matroska(self):
+		probe_source = self.probe(avi_build(
+			[avi_stream(b"vids", b"XVID", bitmap_info_get(b"XVID"), 1, 25, 125),
+			 avi_stream(b"auds", b"\0\0\0\0", wave_format_get(1, bits = 16), 4, 176400, 44100 * 5)]), "source")
+		probe_target = self.probe(matroska_build(
+			[matroska_track(1, 1, "V_MS/VFW/FOURCC", codec_private = bitmap_info_get(b"XVID")),
+			 matroska_track(2, 2, "A_PCM/INT/LIT", audio = ebml_uint(0x9F, 2) + ebml_uint(0x6264, 16))]), "target")
+
+		self.assertEqual(vcc.streams_compare(probe_source, probe_target, False), [])
+
+	def test_codec_mismatch(self):
+		probe_source = self.probe(avi_build([avi_stream(b"vids", b"XVID", bitmap_info_get(b"XVID"), 1, 25, 125)]),
+		                          "source")
+		probe_target = self.probe(matroska_build([matroska_track(1, 1, "V_MPEG4/ISO/AVC")]), "target")
+
+		self.assertTrue(vcc.streams_compare(probe_source, probe_target, False))
+
+	# As ffmpeg leaves them without -map
+	def test_streams_dropped(self):
+		probe_source = probe_streams_get([("video", "h264"), ("audio", "aac"), ("audio", "ac3"), ("subtitle", "subrip")])
+
+		self.assertEqual(len(vcc.streams_compare(probe_source, probe_streams_get([("video", "h264"), ("audio", "aac")]),
+		                                         False)), 2)
+		self.assertEqual(vcc.streams_compare(probe_source, probe_source, False), [])
+
+	def test_cover_art(self):
+		probe_source = probe_streams_get([("video", "h264"), ("audio", "aac"), ("video", "mjpeg")])
+		probe_source["streams"][2]["disposition"] = {"attached_pic": 1}
+
+		self.assertEqual(vcc.streams_compare(probe_source, probe_streams_get([("video", "h264"), ("audio", "aac")]),
+		                                     False), [])
+
+	def test_sidecars(self):
+		probe_source = probe_streams_get([("video", "h264"), ("subtitle", "subrip")])
+		probe_target = probe_streams_get([("video", "h264"), ("subtitle", "subrip"), ("subtitle", "ass")])
+
+		self.assertEqual(vcc.streams_compare(probe_source, probe_target, False, 1), [])
+		self.assertTrue(vcc.streams_compare(probe_source, probe_streams_get([("video", "h264"), ("subtitle", "ass")]),
+		                                    False, 1))
+
+
+# What ffprobe makes of a file with the streams given
+def probe_streams_get(streams):
+	return {"format": {"duration": "60.0"},
+	        "streams": [{"index": index, "codec_type": codec_type, "codec_name": codec_name, "duration": "60.0"}
+	                    for index, (codec_type, codec_name) in enumerate(streams)]}
+
+
+if __name__ == "__main__":
+	unittest.main()
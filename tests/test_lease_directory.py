@@ -0,0 +1,143 @@
+# Tests for LeaseDirectory: claiming files, marking those that failed, and
+# breaking stale leases, including one claimed afresh by another host while
+# we were at it. Run with python -m pytest, or python -m unittest from the
+# directory above.
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import video_container_convert as vcc
+
+
+class LeaseDirectoryTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path_leases = os.path.join(self.directory.name, "leases")
+		self.path_file = os.path.join(self.directory.name, "video.avi")
+
+		with open(self.path_file, "wb") as file_video:
+			file_video.write(b"video")
+
+		self.stat_file = os.stat(self.path_file)
+		self.leases = vcc.LeaseDirectory(self.path_leases)
+		self.path_lease = self.leases.path_lease_get(self.path_file, self.stat_file)
+
+	def tearDown(self):
+		self.leases.close()
+		self.directory.cleanup()
+
+	# A lease as another host would write it, dated seconds_age ago
+	def lease_write(self, owner, seconds_age = 0):
+		with open(self.path_lease, "w", encoding = "utf-8") as file_lease:
+			json.dump({"owner": owner, "path": self.path_file}, file_lease)
+
+		time_lease = time.time() - seconds_age
+		os.utime(self.path_lease, (time_lease, time_lease))
+
+	def names_get(self):
+		return sorted(os.listdir(self.path_leases))
+
+
+class ClaimTest(LeaseDirectoryTest):
+	def test_claim_release(self):
+		self.assertIsNone(self.leases.claim(self.path_file, self.stat_file))
+		self.assertEqual(self.leases.lease_read(self.path_lease)["owner"], self.leases.owner)
+
+		self.leases.release(self.path_file, vcc.OUTCOME_CONVERTED)
+
+		self.assertEqual(self.names_get(), [])
+
+	def test_held(self):
+		self.lease_write("elsewhere-1")
+
+		self.assertEqual(self.leases.claim(self.path_file, self.stat_file), "being converted by elsewhere-1")
+
+	def test_failed(self):
+		self.leases.claim(self.path_file, self.stat_file)
+		self.leases.release(self.path_file, vcc.OUTCOME_FAILED)
+
+		self.assertEqual(self.leases.claim(self.path_file, self.stat_file), "failed on " + self.leases.owner)
+
+	# Errors of our own, or an interrupt, don't keep the file from others
+	def test_error(self):
+		for outcome in (vcc.OUTCOME_ERROR, None):
+			self.assertIsNone(self.leases.claim(self.path_file, self.stat_file))
+
+			self.leases.release(self.path_file, outcome)
+
+			self.assertEqual(self.names_get(), [])
+
+
+class LeaseBreakTest(LeaseDirectoryTest):
+	def test_stale(self):
+		self.lease_write("elsewhere-1", self.leases.seconds_stale + 60)
+
+		self.assertIsNone(self.leases.claim(self.path_file, self.stat_file))
+		self.assertEqual(self.leases.lease_read(self.path_lease)["owner"], self.leases.owner)
+		self.assertEqual(self.names_get(), [os.path.basename(self.path_lease)])
+
+	def test_fresh(self):
+		self.lease_write("elsewhere-1", self.leases.seconds_stale - 60)
+
+		self.assertFalse(self.leases.lease_break(self.path_lease))
+		self.assertEqual(self.leases.lease_read(self.path_lease)["owner"], "elsewhere-1")
+
+	# Another host breaks the stale lease, and claims the file afresh, between
+	# our finding it stale and moving it out of the way. What we moved is theirs,
+	# and goes back.
+	def test_claimed_meanwhile(self):
+		self.lease_write("elsewhere-1", self.leases.seconds_stale + 60)
+
+		time_share_get = self.leases.time_share_get
+
+		def time_share_get_claimed():
+			time_share = time_share_get()
+			os.remove(self.path_lease)
+			self.lease_write("elsewhere-2")
+
+			return time_share
+
+		self.leases.time_share_get = time_share_get_claimed
+
+		self.assertEqual(self.leases.claim(self.path_file, self.stat_file), "being converted by elsewhere-2")
+		self.assertEqual(self.leases.lease_read(self.path_lease)["owner"], "elsewhere-2")
+		self.assertEqual(self.names_get(), [os.path.basename(self.path_lease)])
+
+	# And yet another claims it while we put it back: it's theirs all the same
+	def test_claimed_again(self):
+		self.lease_write("elsewhere-1", self.leases.seconds_stale + 60)
+
+		time_share_get = self.leases.time_share_get
+		file_rename_no_clobber = vcc.file_rename_no_clobber
+
+		def time_share_get_claimed():
+			time_share = time_share_get()
+			os.remove(self.path_lease)
+			self.lease_write("elsewhere-2")
+
+			return time_share
+
+		def file_rename_no_clobber_claimed(path_source, path_target):
+			self.lease_write("elsewhere-3")
+
+			return file_rename_no_clobber(path_source, path_target)
+
+		self.leases.time_share_get = time_share_get_claimed
+		vcc.file_rename_no_clobber = file_rename_no_clobber_claimed
+
+		try:
+			self.assertFalse(self.leases.lease_break(self.path_lease))
+		finally:
+			vcc.file_rename_no_clobber = file_rename_no_clobber
+
+		self.assertEqual(self.leases.lease_read(self.path_lease)["owner"], "elsewhere-3")
+		self.assertEqual(self.names_get(), [os.path.basename(self.path_lease)])
+
+
+if __name__ == "__main__":
+	unittest.main()
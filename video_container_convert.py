@@ -16,96 +16,1031 @@
 #                   - pathlib (to get absolute path)
 #                   - appdirs (pip install appdirs; to access application/log directions in a platform agnostic manner)
 # -------------------------------------------------------------------------------
-import argparse
-import logging
 import os
+import sys
+
+# Hand the files over to the instance at it already, if any, before paying for
+# the imports below, let alone anything else (video_container_convert_instance.py
+# spares loading this script at all, when started instead of it)
+if __name__ == '__main__' and "--single-instance" in sys.argv[1:]:
+	import video_container_convert_instance
+
+	# Named as name_script_executable_get() does
+	if video_container_convert_instance.instance_handoff(os.path.basename(os.path.realpath(__file__)).partition(".")[0],
+	                                                     sys.argv[1:]):
+		sys.exit(0)
+
+import collections
+import contextlib
+import csv
+import json
+import locale
+import logging
+import logging.handlers
 import platform
+import queue
+import re
 import shutil
+import socket
+import sqlite3
+import struct
 import subprocess
-import sys
+import threading
 import time
 
-from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from video_container_convert_instance import instance_address_get, instance_handoff, instance_path_token_get, \
+	instance_peer_uid_get
 
 
 # Show tool tip/notification/toast message
+# Desktop notifications: tool tips on Linux (through notify-send), balloon tips
+# on Windows (only OS v10 supported for now)
+class NotifySinkDesktop:
+	def __init__(self):
+		self.binary_notify_send = None
+		self.toaster = None
+
+		if platform.system() == "Linux":
+			self.binary_notify_send = shutil.which("notify-send")
+		else:
+			try:
+				from win10toast import ToastNotifier
+			except ImportError:
+				logging.error("win10toast isn't installed; no desktop notifications")
+			else:
+				# One for the run; each takes a while to set up
+				self.toaster = ToastNotifier()
+
+	def send(self, title, message):
+		if self.binary_notify_send:
+			subprocess.run((self.binary_notify_send, title, message), stdin = subprocess.DEVNULL,
+			               stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, timeout = 10)
+		elif self.toaster:
+			self.toaster.show_toast(title, message, icon_path = None, duration = 5, threaded = True)
+
+
+# Notifications on the console (and in the log)
+class NotifySinkStdout:
+	def send(self, title, message):
+		message_info("[" + title + "] " + message)
+
+
+# Notifications dropped as JSON files in a directory, for whatever's watching it
+# to pick up (mail them, post them to a chat, ...). Each file shows up complete.
+class NotifySinkDrop:
+	def __init__(self, path_dir):
+		self.path_dir = path_dir
+
+		os.makedirs(path_dir, exist_ok = True)
+
+	def send(self, title, message):
+		name = str(time.time_ns()) + "-" + str(os.getpid())
+		path_temporary = os.path.join(self.path_dir, "." + name + ".tmp")
+
+		with open(path_temporary, "w", encoding = "utf-8") as file_notification:
+			json.dump({"title": title, "message": message, "script": name_script_executable_get(),
+			           "host": platform.node(), "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")}, file_notification)
+
+		os.replace(path_temporary, os.path.join(self.path_dir, name + ".json"))
+
+
+# Sends notifications to the sinks given off a thread of its own, so that a
+# slow sink never holds up a conversion. At most one notification goes out
+# every seconds_interval; events reported in between are coalesced into a
+# summary per title, so that a storm of failures makes for one notification
+# rather than one each.
+class Notifier:
+	# Messages kept per title for the summary; the rest are only counted
+	count_messages_max = 3
+
+	def __init__(self, sinks, seconds_interval = 30):
+		self.sinks = sinks
+		self.seconds_interval = seconds_interval
+
+		self.lock = threading.Lock()
+		self.dict_events = collections.OrderedDict()
+		self.event_pending = threading.Event()
+		self.event_closing = threading.Event()
+
+		self.thread = threading.Thread(target = self.run, name = "notifier", daemon = True)
+		self.thread.start()
+
+	def notify(self, title, message):
+		with self.lock:
+			count, list_messages = self.dict_events.get(title, (0, []))
+
+			if len(list_messages) < self.count_messages_max:
+				list_messages.append(message)
+
+			self.dict_events[title] = (count + 1, list_messages)
+
+		self.event_pending.set()
+
+	def run(self):
+		time_sent = None
+
+		while not self.event_closing.is_set():
+			self.event_pending.wait()
+
+			if time_sent is not None:
+				# Hold on until it's time to send again, or we're done
+				self.event_closing.wait(time_sent + self.seconds_interval - time.monotonic())
+
+			time_sent = time.monotonic()
+
+			self.flush()
+
+	# Send whatever's pending, summarized per title
+	def flush(self):
+		with self.lock:
+			dict_events = self.dict_events
+			self.dict_events = collections.OrderedDict()
+			self.event_pending.clear()
+
+		for title, (count, list_messages) in dict_events.items():
+			message = os.path.basename(__file__) + ": " + "\n".join(list_messages)
+
+			if count > len(list_messages):
+				title += " (" + str(count) + ")"
+				message += "\n... and " + str(count - len(list_messages)) + " more. Check the log."
+
+			for sink in self.sinks:
+				try:
+					sink.send(title, message)
+				except:
+					logging.error("Error sending notification via " + type(sink).__name__ + ": " + str(sys.exc_info()))
+
+	# Send whatever's pending, and stop
+	def close(self):
+		self.event_closing.set()
+		self.event_pending.set()
+		self.thread.join()
+
+		self.flush()
+
+
+# Handle tool tip notification (Linux)/balloon tip (Windows), through the
+# notifier set up by main(). A no-op without one.
 def show_toast(tooltip_title, tooltip_message):
-	# Handle tool tip notification (Linux)/balloon tip (Windows; only OS v10 supported for now)
-	tooltip_message = os.path.basename(__file__) + ": " + tooltip_message
+	if show_toast.notifier:
+		show_toast.notifier.notify(tooltip_title, tooltip_message)
+
+show_toast.notifier = None
+
+
+# A tool we run: a converter, or ffprobe. Its binary is the one configured, else
+# the one on the PATH, else the one at the usual place for the platform. Its
+# version (and for ffmpeg, the formats it can write) are checked once, before
+# it's first used.
+class Tool:
+	# Formats ffmpeg writes each target container with
+	dict_muxers = {"mkv": "matroska", "mp4": "mp4", "webm": "webm"}
+
+	def __init__(self, name, binary, arguments_version = ("-version",), targets = None):
+		self.name = name
+		self.binary = binary
+		self.arguments_version = tuple(arguments_version)
+
+		# Target containers it can write; None if anything goes (or we can't tell)
+		self.targets = set(targets) if targets is not None else None
+
+		self.version = None
+		self.checked = False
+		self.lock = threading.Lock()
+
+	# Check the tool works, once. Returns whether it does.
+	def check(self):
+		with self.lock:
+			if not self.checked:
+				self.checked = True
+
+				try:
+					result = subprocess.run((self.binary, *self.arguments_version), stdin = subprocess.DEVNULL,
+					                        stdout = subprocess.PIPE, stderr = subprocess.STDOUT, timeout = 30,
+					                        universal_newlines = True, errors = "replace")
+				except (OSError, subprocess.SubprocessError):
+					logging.error("Could not run \'" + self.binary + "\': " + str(sys.exc_info()))
+				else:
+					if not result.returncode:
+						self.version = (result.stdout.strip().splitlines() or ["unknown version"])[0]
+
+						if self.name == "ffmpeg":
+							self.targets = self.targets_ffmpeg_get()
+
+		return self.version is not None
+
+	# Target containers ffmpeg was built to write
+	def targets_ffmpeg_get(self):
+		try:
+			output = subprocess.run((self.binary, "-hide_banner", "-muxers"), stdin = subprocess.DEVNULL,
+			                        stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, timeout = 30,
+			                        universal_newlines = True, errors = "replace").stdout
+		except (OSError, subprocess.SubprocessError):
+			return None
+
+		set_muxers = {name for line in output.splitlines() if line[:3].strip().startswith("E") and len(line.split()) > 1
+		              for name in line.split()[1].split(",")}
+
+		if not set_muxers:
+			# Can't tell
+			return None
+
+		return {target for target, muxer in self.dict_muxers.items() if muxer in set_muxers}
+
+	def writes(self, target):
+		return self.targets is None or target in self.targets
+
+
+# A way of converting a source format to a target container: the tool to run,
+# and its arguments, with "{input}" and "{output}" standing in for the files
+class Route:
+	def __init__(self, tool, options):
+		self.tool = tool
+		self.options = tuple(options)
+
+	# Can sidecar subtitles (see Sidecar) be merged in, in the same pass? Only by
+	# the tools we know the arguments of, and only into Matroska, which takes
+	# subtitles of every kind.
+	def sidecars_supported(self, target):
+		return target == "mkv" and self.tool.name in ("mkvmerge", "ffmpeg") and "{input}" in self.options and (
+				"{output}" in self.options)
+
+	# The command to run. Sidecars follow the input: mkvmerge takes them as
+	# files of their own, with their language and forced flag; ffmpeg as inputs
+	# of their own, mapped in after the source's streams, and tagged likewise
+	# given how many subtitle streams the source has (if known).
+	def command_get(self, path_input, path_output, sidecars = (), count_subtitles_source = None):
+		list_command = [self.tool.binary]
+
+		for option in self.options:
+			if option == "{input}":
+				list_command.append(path_input)
+
+				for sidecar in sidecars:
+					if self.tool.name == "mkvmerge":
+						# A VobSub index has its own languages
+						if sidecar.language and not sidecar.vobsub:
+							list_command += ("--language", "0:" + sidecar.language)
+
+						if sidecar.forced and not sidecar.vobsub:
+							list_command += ("--forced-track", "0:yes")
+
+						list_command.append(sidecar.path)
+					else:
+						list_command += ("-i", sidecar.path)
+			elif option == "{output}":
+				if sidecars and self.tool.name == "ffmpeg":
+					list_command += ("-map", "0:v?", "-map", "0:a?", "-map", "0:s?")
+					index_subtitle = count_subtitles_source
 
-	if platform.system() == "Linux":
-		os.system("notify-send \"" + tooltip_title + "\" \"" + tooltip_message + "\"")
-	else:
-		from win10toast import ToastNotifier
+					for index_input, sidecar in enumerate(sidecars, 1):
+						list_command += ("-map", str(index_input) + ":s")
+
+						if index_subtitle is not None:
+							if sidecar.language and not sidecar.vobsub:
+								list_command += ("-metadata:s:s:" + str(index_subtitle), "language=" + sidecar.language)
+
+							if sidecar.forced and not sidecar.vobsub:
+								list_command += ("-disposition:s:" + str(index_subtitle), "forced")
 
-		toaster = ToastNotifier()
-		toaster.show_toast(tooltip_title, tooltip_message, icon_path = None, duration = 5)
+							index_subtitle += sidecar.tracks_count()
 
+				list_command.append(path_output)
+			else:
+				list_command.append(option)
+
+		return tuple(list_command)
 
-# Use a dictionary to map a file type (key) to its metadata tool (value).
-# Assign a blank string to video file types yet unsupported.
 
-# Point to binaries and other supported format dependencies
-def dict_tool_metadata_get(input = None, output = None):
+# The tools we know of, with the arguments for a stream copy remux by each
+def dict_tools_default_get():
 	if platform.system() == "Windows":
-		binary_ffmpeg = "C:\\ffmpeg\\bin\\ffmpeg.exe",
-		binary_mkvmerge = "C:\\Program Files\\MKVToolNix\\mkvmerge.exe"
+		dict_binaries = {"ffmpeg": "C:\\ffmpeg\\bin\\ffmpeg.exe", "ffprobe": "C:\\ffmpeg\\bin\\ffprobe.exe",
+		                 "mkvmerge": "C:\\Program Files\\MKVToolNix\\mkvmerge.exe"}
 	else:
 		# Since we only support Windows or Linux, the fallback here is obvious
-		binary_ffmpeg = "/usr/bin/ffmpeg",
-		binary_mkvmerge = "/usr/bin/mkvmerge"
+		dict_binaries = {"ffmpeg": "/usr/bin/ffmpeg", "ffprobe": "/usr/bin/ffprobe", "mkvmerge": "/usr/bin/mkvmerge"}
+
+	return {
+		"ffmpeg"  : {"binary": dict_binaries["ffmpeg"], "version": ("-version",),
+		             "options": ("-hide_banner", "-i", "{input}", "-codec", "copy", "{output}")},
+		# In case we get subtitle codec not supported errors, use the options below to convert to srt
+		# "options": ("-hide_banner", "-i", "{input}", "-codec", "copy", "-c:s", "srt", "{output}")
+		# If using avconv instead of ffmpeg, use the options below
+		# "options": ("-i", "{input}", "-codec", "copy", "-map", "0", "{output}")
+		"mkvmerge": {"binary": dict_binaries["mkvmerge"], "version": ("--version",), "targets": ("mkv",),
+		             "options": ("{input}", "--verbose", "-o", "{output}")},
+		"ffprobe" : {"binary": dict_binaries["ffprobe"], "version": ("-version",)}
+	}
 
-	source_mkvmerge = ("avi", "divx", "flv", "m4v", "mpg", "mpeg", "webm")
-	source_ffmpeg = ("mp4", "mts", "m2ts", "wmv")
 
-	dict_keys_source = {
-		"mkv": (source_mkvmerge, source_ffmpeg)
-	}
+# Source formats each target container is converted from, with the tools to do
+# it with, in order of preference
+def routes_default_get():
+	return (
+		{"target": "mkv", "sources": ("avi", "divx", "flv", "m4v", "mpg", "mpeg", "webm"),
+		 "tools": ("mkvmerge", "ffmpeg")},
+		{"target": "mkv", "sources": ("mp4", "mts", "m2ts"), "tools": ("ffmpeg", "mkvmerge")},
+		{"target": "mkv", "sources": ("wmv",), "tools": ("ffmpeg",)},
+		{"target": "mp4", "sources": ("m4v", "mov", "mkv", "mts", "m2ts"), "tools": ("ffmpeg",)},
+		{"target": "webm", "sources": ("mkv",), "tools": ("ffmpeg",)}
+	)
+
+
+# Path to the configuration file, if one isn't given on the command line
+def path_config_get():
+	return os.path.join(app_dirs_get().user_config_dir, name_script_executable_get() + ".json")
+
+
+# The converters at our disposal, by target container and source format. Built
+# once, from the defaults above, amended by the configuration file. The
+# configuration may point tools at binaries of its choice, define tools of its
+# own, and add routes (preferred over the default ones for the same source and
+# target), like so:
+#
+# {
+#     "tools": {"ffmpeg": "/opt/ffmpeg/bin/ffmpeg",
+#               "avconv": {"binary": "/usr/bin/avconv", "options": ["-i", "{input}", "-codec", "copy", "{output}"]}},
+#     "routes": [{"target": "mkv", "sources": ["mp4"], "tools": ["mkvmerge"]},
+#                {"target": "mp4", "sources": ["avi"], "tools": ["ffmpeg"],
+#                 "options": ["-hide_banner", "-i", "{input}", "-codec", "copy", "-map", "0", "{output}"]}],
+#     "selection": "fastest"
+# }
+#
+# With more than one tool for a source, always the first that works is picked
+# ("selection": "first", the default), or the one with the best measured
+# throughput ("fastest"; each gets a few files to prove itself first).
+class ConverterRegistry:
+	# Conversions each tool gets before comparing throughput
+	count_trials = 3
+
+	def __init__(self, config = None):
+		config = config or {}
+
+		self.selection = config.get("selection", "first")
+		self.throughput = None
+
+		# Tools planned for each file (see ConversionPlanner.paths_planned())
+		self.dict_tools_planned = {}
+
+		dict_tools = dict_tools_default_get()
+
+		for name, tool in config.get("tools", {}).items():
+			if isinstance(tool, str):
+				tool = {"binary": tool}
+
+			dict_tools[name] = {**dict_tools.get(name, {}), **tool}
+
+		self.dict_tools = {}
+		self.dict_options = {}
+
+		for name, tool in dict_tools.items():
+			binary = tool.get("binary") or name
+
+			# A binary that isn't where it's configured to be may still be on the PATH
+			if not os.path.isfile(binary):
+				binary = shutil.which(os.path.basename(binary)) or shutil.which(name) or binary
+
+			self.dict_tools[name] = Tool(name, binary, tool.get("version", ("-version",)), tool.get("targets"))
+			self.dict_options[name] = tool.get("options")
+
+		# Routes by target, then source format
+		self.dict_routes = {}
+
+		for route in (*config.get("routes", ()), *routes_default_get()):
+			for source in route["sources"]:
+				list_routes = self.dict_routes.setdefault(route["target"], {}).setdefault(source.lower(), [])
+
+				for name in route["tools"]:
+					if name not in self.dict_tools:
+						raise ValueError("Unknown tool \'" + name + "\' in route to " + route["target"])
+
+					# The first route for a tool wins
+					if all(route_known.tool.name != name for route_known in list_routes):
+						list_routes.append(Route(self.dict_tools[name], route.get("options") or self.dict_options[name]))
+
+	def targets_get(self):
+		return tuple(self.dict_routes.keys())
+
+	def extensions_get(self, target):
+		return self.dict_routes.get(target, {})
+
+	def routes_get(self, target, extension):
+		return self.dict_routes.get(target, {}).get(extension, ())
+
+	def binary_get(self, name):
+		return self.dict_tools[name].binary
+
+	# Check the tools for a target container once, up front, and say which we've got
+	def preflight(self, target):
+		for tool in {route.tool for routes in self.extensions_get(target).values() for route in routes} | {
+				self.dict_tools["ffprobe"]}:
+			if tool.check():
+				message_info("Using " + tool.name + " at \'" + tool.binary + "\': " + tool.version)
+
+				if not tool.writes(target):
+					message_error("\'" + tool.binary + "\' can't write " + target + " files")
+			else:
+				message_error("No working " + tool.name + " found at \'" + tool.binary + "\'")
 
-	options_mkvmerge = (input, "--verbose", "-o", output)
-	options_ffmpeg = ("-hide_banner", "-i", input, "-codec", "copy", output)
-	# In case we get subtitle codec not supported errors, use the arguments below to convert to srt
-	#options_ffmpeg = ("-hide_banner", "-i", input, "-codec", "copy", "-c:s", "srt", output)
-	# If using avconv instead of ffmpeg, use the options below
-	#options_avconv = ("-i", input "-codec", "copy", "-map", "0", "-i", output)
+	# The route to convert a source format to a target container by, if any of
+	# the tools for it works
+	def route_pick(self, target, extension, path_file = None):
+		list_routes = [route for route in self.routes_get(target, extension) if
+		               route.tool.check() and route.tool.writes(target)]
+
+		# Carrying out a plan, stick to the tool planned
+		if path_file in self.dict_tools_planned:
+			return next((route for route in list_routes if route.tool.name == self.dict_tools_planned[path_file]),
+			            None)
+
+		if len(list_routes) < 2 or self.selection != "fastest" or self.throughput is None:
+			return list_routes[0] if list_routes else None
+
+		dict_rates = self.throughput.rates_get(target, extension)
+
+		for route in list_routes:
+			count, _ = dict_rates.get(route.tool.name, (0, 0))
+
+			if count < self.count_trials:
+				return route
+
+		return max(list_routes, key = lambda route: dict_rates[route.tool.name][1])
 
-	dict_tool_metadata = {
-		source_mkvmerge: (binary_mkvmerge, options_mkvmerge),
-		source_ffmpeg  : (binary_ffmpeg, options_ffmpeg)
-	}
 
-	return dict_keys_source, dict_tool_metadata
+# The converter registry, loaded once, from the configuration file given (else
+# the default one, if there's one)
+def converter_registry_get(path_config = None):
+	if converter_registry_get.registry is None:
+		config = None
+
+		if path_config is None and os.path.isfile(path_config_get()):
+			path_config = path_config_get()
+
+		if path_config:
+			with open(path_config, encoding = "utf-8") as file_config:
+				config = json.load(file_config)
+
+		converter_registry_get.registry = ConverterRegistry(config)
+
+	return converter_registry_get.registry
+
+converter_registry_get.registry = None
 
 
 def is_supported_platform():
 	return platform.system() == "Windows" or platform.system() == "Linux"
 
 
-# Open a log file to keep track of what we do
-def logging_initialize():
-	from appdirs import AppDirs
-
+# Name of this script, without the extension. Used to name the log and
+# data files.
+def name_script_executable_get():
 	# Use realpath instead to get through symlinks
-	name_script_executable = os.path.basename(os.path.realpath(__file__)).partition(".")[0]
-	dirs = AppDirs(name_script_executable, "Jay Ramani")
+	return os.path.basename(os.path.realpath(__file__)).partition(".")[0]
+
+
+# Application (log, data) directories, in a platform agnostic manner
+def app_dirs_get():
+	if app_dirs_get.dirs is None:
+		from appdirs import AppDirs
+
+		app_dirs_get.dirs = AppDirs(name_script_executable_get(), "Jay Ramani")
+
+	return app_dirs_get.dirs
+
+app_dirs_get.dirs = None
+
+
+# Writes out records without flushing each, so that a batch of them goes out in
+# one write; see LogListener
+class LogHandlerBatched(logging.StreamHandler):
+	def emit(self, record):
+		try:
+			self.stream.write(self.format(record) + self.terminator)
+		except Exception:
+			self.handleError(record)
+
+
+# Rings the bell on errors shown on the console
+class LogFormatterConsole(logging.Formatter):
+	def format(self, record):
+		message = super().format(record)
+
+		return "\a" + message if record.levelno >= logging.ERROR else message
+
+
+# Writes out records queued by the workers on a thread of its own, flushing its
+# handlers whenever the queue runs dry
+class LogListener(logging.handlers.QueueListener):
+	def dequeue(self, block):
+		try:
+			return self.queue.get_nowait()
+		except queue.Empty:
+			for handler in self.handlers:
+				handler.flush()
+
+			return self.queue.get(block)
+
+
+# Events are formatted once, and queued to be written to the console and the
+# log by a background thread (see logging_initialize()); the thread reporting
+# them never waits on a write. Those reported through message_*() are shown
+# on the console as well, subject to the verbosity chosen; those reported
+# through logging.*() only go to the log.
+extra_console = {"console": True}
+
+
+def message_info(message):
+	logging.info(message, extra = extra_console)
+
+
+def message_error(message):
+	logging.error(message, extra = extra_console)
+
+
+# Details (the commands run, and what they print) shown and logged only when
+# verbose
+def message_detail(message):
+	logging.debug(message, extra = extra_console)
+
+
+# What the converters print: always logged, and shown too when verbose
+def message_output(message):
+	logging.info(message, extra = extra_console if message_output.verbose else None)
+
+# Set up by logging_initialize()
+message_output.verbose = False
+
+
+# Open a log file to keep track of what we do, and set up the console and the
+# log for the verbosity given: negative for errors
+# alone on the console, positive for details too
+def logging_initialize(verbosity = 0):
+	name_script_executable = name_script_executable_get()
+	dirs = app_dirs_get()
+
+	handler_console = LogHandlerBatched(sys.stdout)
+	handler_console.setFormatter(LogFormatterConsole("%(message)s"))
+	handler_console.addFilter(lambda record: getattr(record, "console", False))
+	handler_console.setLevel(logging.ERROR if verbosity < 0 else logging.DEBUG if verbosity > 0 else logging.INFO)
+	message_output.verbose = verbosity > 0
+
+	list_handlers = [handler_console]
+	file_log = None
 
 	try:
 		os.makedirs(dirs.user_log_dir, exist_ok = True)
+
+		file_log = open(dirs.user_log_dir + os.path.sep + name_script_executable + " - " + time.strftime(
+			"%Y%m%d%I%M%S%z") + '.log', "a", encoding = "utf-8")
 	except PermissionError:
 		print("\aNo permission to write log files at \'" + dirs.user_log_dir + "\'!")
 	except:
 		print("\aUndefined exception!")
 		print("Error", sys.exc_info())
 	else:
-		print("Check logging results at \'" + dirs.user_log_dir + "\'\n")
+		handler_file = LogHandlerBatched(file_log)
+		handler_file.setFormatter(logging.Formatter("%(message)s"))
+		list_handlers.append(handler_file)
+
+	logger_root = logging.getLogger()
+	logger_root.setLevel(logging.DEBUG if verbosity > 0 else logging.INFO)
+
+	queue_log = queue.SimpleQueue()
+	handler_queue = logging.handlers.QueueHandler(queue_log)
+	logger_root.addHandler(handler_queue)
+
+	listener = LogListener(queue_log, *list_handlers, respect_handler_level = True)
+	listener.start()
+
+	logging_initialize.state = listener, handler_queue, file_log
+
+	if file_log:
+		message_info("Check logging results at \'" + dirs.user_log_dir + "\'\n")
 
 		# All good. Proceed with logging.
-		logging.basicConfig(filename = dirs.user_log_dir + os.path.sep + name_script_executable + " - " +
-		                               time.strftime("%Y%m%d%I%M%S%z") + '.log', level = logging.INFO,
-		                    format = "%(message)s")
 		logging.info("Log beginning at " + time.strftime("%d %b %Y (%a) %I:%M:%S %p %Z (GMT%z)") + " with PID: " + str(
 			os.getpid()) + ", started with arguments " + str(sys.argv) + "\n")
 
+logging_initialize.state = None
+
+
+# Write out whatever's queued, and close the log
+def logging_finalize():
+	if logging_initialize.state:
+		listener, handler_queue, file_log = logging_initialize.state
+		logging_initialize.state = None
+
+		logging.getLogger().removeHandler(handler_queue)
+		listener.stop()
+
+		for handler in listener.handlers:
+			handler.flush()
+			handler.close()
+
+		if file_log:
+			file_log.close()
+
+	logging.shutdown()
+
+
+# Path to the database we keep our state (probe results and the like) in
+def path_database_get():
+	dirs = app_dirs_get()
+
+	os.makedirs(dirs.user_data_dir, exist_ok = True)
+
+	return dirs.user_data_dir + os.path.sep + name_script_executable_get() + ".sqlite3"
+
+
+# Identifies the content of a file on disk, as best as we can tell without
+# reading it: if any of these change, anything we learnt about the file is
+# stale.
+def fingerprint_get(path_file, stat_file = None):
+	if stat_file is None:
+		stat_file = os.stat(path_file)
+
+	return stat_file.st_size, stat_file.st_mtime_ns, stat_file.st_ino
+
+
+# The database we keep state across runs in: probe results, and the outcome
+# of each file we've processed. Worker threads share the one connection,
+# serialised by a lock.
+class StateDatabase:
+	# Commit after these many writes; losing a few to a crash only costs us
+	# redoing a probe or a check
+	count_writes_commit = 64
+
+	# ... or this long after the first of them, at the latest. Other processes
+	# (started while a batch is being served, or watching) can't write till we do.
+	seconds_commit = 2
+
+	def __init__(self, path_database):
+		self.lock = threading.Lock()
+		self.count_writes = 0
+		self.timer_commit = None
+
+		self.connection = sqlite3.connect(path_database, check_same_thread = False)
+		self.connection.execute("PRAGMA journal_mode = WAL")
+		self.connection.execute("PRAGMA synchronous = NORMAL")
+
+	def fetch_one(self, statement, parameters = ()):
+		with self.lock:
+			return self.connection.execute(statement, parameters).fetchone()
+
+	def fetch_all(self, statement, parameters = ()):
+		with self.lock:
+			return self.connection.execute(statement, parameters).fetchall()
+
+	def write(self, statement, parameters = ()):
+		with self.lock:
+			self.connection.execute(statement, parameters)
+			self.count_writes += 1
+
+			if self.count_writes >= self.count_writes_commit:
+				self.commit_pending()
+			elif self.timer_commit is None:
+				self.timer_commit = threading.Timer(self.seconds_commit, self.commit)
+				self.timer_commit.daemon = True
+				self.timer_commit.start()
+
+	# Commit the writes pending, with the lock held
+	def commit_pending(self):
+		if self.timer_commit:
+			self.timer_commit.cancel()
+			self.timer_commit = None
+
+		if self.count_writes:
+			self.connection.commit()
+			self.count_writes = 0
+
+	def commit(self):
+		with self.lock:
+			# Closed meanwhile
+			if self.connection:
+				self.commit_pending()
+
+	def close(self):
+		with self.lock:
+			self.commit_pending()
+			self.connection.close()
+			self.connection = None
+
+
+# Persistent cache of ffprobe results, keyed by the file's path and
+# fingerprint. Saves spawning ffprobe for files we've already looked at,
+# be it in an earlier run or before a conversion.
+class ProbeCache:
+	def __init__(self, database):
+		self.database = database
+		self.database.write("CREATE TABLE IF NOT EXISTS probe ("
+		                    "path TEXT NOT NULL, "
+		                    "kind TEXT NOT NULL, "
+		                    "size INTEGER NOT NULL, "
+		                    "mtime_ns INTEGER NOT NULL, "
+		                    "inode INTEGER NOT NULL, "
+		                    "result TEXT NOT NULL, "
+		                    "PRIMARY KEY (path, kind))")
+
+	def lookup(self, path_file, kind, fingerprint):
+		row = self.database.fetch_one("SELECT size, mtime_ns, inode, result FROM probe WHERE path = ? AND kind = ?",
+		                              (path_file, kind))
+
+		if row and tuple(row[:3]) == tuple(fingerprint):
+			return json.loads(row[3])
+
+		return None
+
+	def store(self, path_file, kind, fingerprint, result):
+		self.database.write("INSERT OR REPLACE INTO probe VALUES (?, ?, ?, ?, ?, ?)",
+		                    (path_file, kind, *fingerprint, json.dumps(result)))
+
+	# Carry over what we know about a file to its new name
+	def move(self, path_old, path_new):
+		self.database.write("DELETE FROM probe WHERE path = ?", (path_new,))
+		self.database.write("UPDATE probe SET path = ? WHERE path = ?", (path_new, path_old))
+
+	# Drop whatever we know about a file, e.g. once it's deleted
+	def forget(self, path_file):
+		self.database.write("DELETE FROM probe WHERE path = ?", (path_file,))
+
+
+# Throughput of each tool converting each source format to each target
+# container, as measured over the conversions done, for picking the fastest
+# (see ConverterRegistry)
+class ThroughputStats:
+	def __init__(self, database):
+		self.database = database
+		self.database.write("CREATE TABLE IF NOT EXISTS throughput ("
+		                    "tool TEXT NOT NULL, "
+		                    "extension TEXT NOT NULL, "
+		                    "target TEXT NOT NULL, "
+		                    "count INTEGER NOT NULL, "
+		                    "bytes INTEGER NOT NULL, "
+		                    "seconds REAL NOT NULL, "
+		                    "PRIMARY KEY (tool, extension, target))")
+
+	def record(self, tool, extension, target, size, seconds):
+		self.database.write("INSERT OR IGNORE INTO throughput VALUES (?, ?, ?, 0, 0, 0)", (tool, extension, target))
+		self.database.write("UPDATE throughput SET count = count + 1, bytes = bytes + ?, seconds = seconds + ? WHERE "
+		                    "tool = ? AND extension = ? AND target = ?", (size, seconds, tool, extension, target))
+
+	# Conversions measured and bytes per second, by tool
+	def rates_get(self, target, extension):
+		return {tool: (count, bytes_total / max(seconds, 1e-6)) for tool, count, bytes_total, seconds in
+		        self.database.fetch_all("SELECT tool, count, bytes, seconds FROM throughput WHERE extension = ? AND "
+		                                "target = ?", (extension, target))}
+
+
+# Outcomes of processing a file, as recorded in the manifest
+OUTCOME_CONVERTED = "converted"
+OUTCOME_FAILED = "failed"
+# Something unforeseen went wrong, rather than the conversion failing
+OUTCOME_ERROR = "error"
+OUTCOME_SKIPPED_EXISTS = "skipped-exists"
+OUTCOME_SKIPPED_NO_SPACE = "skipped-no-space"
+OUTCOME_NO_TOOL = "no-tool"
+OUTCOME_UNSUPPORTED = "unsupported"
+
+
+# The job manifest: what became of each source file we've processed, along
+# with its fingerprint at the time. With --resume, files whose fingerprint
+# hasn't changed since are left alone.
+class Manifest:
+	# Outcomes worth retrying even when the file hasn't changed, since what
+	# held us back (disk space, a missing tool, a target in the way, an error
+	# of our own) may have since been sorted out
+	outcomes_retry = (OUTCOME_SKIPPED_EXISTS, OUTCOME_SKIPPED_NO_SPACE, OUTCOME_NO_TOOL, OUTCOME_ERROR)
+
+	def __init__(self, database):
+		self.database = database
+		self.database.write("CREATE TABLE IF NOT EXISTS manifest ("
+		                    "path TEXT NOT NULL, "
+		                    "container_target TEXT NOT NULL, "
+		                    "size INTEGER NOT NULL, "
+		                    "mtime_ns INTEGER NOT NULL, "
+		                    "inode INTEGER NOT NULL, "
+		                    "outcome TEXT NOT NULL, "
+		                    "time_recorded REAL NOT NULL, "
+		                    "PRIMARY KEY (path, container_target))")
+
+	# Returns the outcome recorded for the file, provided the file hasn't
+	# changed since
+	def outcome_get(self, path_file, container_target, fingerprint):
+		row = self.database.fetch_one("SELECT size, mtime_ns, inode, outcome FROM manifest "
+		                              "WHERE path = ? AND container_target = ?", (path_file, container_target))
+
+		if row and tuple(row[:3]) == tuple(fingerprint):
+			return row[3]
+
+		return None
+
+	def record(self, path_file, container_target, fingerprint, outcome):
+		self.database.write("INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?, ?, ?)",
+		                    (path_file, container_target, *fingerprint, outcome, time.time()))
+
+	# Pass on only the files (as path and stat result pairs) that are new, have
+	# changed, or are worth another try
+	def paths_unfinished(self, paths, container_target):
+		for item in paths:
+			# Nothing for now, from a feed that goes on
+			if item is None:
+				yield item
+
+				continue
+
+			path_file, stat_file = item
+
+			try:
+				fingerprint = fingerprint_get(path_file, stat_file)
+			except OSError:
+				# Let the conversion report on it
+				yield path_file, stat_file
+			else:
+				outcome = self.outcome_get(path_file, container_target, fingerprint)
+
+				if outcome is None or outcome in self.outcomes_retry:
+					yield path_file, stat_file
+				else:
+					logging.info("Skipping \'" + path_file + "\', unchanged since it was last processed (" + outcome +
+					             ")")
+
+
+# Time spent on a stage of processing a file (discovery, probe, convert, verify,
+# copy, delete), for the run report. Stages are timed exclusively: time spent in a
+# stage nested within another (say, probing while verifying) counts only
+# towards the inner one. A no-op unless a report is being kept for the file
+# this thread is on.
+@contextlib.contextmanager
+def metrics_stage(stage):
+	record = getattr(metrics_stage.local, "record", None)
+
+	if record is None:
+		yield
+
+		return
+
+	stack = metrics_stage.local.stack
+	time_now = time.monotonic()
+
+	if stack:
+		# Pause the enclosing stage
+		record["seconds_" + stack[-1][0]] += time_now - stack[-1][1]
+
+	stack.append([stage, time_now])
+
+	try:
+		yield
+	finally:
+		time_now = time.monotonic()
+		stage, time_started = stack.pop()
+		record["seconds_" + stage] += time_now - time_started
+
+		if stack:
+			# Resume the enclosing stage
+			stack[-1][1] = time_now
+
+# The record of the file this thread is on, and the stages it's in
+metrics_stage.local = threading.local()
+
+
+# Carry on with the record of a file on this thread, e.g. when a job is handed
+# over to another thread
+@contextlib.contextmanager
+def metrics_attach(record):
+	metrics_stage.local.record = record
+	metrics_stage.local.stack = []
+
+	try:
+		yield
+	finally:
+		metrics_stage.local.record = None
+
+
+# Record of the file this thread is on, if there's a report being kept
+def metrics_record_get():
+	return getattr(metrics_stage.local, "record", None)
+
+
+# Note a detail (such as the converter used) in the record of the file this
+# thread is on, if there's a report being kept
+def metrics_note(key, value):
+	record = getattr(metrics_stage.local, "record", None)
+
+	if record is not None:
+		record[key] = value
+
+
+# Value below which the given percentage of the (sorted) values fall
+def percentile_get(list_sorted, percent):
+	if not list_sorted:
+		return None
+
+	return list_sorted[min(len(list_sorted) - 1, int(len(list_sorted) * percent / 100))]
+
+
+# Machine readable report of a run: a record per file, with its size before and
+# after, the time spent in each stage and the conversion throughput, followed
+# by a summary of the run. Written as JSON lines, or as CSV if the file name
+# ends in .csv (with the summary in a JSON file alongside).
+class MetricsReport:
+	stages = ("discovery", "probe", "convert", "verify", "copy", "delete")
+	fields = ("path", "extension", "converter", "outcome", "bytes_in", "bytes_out", "throughput_mb_s",
+	          *("seconds_" + stage for stage in stages), "seconds_total")
+
+	def __init__(self, path_report):
+		self.path_report = path_report
+		self.lock = threading.Lock()
+		self.list_records = []
+		self.time_started = time.monotonic()
+
+		self.file_report = open(path_report, "w", newline = "", encoding = "utf-8")
+		self.writer_csv = None
+
+		if path_report.lower().endswith(".csv"):
+			self.writer_csv = csv.DictWriter(self.file_report, fieldnames = self.fields)
+			self.writer_csv.writeheader()
+
+	# Start the record of a file, on this thread. Returns the record, to hand to
+	# end().
+	def begin(self, path_file, stat_file, seconds_discovery):
+		record = dict.fromkeys(self.fields)
+		record.update({"path": path_file, "extension": split_root_extension(path_file)[1],
+		               "bytes_in": stat_file.st_size if stat_file else None, "bytes_out": 0,
+		               "time_started": time.monotonic()})
+		record.update({"seconds_" + stage: 0.0 for stage in self.stages})
+		record["seconds_discovery"] = seconds_discovery
+
+		metrics_stage.local.record = record
+		metrics_stage.local.stack = []
+
+		return record
+
+	# Wrap up the record of a file, and write it out
+	def end(self, record, outcome, container_target):
+		if metrics_record_get() is record:
+			metrics_stage.local.record = None
+
+		record["outcome"] = outcome
+		record["seconds_total"] = time.monotonic() - record.pop("time_started") + record["seconds_discovery"]
+
+		if outcome == OUTCOME_CONVERTED:
+			try:
+				record["bytes_out"] = os.path.getsize(
+					split_root_extension(record["path"])[0] + os.extsep + container_target)
+			except OSError:
+				pass
+
+		if record["bytes_in"] and record["seconds_convert"]:
+			record["throughput_mb_s"] = record["bytes_in"] / record["seconds_convert"] / 1000000
+
+		with self.lock:
+			self.list_records.append({key: record[key] for key in ("outcome", "bytes_in", "bytes_out",
+			                                                       "throughput_mb_s", "seconds_total",
+			                                                       *("seconds_" + stage for stage in self.stages))})
+
+			if self.writer_csv:
+				self.writer_csv.writerow(record)
+			else:
+				self.file_report.write(json.dumps(record) + "\n")
+
+			self.file_report.flush()
+
+	def summary_get(self):
+		summary = {"seconds_wall": time.monotonic() - self.time_started, "files": len(self.list_records),
+		           "outcomes": dict(collections.Counter(record["outcome"] for record in self.list_records)),
+		           "bytes_in": sum(record["bytes_in"] or 0 for record in self.list_records),
+		           "bytes_out": sum(record["bytes_out"] or 0 for record in self.list_records),
+		           "seconds_stages": {stage: sum(record["seconds_" + stage] for record in self.list_records)
+		                              for stage in self.stages}}
+
+		for key in ("seconds_total", "throughput_mb_s"):
+			list_values = sorted(record[key] for record in self.list_records if record[key] is not None)
+
+			summary[key] = {"p50": percentile_get(list_values, 50), "p90": percentile_get(list_values, 90),
+			                "p99": percentile_get(list_values, 99), "max": list_values[-1] if list_values else None}
+
+		return summary
+
+	def close(self):
+		summary = self.summary_get()
+
+		with self.lock:
+			if self.writer_csv:
+				with open(self.path_report + ".summary.json", "w", encoding = "utf-8") as file_summary:
+					json.dump(summary, file_summary, indent = "\t")
+			else:
+				self.file_report.write(json.dumps({"summary": summary}) + "\n")
+
+			self.file_report.close()
+
+		message_info("Run report written to \'" + self.path_report + "\'. Time per file: median " + str(
+			round(summary["seconds_total"]["p50"] or 0, 2)) + "s, 90th percentile " + str(
+			round(summary["seconds_total"]["p90"] or 0, 2)) + "s\n")
+		logging.info("Run report written to \'" + self.path_report + "\': " + json.dumps(summary) + "\n")
+
 
 # Returns the label for a drive/partition/volume. Used to
 # easily locate videos on a particular disk/partition/volume
@@ -123,10 +1058,12 @@ def get_volume_label(path):
 
 			label = (win32api.GetVolumeInformation(drive + os.sep))[0]
 	else:
-		# We're on one of the Unices. Import only when required.
-		import psutil
+		# We're on one of the Unices; go with the mount point of the volume the
+		# path is on
+		label = os.path.realpath(path)
 
-		label = psutil.disk_partitions()[0].mountpoint
+		while not os.path.ismount(label):
+			label = os.path.dirname(label)
 
 	return label
 
@@ -146,317 +1083,1839 @@ def split_root_extension(source_path):
 	return root, extension
 
 
-def duration_container_get(path_file):
-	duration = 0
+# Reports the progress of a conversion as it runs, from what the converter
+# prints: mkvmerge's "Progress: 42%", or ffmpeg's "time=00:01:02.03" against
+# the source duration, if we know it. Reports are throttled, as converters
+# update progress many times a second.
+class ProcessProgress:
+	regex_percent = re.compile(r"Progress: (\d+)%")
+	regex_time = re.compile(r"time=\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
 
-	if platform.system() == "Windows":
-		binary_ffprobe = "C:\\ffmpeg\\bin\\ffprobe.exe"
-	else:
-		# Since we only support Windows or Linux, the fallback here is obvious
-		binary_ffprobe = "/usr/bin/ffprobe"
+	# Report every these many percent, or seconds, whichever comes first
+	step_percent = 10
+	step_seconds = 30
 
-	print("Executing command: " + binary_ffprobe + "-v " + "error " + "-show_entries " + "format=duration " + "-of " + "default=noprint_wrappers=1:nokey=1 " + "-i " + path_file + "\n")
-	logging.info("Executing command: " + binary_ffprobe + "-v " + "error " + "-show_entries " + "format=duration " + "-of " + "default=noprint_wrappers=1:nokey=1 " + "-i " + path_file + "\n")
+	def __init__(self, path_file, duration = None):
+		self.path_file = path_file
+		self.duration = duration
+		self.percent_reported = 0
+		self.time_reported = time.monotonic()
 
-	try:
-		# Strip the output as ffprobe ends the orchestra with a new line character
-		duration = subprocess.run((binary_ffprobe, "-v", "error", "-show_entries",
-		                           "format=duration", "-of", "default=noprint_wrappers=1:nokey=1",
-		                           "-i", path_file), stdout = subprocess.PIPE, check = True,
-		                          universal_newlines = True).stdout.strip()
-	except subprocess.CalledProcessError as error_conversion:
-		duration = 0
-
-		print(error_conversion.stderr)
-		print(error_conversion.output)
-		print("\aError probing duration for \'" + path_file + "\'")
-		print("Command that resulted in the exception: " + str(error_conversion.cmd))
-		print("Error", sys.exc_info())
+	# Returns whether the line was a progress report, so the caller can skip
+	# logging it verbatim
+	def line_handle(self, line):
+		percent = seconds = None
 
-		logging.error(error_conversion.stderr)
-		logging.error(error_conversion.output)
-		logging.info("Command that resulted in the exception: " + str(error_conversion.cmd))
-		logging.error(
-			"Error probing duration for \'" + path_file + "\' " + str(sys.exc_info()))
-	except:
-		# Handle any generic exception
-		print("Undefined exception")
-		print("\aError probing duration of \'" + path_file + "\'")
-		print("Error", sys.exc_info())
+		match = self.regex_percent.search(line)
+
+		if match:
+			percent = int(match.group(1))
+		else:
+			match = self.regex_time.search(line)
 
-		logging.error("Undefined exception")
-		logging.error("Error probing duration of \'" + path_file + "\': " + str(sys.exc_info()))
+			if not match:
+				return False
 
-		show_toast("Error", "Error probing duration of \'" + path_file + "\'. Check the log.")
-	else:
-		# Convert the duration in seconds (in decimal) obtained as string to
-		# actual float, and convert seconds to nano-seconds for use with
-		# total_time_in_hms_get()
-		duration_ns = float(duration) * 1000000000
+			seconds = int(match.group(1)) * 3600 + int(match.group(2)) * 60 + float(match.group(3))
 
-		print("Duration of \'" + path_file + "\': " + total_time_in_hms_get(duration_ns) + ", approximately")
-		logging.info("Duration of \'" + path_file + "\': " + total_time_in_hms_get(duration_ns) + ", approximately")
+			if self.duration:
+				percent = min(100, int(seconds * 100 / self.duration))
 
-	print("\n")
-	logging.info("\n")
+		time_now = time.monotonic()
 
-	# Convert the float in string to int to ignore the fractional part. This
-	# would differ between the source and target container formats in most cases;
-	# as a consequence, the duration check in post_process() will otherwise fail.
-	return int(float(duration))
+		if (percent is not None and percent >= self.percent_reported + self.step_percent) or (
+				time_now - self.time_reported >= self.step_seconds):
+			if percent is not None:
+				self.percent_reported = percent - percent % self.step_percent
+				report = str(percent) + "%"
+			else:
+				report = total_time_in_hms_get(seconds * 1000000000) + " in"
 
+			self.time_reported = time_now
 
-# The post conversion process. If we find a Matroska file, with the same
-# (container, not stream) duration as the source file, we assume the
-# conversion was successful. We then delete the source file to save space.
-def post_process(root, path_file, container_target_extension, list_failed_conversions):
-	container_target_name_abs = root + os.extsep + container_target_extension
+			message_info("Converting \'" + self.path_file + "\': " + report)
 
-	# Does the target format file exist? If so, go ahead with the next steps.
-	if os.path.isfile(container_target_name_abs):
-		duration_target = duration_container_get(container_target_name_abs)
-		duration_source = duration_container_get(path_file)
-
-		# Are the container (not stream) durations the same? If so, the conversion
-		# is assumed to be successful; delete. Else, leave the source file intact.
-		if duration_target == duration_source:
-			print("Conversion of \'" + path_file + "\' to \'" + container_target_name_abs + "\' seems to be valid\n")
-			logging.info(
-				"Conversion of \'" + path_file + "\' to \'" + container_target_name_abs + "\' seems to be valid\n")
-
-			# TODO: This is not a platform safe check. While it works on Windows,
-			# it requires to be modified for the Unices, where the upper 8 bits of
-			# the 16 bit integer returned needs to be checked for.
-
-			# Successful exit status is zero
-			if not os.remove(path_file):
-				print("Deleted source file \'" + path_file + "\'\n")
-				logging.info("Deleted source file \'" + path_file + "\'\n")
-			else:
-				print("\aFailed to delete the source file \'" + path_file + "\'\n")
-				logging.error("Failed to delete the source file \'" + path_file + "\'\n")
-		else:
-			print(
-				"\aDuration mismatch of \'" + container_target_name_abs + "\' (" + str(duration_target) + "s) with source (" + str(duration_source) + "s). Skipping deleting \'" + path_file + "\'.")
-			logging.error(
-				"Duration mismatch of \'" + container_target_name_abs + "\' (" + str(duration_target) + "s) with source (" + str(duration_source) + "s). Skipping deleting \'" + path_file + "\'.")
+		return True
 
-			# If the duration was a mismatch, this is a failed conversion
-			list_failed_conversions.append(path_file)
 
-			# Either the source itself is corrupt, or our converted version
-			# appears effed up. Don't litter.
-			if not os.remove(container_target_name_abs):
-				print("Deleted suspicious target file \'" + container_target_name_abs + "\'\n")
-				logging.info("Deleted suspicious target file \'" + container_target_name_abs + "\'\n")
+# Lines of output kept from each stream of a child process, so they can be
+# attached to the error when it fails. Everything is logged as it comes, so
+# there's no need to hold on to more.
+count_lines_ring = 200
+
+
+# The event loop running our child processes (converters and ffprobe). One
+# loop, on a thread of its own, serves all worker threads. Started when
+# first needed.
+def subprocess_loop_get():
+	with subprocess_loop_get.lock:
+		if subprocess_loop_get.loop is None:
+			import asyncio
+
+			if platform.system() == "Windows":
+				# Only the proactor loop supports subprocesses on Windows
+				loop = asyncio.ProactorEventLoop()
 			else:
-				print("Failed to delete suspicious target file \'" + container_target_name_abs + "\'\n")
-				logging.error("Failed to delete suspicious target file \'" + container_target_name_abs + "\'\n")
-	else:
-		# No target version found. How'd we even get here?
-		print("\aTarget file \'" + container_target_name_abs + "\' not found!\n")
-		logging.error("Target file \'" + container_target_name_abs + "\' not found!\n")
+				loop = asyncio.new_event_loop()
 
+			threading.Thread(target = loop.run_forever, name = "subprocess-engine", daemon = True).start()
 
-def conversion_failure_cleanup(path_file, container_target_name_abs, list_failed_conversions):
-	# We need to clean up the improperly constructed Matroska format. Check
-	# if the file exists in the first place.
-	if os.path.isfile(container_target_name_abs):
-		# Mop up litter, post the futile conversion
-		print("\'" + container_target_name_abs + "\', was improperly done; deleting...")
-		logging.info(
-			"\'" + container_target_name_abs + "\', was improperly done; deleting...")
+			subprocess_loop_get.loop = loop
 
-		# TODO: This is not a platform safe check. While it works on Windows,
-		# it requires to be modified for the Unices, where the upper 8 bits of
-		# the 16 bit integer returned needs to be checked for.
+	return subprocess_loop_get.loop
 
-		# Successful exit status is zero
-		if not os.remove(container_target_name_abs):
-			print("Deleted \'" + container_target_name_abs + "\'\n")
-			logging.info("Deleted \'" + container_target_name_abs + "\'\n")
-		else:
-			print("Failed to delete \'" + container_target_name_abs + "\'\n")
-			logging.error("Failed to delete \'" + container_target_name_abs + "\'\n")
+subprocess_loop_get.loop = None
+subprocess_loop_get.lock = threading.Lock()
 
-	list_failed_conversions.append(path_file)
 
-	print_spacer()
+# How much of the CPU and the disks to let the child processes (converters and
+# ffprobe) have, so that conversions don't get in the way of whatever else the
+# system is up to, such as a media server streaming off the same disks. On
+# Linux, commands are run through nice and ionice; on Windows, which has
+# priority classes rather than levels, a niceness of 15 or more runs them in
+# the idle class, and anything less, below normal.
+class ProcessPriority:
+	def __init__(self, nice = 0, ionice = None):
+		self.prefix = ()
+		self.creationflags = 0
 
+		if platform.system() == "Windows":
+			if nice:
+				self.creationflags = subprocess.IDLE_PRIORITY_CLASS if nice >= 15 else \
+					subprocess.BELOW_NORMAL_PRIORITY_CLASS
 
-# Check if we have enough space to go ahead with the conversion to
-# Matroska. In doing so, we check for a ballpark 1.2 times the source
-# file, as that's how much maximum or lesser the Matroska version will
-# take. Else we report nay to the caller.
-def disk_space_check(path_file):
-	availability = False
+			if ionice:
+				message_error("Windows doesn't let us set the I/O priority of the converters; ignoring --ionice")
+		else:
+			if ionice:
+				binary_ionice = shutil.which("ionice")
+
+				if binary_ionice:
+					# Idle only gets the disk when no one else wants it; best effort at the
+					# lowest level still gets a share
+					self.prefix += (binary_ionice, "-c", "3") if ionice == "idle" else (binary_ionice, "-c", "2",
+					                                                                    "-n", "7")
+				else:
+					message_error("ionice wasn't found; running the converters at the usual I/O priority")
 
-	total, used, free = shutil.disk_usage(os.path.splitdrive(Path(os.path.normpath(path_file)).resolve())[0])
+			if nice:
+				binary_nice = shutil.which("nice")
 
-	if free > (1.2 * os.stat(path_file).st_size):
-		availability = True
+				if binary_nice:
+					self.prefix += (binary_nice, "-n", str(nice))
+				else:
+					message_error("nice wasn't found; running the converters at the usual CPU priority")
+
+	def command_get(self, command):
+		return (*self.prefix, *command)
 
-	return availability, free
 
+# Caps how fast the child processes read, between them, by stopping them
+# (SIGSTOP) whenever they're ahead of the rate allowed, and letting them go on
+# (SIGCONT) once it's caught up. What they've read is taken off /proc, so this
+# needs Linux. Up to a second's worth goes through in a burst.
+class ReadThrottle:
+	seconds_tick = 0.1
 
-# Format size in kibi, mebi, gibi etc. for user readability
-def sizeof_fmt(num, suffix = 'B'):
-	for unit in ('', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi'):
-		if abs(num) < 1024.0:
-			return "%3.1f%s%s" % (num, unit, suffix)
-		num /= 1024.0
+	def __init__(self, bytes_per_second):
+		if not os.path.isfile("/proc/self/io"):
+			raise OSError("no /proc/<pid>/io to count reads off")
 
-	return "%.1f%s%s" % (num, 'Yi', suffix)
+		self.bytes_per_second = bytes_per_second
+		self.lock = threading.Lock()
+		self.stopped = False
 
+		# Child processes, with what each had read when last looked at
+		self.dict_processes = {}
 
-# Print a spacer after every file's processing for sifting through the output
-# and log
-def print_spacer():
-	print("----- ----- ----- ----- -----")
-	logging.info("----- ----- ----- ----- -----")
+		self.event_closing = threading.Event()
+		self.thread = threading.Thread(target = self.run, name = "read-throttle", daemon = True)
+		self.thread.start()
 
+	@staticmethod
+	def read_get(pid):
+		try:
+			with open("/proc/" + str(pid) + "/io") as file_io:
+				for line in file_io:
+					if line.startswith("rchar:"):
+						return int(line.split()[1])
+		except (OSError, ValueError):
+			# Gone
+			pass
 
-# Fetch the converter executable and its options
-def container_converter_get(path_file, container_target_name_abs, extension):
-	container_converter = options = None
+		return None
 
-	# Pass the input and output files, so we get them back in an extensible format with
-	# a dictionary
-	dict_keys_source, dict_tool_metadata = dict_tool_metadata_get(path_file, container_target_name_abs)
+	def signal_send(self, signal_number):
+		for pid in self.dict_processes:
+			with contextlib.suppress(ProcessLookupError):
+				os.kill(pid, signal_number)
 
-	source = None
+	def register(self, pid):
+		import signal
 
-	for key, value in dict_tool_metadata.items():
-		if extension in key:
-			source = key
+		with self.lock:
+			self.dict_processes[pid] = self.read_get(pid) or 0
 
-			break
+			# Wait along with the rest
+			if self.stopped:
+				with contextlib.suppress(ProcessLookupError):
+					os.kill(pid, signal.SIGSTOP)
 
-	# Proceed only if a valid source was found for the target container format we received
-	if source:
-		container_converter, options = dict_tool_metadata[source]
+	def unregister(self, pid):
+		with self.lock:
+			self.dict_processes.pop(pid, None)
 
-	return container_converter, options
+	def run(self):
+		import signal
 
+		allowance = self.bytes_per_second
+		time_last = time.monotonic()
 
-# Converts the video file argument received to Matroska format
-def container_format_matroska_set(path_file, list_failed_conversions, container_target_extension):
-	root, extension = split_root_extension(path_file)
+		while not self.event_closing.wait(self.seconds_tick):
+			time_now = time.monotonic()
+			allowance = min(self.bytes_per_second, allowance + self.bytes_per_second * (time_now - time_last))
+			time_last = time_now
 
-	container_target_name_abs = root + os.extsep + container_target_extension
+			with self.lock:
+				for pid, read_last in list(self.dict_processes.items()):
+					read = self.read_get(pid)
 
-	# Proceed only if a target container version of the source file doesn't already
-	# exist
-	if not os.path.isfile(container_target_name_abs):
-		container_converter, options, = container_converter_get(path_file, container_target_name_abs, extension)
+					if read is not None:
+						allowance -= read - read_last
+						self.dict_processes[pid] = read
 
-		if container_converter is not None and options is not None:
-			# Check if disk space is available for creating the video
-			# with the new container. Else, report and skip the current
-			# file. We still continue as we may have received file(s)
-			# on other disks/drives in the next command line argument(s).
-			# Use pathlib to get the absolute path; this is vital for
-			# shutil.disk_usage, else it will fail.
-			availability, free = disk_space_check(path_file)
+				if allowance < 0 and not self.stopped:
+					self.signal_send(signal.SIGSTOP)
+					self.stopped = True
+				elif allowance >= 0 and self.stopped:
+					self.signal_send(signal.SIGCONT)
+					self.stopped = False
 
-			if availability:
-				container_converter = "".join(container_converter)
+	def close(self):
+		import signal
 
-				# Check if the metadata tool exists in the path defined
-				if os.path.isfile(container_converter):
-					# We got a valid tool to write metadata
-					output = ""
+		self.event_closing.set()
+		self.thread.join()
 
-					# Track conversion start time in nano-seconds
-					time_start = time.monotonic_ns()
+		with self.lock:
+			if self.stopped:
+				self.signal_send(signal.SIGCONT)
+				self.stopped = False
 
-					try:
-						output = subprocess.run((container_converter, *options), stdout = subprocess.PIPE,
-						                        check = True, universal_newlines = True)
-					except subprocess.CalledProcessError as error_conversion:
-						if error_conversion.stderr:
-							print(error_conversion.stderr)
-							logging.error(error_conversion.stderr)
 
-						if error_conversion.output:
-							print(error_conversion.output)
-							logging.error(error_conversion.output)
-							logging.error(error_conversion.output)
+# Read a child process' output stream as it comes, handing over one line at a
+# time. Progress updates end in a carriage return, so that counts as a line
+# break too. Characters split across reads are put back together before
+# they're decoded.
+async def stream_lines_read(stream, line_handle):
+	import codecs
+
+	decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors = "replace")
+	pending = ""
+
+	while True:
+		chunk = await stream.read(65536)
 
-						print("\aError converting \'" + path_file + "\' to Matroska")
-						print("Command that resulted in the exception: " + str(error_conversion.cmd))
-						print("Error", sys.exc_info())
+		if not chunk:
+			break
 
-						logging.info("Command that resulted in the exception: " + str(error_conversion.cmd))
-						logging.error(
-							"Error converting \'" + path_file + "\' to Matroska" + str(sys.exc_info()))
+		lines = re.split(r"[\r\n]", pending + decoder.decode(chunk))
+		pending = lines.pop()
 
-						conversion_failure_cleanup(path_file, container_target_name_abs, list_failed_conversions)
+		# Don't let a stream without line breaks eat up memory
+		if len(pending) > 65536:
+			lines.append(pending)
+			pending = ""
 
-						show_toast("Error", "Error converting \'" + path_file + "\'. Check the log.")
-					# Handle any generic exception
-					except:
-						print("Undefined exception")
-						print("Error converting \'" + path_file + "\'")
-						print("Error", sys.exc_info())
+		for line in lines:
+			if line.strip():
+				line_handle(line)
 
-						logging.error("Undefined exception")
-						logging.error("Error converting \'" + path_file + "\': " + str(sys.exc_info()))
+	# Whatever's left of a character cut short
+	pending += decoder.decode(b"", final = True)
 
-						conversion_failure_cleanup(path_file, container_target_name_abs, list_failed_conversions)
+	if pending.strip():
+		line_handle(pending)
 
-						show_toast("Error", "Error converting \'" + path_file + "\'. Check the log.")
-					else:
-						# Track conversion end time in nano-seconds
-						time_end = time.monotonic_ns()
 
-						container_format_matroska_set.total_time_conversion += time_end - time_start
-						container_format_matroska_set.total_count_conversion += 1
+async def process_run_async(command, output_keep, progress):
+	import asyncio
 
-						print(
-							"\nConversion of \'" + path_file + "\' to " + container_target_extension.capitalize() + " format complete")
-						logging.info(
-							"\nConversion of \'" + path_file + "\' to " + container_target_extension.capitalize() + " format complete")
+	ring_stdout = collections.deque(maxlen = count_lines_ring)
+	ring_stderr = collections.deque(maxlen = count_lines_ring)
 
-						if output:
-							print(output)
-							logging.info(output)
+	def line_stdout_handle(line):
+		ring_stdout.append(line)
 
-						post_process(root, path_file, container_target_extension, list_failed_conversions)
+		if not (progress and progress.line_handle(line)):
+			message_output(line)
 
-					finally:
-						print_spacer()
-				else:
-					print("No metadata tool found at \'" + container_converter + "\'")
-					logging.error("No metadata tool found at \'" + container_converter + "\'")
+	def line_stderr_handle(line):
+		ring_stderr.append(line)
 
-					print_spacer()
-			else:
-				print(
-					"Not enough disk space available in \'" + get_volume_label(
-						path_file) + "\'; need " + "{:>1}".format(
-						sizeof_fmt(os.stat(path_file).st_size * 1.2)) + ", available " + "{:>1}".format(
-						sizeof_fmt(free)) + ". Can't process \'" + path_file + "\'.\n")
-				logging.error(
-					"Not enough disk space available in \'" + get_volume_label(
-						path_file) + "\'; need " + "{:>1}".format(
-						sizeof_fmt(os.stat(path_file).st_size * 1.2)) + ", available " + "{:>1}".format(
-						sizeof_fmt(free)) + ". Can't process \'" + path_file + "\'.\n")
+		if not (progress and progress.line_handle(line)):
+			message_output(line)
 
-				print_spacer()
+	priority = process_run.priority
+	throttle = process_run.throttle
 
+	process = await asyncio.create_subprocess_exec(*(priority.command_get(command) if priority else command),
+	                                               stdin = subprocess.DEVNULL, stdout = subprocess.PIPE,
+	                                               stderr = subprocess.PIPE,
+	                                               creationflags = priority.creationflags if priority else 0)
 
-#	else:
-#		if extension == container_target_extension:
-#			print(
-#				"Target \'" + container_target_name_abs + "\' already exists. Skipping file \'" + path_file + "\'...\n")
-#			logging.error(
-#				"Target \'" + container_target_name_abs + "\' already exists. Skipping file \'" + path_file + "\'...\n")
+	if throttle:
+		throttle.register(process.pid)
 
-#			print_spacer()
+	try:
+		if output_keep:
+			# ffprobe's JSON is small, and needs to be whole to be parsed
+			output, _ = await asyncio.gather(process.stdout.read(),
+			                                 stream_lines_read(process.stderr, line_stderr_handle))
+			output = output.decode(locale.getpreferredencoding(False), errors = "replace")
+		else:
+			await asyncio.gather(stream_lines_read(process.stdout, line_stdout_handle),
+			                     stream_lines_read(process.stderr, line_stderr_handle))
+			output = "\n".join(ring_stdout)
 
-container_format_matroska_set.total_time_conversion = 0
-container_format_matroska_set.total_count_conversion = 0
+		return_code = await process.wait()
+	except asyncio.CancelledError:
+		# Don't leave the child behind, e.g. when interrupted from the keyboard
+		process.kill()
+		await process.wait()
+
+		raise
+	finally:
+		if throttle:
+			throttle.unregister(process.pid)
+
+	return return_code, output, "\n".join(ring_stderr)
+
+
+# Run a command on the subprocess engine, logging its output as it comes.
+# Returns the output in full if output_keep is set (for ffprobe's JSON), else
+# its tail end. Raises subprocess.CalledProcessError on a non-zero exit
+# status, with the tail end of the output and error streams attached.
+def process_run(command, output_keep = False, progress = None):
+	import asyncio
+
+	future = asyncio.run_coroutine_threadsafe(process_run_async(command, output_keep, progress),
+	                                          subprocess_loop_get())
+
+	try:
+		return_code, output, error = future.result()
+	except BaseException:
+		future.cancel()
+
+		raise
+
+	if return_code:
+		raise subprocess.CalledProcessError(return_code, command, output = output, stderr = error)
+
+	return output
+
+# Set up by main(), as asked for on the command line (see ProcessPriority and
+# ReadThrottle)
+process_run.priority = None
+process_run.throttle = None
+
+
+# Reads what ffprobe would say of a file (-show_format -show_streams) straight
+# off its headers, for the containers we deal in the most: Matroska (and
+# WebM), MP4 (and MOV) and AVI. Verifying a conversion probes both the source
+# and the target, and spawning ffprobe for each costs more than the probe
+# itself, on Windows in particular. Only what verification looks at is filled
+# in: the duration, and each stream's type, codec, duration and a few basics.
+# Codec names follow ffprobe's where we know them; since they won't always
+# agree with ffprobe's, results are marked with the prober, and codecs are only
+# compared between results of the same one (see streams_compare()). Anything
+# we can't make out is left to ffprobe.
+class HeaderProber:
+	# Most a header (AVI's hdrl list, MP4's moov box, a Matroska top level
+	# element) may take up; anything bigger is left to ffprobe
+	size_header_max = 64 * 1024 * 1024
+
+	# Video codecs by FOURCC, as AVI (and Matroska's VfW compatibility mode)
+	# has them
+	dict_codecs_fourcc = {
+		"XVID": "mpeg4", "DIVX": "mpeg4", "DX50": "mpeg4", "FMP4": "mpeg4", "MP4V": "mpeg4", "3IV2": "mpeg4",
+		"DIV3": "msmpeg4v3", "MP43": "msmpeg4v3", "MP42": "msmpeg4v2", "MPG4": "msmpeg4v1",
+		"H264": "h264", "X264": "h264", "AVC1": "h264", "HEVC": "hevc", "H265": "hevc", "HVC1": "hevc",
+		"MJPG": "mjpeg", "WMV1": "wmv1", "WMV2": "wmv2", "WMV3": "wmv3", "WVC1": "vc1", "VP80": "vp8",
+		"VP90": "vp9", "AV01": "av1", "MPG1": "mpeg1video", "MPG2": "mpeg2video", "DVSD": "dvvideo",
+		"CVID": "cinepak", "DXSB": "xsub"}
+
+	# Audio codecs by WAVEFORMATEX format tag, as AVI (and Matroska's ACM
+	# compatibility mode) has them
+	dict_codecs_wave = {
+		0x0002: "adpcm_ms", 0x0003: "pcm_f32le", 0x0006: "pcm_alaw", 0x0007: "pcm_mulaw", 0x0011: "adpcm_ima_wav",
+		0x0050: "mp2", 0x0055: "mp3", 0x00FF: "aac", 0x0160: "wmav1", 0x0161: "wmav2", 0x0162: "wmapro",
+		0x1610: "aac", 0x2000: "ac3", 0x2001: "dts", 0x706D: "aac", 0xF1AC: "flac"}
+
+	dict_codecs_matroska = {
+		"V_MPEG4/ISO/AVC": "h264", "V_MPEGH/ISO/HEVC": "hevc", "V_MPEG4/ISO/ASP": "mpeg4", "V_MPEG4/ISO/SP": "mpeg4",
+		"V_MPEG4/ISO/AP": "mpeg4", "V_MPEG4/MS/V3": "msmpeg4v3", "V_MPEG1": "mpeg1video", "V_MPEG2": "mpeg2video",
+		"V_VP8": "vp8", "V_VP9": "vp9", "V_AV1": "av1", "V_THEORA": "theora", "V_MJPEG": "mjpeg",
+		"A_AAC": "aac", "A_AC3": "ac3", "A_EAC3": "eac3", "A_DTS": "dts", "A_MPEG/L3": "mp3", "A_MPEG/L2": "mp2",
+		"A_FLAC": "flac", "A_VORBIS": "vorbis", "A_OPUS": "opus", "A_TRUEHD": "truehd", "A_ALAC": "alac",
+		"A_PCM/FLOAT/IEEE": "pcm_f32le",
+		"S_TEXT/UTF8": "subrip", "S_TEXT/ASS": "ass", "S_TEXT/SSA": "ass", "S_ASS": "ass", "S_SSA": "ass",
+		"S_TEXT/WEBVTT": "webvtt", "S_VOBSUB": "dvd_subtitle", "S_HDMV/PGS": "hdmv_pgs_subtitle",
+		"S_DVBSUB": "dvb_subtitle"}
+
+	dict_types_matroska = {1: "video", 2: "audio", 0x11: "subtitle"}
+
+	# Codecs by MP4 sample entry type
+	dict_codecs_mp4 = {
+		"avc1": "h264", "avc3": "h264", "hvc1": "hevc", "hev1": "hevc", "av01": "av1", "vp08": "vp8", "vp09": "vp9",
+		"s263": "h263", "jpeg": "mjpeg", "mjpa": "mjpeg", "apcn": "prores", "apch": "prores", "apcs": "prores",
+		"apco": "prores", "ap4h": "prores", "dvc ": "dvvideo", "dvcp": "dvvideo",
+		"ac-3": "ac3", "ec-3": "eac3", "Opus": "opus", "fLaC": "flac", "alac": "alac", ".mp3": "mp3",
+		"sowt": "pcm_s16le", "twos": "pcm_s16be", "ulaw": "pcm_mulaw", "alaw": "pcm_alaw",
+		"tx3g": "mov_text", "text": "mov_text", "wvtt": "webvtt", "c608": "eia_608", "stpp": "ttml"}
+
+	# Codecs by MPEG-4 object type, for sample entries (mp4a, mp4v) that leave
+	# it to their elementary stream descriptor
+	dict_object_types_mp4 = {
+		0x20: "mpeg4", 0x21: "h264", 0x23: "hevc", 0x40: "aac", 0x66: "aac", 0x67: "aac", 0x68: "aac",
+		0x69: "mp3", 0x6B: "mp3", 0x60: "mpeg2video", 0x61: "mpeg2video", 0x62: "mpeg2video", 0x63: "mpeg2video",
+		0x64: "mpeg2video", 0x65: "mpeg2video", 0x6A: "mpeg1video", 0x6C: "mjpeg", 0xA5: "ac3", 0xA6: "eac3",
+		0xA9: "dts", 0xAD: "opus"}
+
+	dict_types_mp4 = {"vide": "video", "soun": "audio", "subt": "subtitle", "text": "subtitle", "sbtl": "subtitle",
+	                  "clcp": "subtitle"}
+
+	# Probe a file, ffprobe style. Returns None if it isn't in a container we
+	# know, or we can't make it out.
+	def probe(self, path_file):
+		try:
+			with open(path_file, "rb") as file_video:
+				size_file = os.fstat(file_video.fileno()).st_size
+				magic = file_video.read(12)
+				file_video.seek(0)
+
+				if magic[:4] == b"\x1a\x45\xdf\xa3":
+					format_name, duration, list_streams = "matroska,webm", *self.matroska_probe(file_video, size_file)
+				elif magic[:4] == b"RIFF" and magic[8:12] == b"AVI ":
+					format_name, duration, list_streams = "avi", *self.avi_probe(file_video, size_file)
+				elif magic[4:8] in (b"ftyp", b"moov", b"free", b"skip", b"wide", b"mdat", b"pnot"):
+					format_name, duration, list_streams = "mov,mp4,m4a,3gp,3g2,mj2", *self.mp4_probe(file_video,
+					                                                                                 size_file)
+				else:
+					return None
+		except (OSError, ValueError, IndexError, KeyError, TypeError, struct.error):
+			logging.debug("Could not read the headers of \'" + path_file + "\': " + str(sys.exc_info()[1]))
+
+			return None
+
+		if duration is None or not list_streams:
+			return None
+
+		for index, stream in enumerate(list_streams):
+			stream["index"] = index
+
+			if stream.get("duration") is not None:
+				stream["duration"] = "%.6f" % stream["duration"]
+			else:
+				stream.pop("duration", None)
+
+		return {"prober": "header",
+		        "format": {"filename": path_file, "format_name": format_name, "nb_streams": len(list_streams),
+		                   "duration": "%.6f" % duration, "size": str(size_file)},
+		        "streams": list_streams}
+
+	@staticmethod
+	def codec_wave_get(data):
+		tag, = struct.unpack_from("<H", data, 0)
+
+		# WAVE_FORMAT_EXTENSIBLE has the tag in the first two bytes of its GUID
+		if tag == 0xFFFE and len(data) >= 26:
+			tag, = struct.unpack_from("<H", data, 24)
+
+		if tag == 0x0001:
+			bits, = struct.unpack_from("<H", data, 14)
+
+			return "pcm_u8" if bits == 8 else "pcm_s" + str(bits) + "le"
+
+		return HeaderProber.dict_codecs_wave.get(tag)
+
+	@staticmethod
+	def codec_fourcc_get(fourcc):
+		if fourcc == b"\0\0\0\0":
+			return "rawvideo"
+
+		return HeaderProber.dict_codecs_fourcc.get(fourcc.decode("latin-1").upper())
+
+	# Matroska's elements are variable length integers, for their IDs (marker
+	# kept) and sizes (marker dropped; all ones meaning unknown, as None)
+	@staticmethod
+	def ebml_vint_read(data, offset, marker_keep = False):
+		length = 9 - data[offset].bit_length()
+
+		if length > 8 or offset + length > len(data):
+			raise ValueError("bad EBML variable length integer")
+
+		value = int.from_bytes(data[offset:offset + length], "big")
+
+		if not marker_keep:
+			value &= (1 << (7 * length)) - 1
+
+			if value == (1 << (7 * length)) - 1:
+				value = None
+
+		return value, offset + length
+
+	# Elements within data[offset:end], as triples of ID, and where their data
+	# starts and ends
+	@staticmethod
+	def ebml_elements(data, offset = 0, end = None):
+		end = len(data) if end is None else end
+
+		while offset < end:
+			id_element, offset = HeaderProber.ebml_vint_read(data, offset, True)
+			size, offset = HeaderProber.ebml_vint_read(data, offset)
+			end_element = end if size is None else min(end, offset + size)
+
+			yield id_element, offset, end_element
+
+			offset = end_element
+
+	@staticmethod
+	def ebml_uint(data, start, end):
+		return int.from_bytes(data[start:end], "big")
+
+	@staticmethod
+	def ebml_float(data, start, end):
+		return struct.unpack(">f" if end - start == 4 else ">d", data[start:end])[0]
+
+	@staticmethod
+	def ebml_string(data, start, end):
+		return data[start:end].rstrip(b"\0").decode("utf-8", errors = "replace")
+
+	def matroska_probe(self, file_video, size_file):
+		# EBML header, then the segment
+		head = file_video.read(64)
+		_, offset = self.ebml_vint_read(head, 0, True)
+		size, offset = self.ebml_vint_read(head, offset)
+		file_video.seek(offset + size)
+
+		head = file_video.read(16)
+		id_segment, offset_head = self.ebml_vint_read(head, 0, True)
+		size_segment, offset_head = self.ebml_vint_read(head, offset_head)
+
+		if id_segment != 0x18538067:
+			raise ValueError("no segment")
+
+		start_segment = offset + size + offset_head
+		end_segment = size_file if size_segment is None else min(size_file, start_segment + size_segment)
+
+		dict_elements = {}
+		position_tags = None
+		position = start_segment
+
+		# Info and Tracks come before the clusters; tags usually after, with the
+		# seek head saying where
+		while position < end_segment and not (0x1549A966 in dict_elements and 0x1654AE6B in dict_elements):
+			file_video.seek(position)
+			head = file_video.read(16)
+
+			if len(head) < 2:
+				break
+
+			id_element, offset_head = self.ebml_vint_read(head, 0, True)
+			size, offset_head = self.ebml_vint_read(head, offset_head)
+
+			# Clusters
+			if id_element == 0x1F43B675 or size is None:
+				break
+
+			if id_element in (0x1549A966, 0x1654AE6B, 0x114D9B74, 0x1254C367) and id_element not in dict_elements:
+				if size > self.size_header_max:
+					raise ValueError("header too big")
+
+				file_video.seek(position + offset_head)
+				dict_elements[id_element] = file_video.read(size)
+
+				# Seek head: find the tags
+				if id_element == 0x114D9B74:
+					data = dict_elements[id_element]
+
+					for id_seek, start, end in self.ebml_elements(data):
+						if id_seek != 0x4DBB:
+							continue
+
+						dict_seek = {id_child: (start_child, end_child) for id_child, start_child, end_child in
+						             self.ebml_elements(data, start, end)}
+
+						if 0x53AB in dict_seek and 0x53AC in dict_seek and self.ebml_uint(
+								data, *dict_seek[0x53AB]) == 0x1254C367:
+							position_tags = start_segment + self.ebml_uint(data, *dict_seek[0x53AC])
+
+			position += offset_head + size
+
+		if 0x1549A966 not in dict_elements or 0x1654AE6B not in dict_elements:
+			raise ValueError("no segment info or tracks")
+
+		if 0x1254C367 not in dict_elements and position_tags is not None and position_tags < size_file:
+			file_video.seek(position_tags)
+			head = file_video.read(16)
+			id_element, offset_head = self.ebml_vint_read(head, 0, True)
+			size, offset_head = self.ebml_vint_read(head, offset_head)
+
+			if id_element == 0x1254C367 and size is not None and size <= self.size_header_max:
+				file_video.seek(position_tags + offset_head)
+				dict_elements[0x1254C367] = file_video.read(size)
+
+		# Duration, in units of the timestamp scale (nanoseconds)
+		data = dict_elements[0x1549A966]
+		scale = 1000000
+		duration = None
+
+		for id_element, start, end in self.ebml_elements(data):
+			if id_element == 0x2AD7B1:
+				scale = self.ebml_uint(data, start, end)
+			elif id_element == 0x4489:
+				duration = self.ebml_float(data, start, end)
+
+		duration = duration * scale / 1000000000 if duration is not None else None
+
+		# Tags, by the UID of the track they're for
+		dict_tags = {}
+		data = dict_elements.get(0x1254C367, b"")
+
+		for id_tag, start_tag, end_tag in self.ebml_elements(data):
+			if id_tag != 0x7373:
+				continue
+
+			list_uids = []
+			dict_simple = {}
+
+			for id_element, start, end in self.ebml_elements(data, start_tag, end_tag):
+				if id_element == 0x63C0:
+					list_uids += [self.ebml_uint(data, start_target, end_target) for id_target, start_target, end_target
+					              in self.ebml_elements(data, start, end) if id_target == 0x63C5]
+				elif id_element == 0x67C8:
+					dict_simple_tag = {id_simple: self.ebml_string(data, start_simple, end_simple) for
+					                   id_simple, start_simple, end_simple in self.ebml_elements(data, start, end)}
+
+					if 0x45A3 in dict_simple_tag and 0x4487 in dict_simple_tag:
+						dict_simple[dict_simple_tag[0x45A3]] = dict_simple_tag[0x4487]
+
+			for uid in list_uids:
+				dict_tags.setdefault(uid, {}).update(dict_simple)
+
+		list_streams = []
+		data = dict_elements[0x1654AE6B]
+
+		for id_entry, start_entry, end_entry in self.ebml_elements(data):
+			if id_entry != 0xAE:
+				continue
+
+			stream = {"tags": {}}
+			uid = codec_private = bits = None
+
+			for id_element, start, end in self.ebml_elements(data, start_entry, end_entry):
+				if id_element == 0x83:
+					stream["codec_type"] = self.dict_types_matroska.get(self.ebml_uint(data, start, end), "data")
+				elif id_element == 0x86:
+					codec = self.ebml_string(data, start, end)
+					stream["codec_tag_string"] = codec
+					stream["codec_name"] = self.dict_codecs_matroska.get(codec) or self.dict_codecs_matroska.get(
+						codec.partition("/")[0])
+				elif id_element == 0x63A2:
+					codec_private = data[start:end]
+				elif id_element == 0x73C5:
+					uid = self.ebml_uint(data, start, end)
+				elif id_element == 0x22B59C:
+					stream["tags"]["language"] = self.ebml_string(data, start, end)
+				elif id_element == 0x536E:
+					stream["tags"]["title"] = self.ebml_string(data, start, end)
+				elif id_element == 0xE0:
+					for id_video, start_video, end_video in self.ebml_elements(data, start, end):
+						if id_video == 0xB0:
+							stream["width"] = self.ebml_uint(data, start_video, end_video)
+						elif id_video == 0xBA:
+							stream["height"] = self.ebml_uint(data, start_video, end_video)
+				elif id_element == 0xE1:
+					for id_audio, start_audio, end_audio in self.ebml_elements(data, start, end):
+						if id_audio == 0xB5:
+							stream["sample_rate"] = str(int(self.ebml_float(data, start_audio, end_audio)))
+						elif id_audio == 0x9F:
+							stream["channels"] = self.ebml_uint(data, start_audio, end_audio)
+						elif id_audio == 0x6264:
+							bits = self.ebml_uint(data, start_audio, end_audio)
+
+			# Integer PCM goes by its bit depth, as in AVI (where 8 bits are unsigned)
+			codec = stream.get("codec_tag_string", "")
+
+			if codec.startswith("A_PCM/INT/") and bits:
+				stream["codec_name"] = "pcm_u8" if bits == 8 else "pcm_s" + str(bits) + (
+					"le" if codec.endswith("LIT") else "be")
+
+			# Video and audio carried over from AVI as is
+			if codec_private and stream.get("codec_tag_string") == "V_MS/VFW/FOURCC" and len(codec_private) >= 20:
+				stream["codec_name"] = self.codec_fourcc_get(codec_private[16:20])
+			elif codec_private and stream.get("codec_tag_string") == "A_MS/ACM" and len(codec_private) >= 16:
+				stream["codec_name"] = self.codec_wave_get(codec_private)
+
+			if uid in dict_tags:
+				stream["tags"].update(dict_tags[uid])
+
+			list_streams.append(stream)
+
+		return duration, list_streams
+
+	# MP4 boxes within data[offset:end], as triples of type, and where their data
+	# starts and ends
+	@staticmethod
+	def mp4_boxes(data, offset = 0, end = None):
+		end = len(data) if end is None else end
+
+		while offset + 8 <= end:
+			size, type_box = struct.unpack_from(">I4s", data, offset)
+			offset_data = offset + 8
+
+			if size == 1:
+				size, = struct.unpack_from(">Q", data, offset_data)
+				offset_data += 8
+			elif size == 0:
+				size = end - offset
+
+			if size < offset_data - offset:
+				raise ValueError("bad MP4 box size")
+
+			yield type_box.decode("latin-1"), offset_data, min(end, offset + size)
+
+			offset += size
+
+	@staticmethod
+	def mp4_box_find(data, path, offset = 0, end = None):
+		for type_box, start, end_box in HeaderProber.mp4_boxes(data, offset, end):
+			if type_box == path[0]:
+				return (start, end_box) if len(path) == 1 else HeaderProber.mp4_box_find(data, path[1:], start,
+				                                                                         end_box)
+
+		return None
+
+	# MPEG-4 object type off an elementary stream descriptor (esds), if any
+	@staticmethod
+	def mp4_object_type_get(data, start, end):
+		offset = data.find(b"esds", start, end)
+
+		if offset < 0:
+			return None
+
+		# Version and flags, then descriptors: tag, and a length of up to four
+		# bytes, seven bits each
+		offset += 8
+
+		while offset < end:
+			tag = data[offset]
+			offset += 1
+
+			for _ in range(4):
+				byte = data[offset]
+				offset += 1
+
+				if not byte & 0x80:
+					break
+
+			if tag == 0x03:
+				# ES_ID, then flags for what follows: the ID of the stream depended on,
+				# a URL (its length first) and the OCR stream ID
+				flags = data[offset + 2]
+				offset += 3
+
+				if flags & 0x80:
+					offset += 2
+
+				if flags & 0x40:
+					offset += 1 + data[offset]
+
+				if flags & 0x20:
+					offset += 2
+			elif tag == 0x04:
+				return data[offset]
+			else:
+				return None
+
+		return None
+
+	def mp4_probe(self, file_video, size_file):
+		moov = None
+		position = 0
+
+		# The moov box may be at the start or at the end, with the media in between
+		while position + 8 <= size_file:
+			file_video.seek(position)
+			head = file_video.read(16)
+			size, type_box = struct.unpack_from(">I4s", head)
+			size_head = 8
+
+			if size == 1:
+				size, = struct.unpack_from(">Q", head, 8)
+				size_head = 16
+			elif size == 0:
+				size = size_file - position
+
+			if size < size_head:
+				raise ValueError("bad MP4 box size")
+
+			if type_box == b"moov":
+				if size > self.size_header_max:
+					raise ValueError("header too big")
+
+				file_video.seek(position + size_head)
+				moov = file_video.read(size - size_head)
+
+				break
+
+			position += size
+
+		if moov is None:
+			raise ValueError("no moov box")
+
+		# Fragmented files only know their duration from the fragments
+		if self.mp4_box_find(moov, ("mvex",)):
+			raise ValueError("fragmented")
+
+		start, _ = self.mp4_box_find(moov, ("mvhd",))
+		version = moov[start]
+
+		if version == 1:
+			timescale, duration = struct.unpack_from(">IQ", moov, start + 20)
+		else:
+			timescale, duration = struct.unpack_from(">II", moov, start + 12)
+
+		duration = duration / timescale if timescale else None
+		list_streams = []
+
+		for type_box, start_trak, end_trak in self.mp4_boxes(moov):
+			if type_box != "trak":
+				continue
+
+			stream = {}
+
+			start, end = self.mp4_box_find(moov, ("mdia", "hdlr"), start_trak, end_trak)
+			handler = moov[start + 8:start + 12].decode("latin-1")
+			stream["codec_type"] = self.dict_types_mp4.get(handler, "data")
+
+			start, _ = self.mp4_box_find(moov, ("mdia", "mdhd"), start_trak, end_trak)
+
+			if moov[start] == 1:
+				timescale_track, duration_track, language = struct.unpack_from(">IQH", moov, start + 20)
+			else:
+				timescale_track, duration_track, language = struct.unpack_from(">IIH", moov, start + 12)
+
+			if timescale_track:
+				stream["duration"] = duration_track / timescale_track
+
+			# Three letters, five bits each, offset from 0x60
+			stream["tags"] = {"language": "".join(chr(((language >> shift) & 0x1F) + 0x60) for shift in (10, 5, 0))}
+
+			box_stbl = self.mp4_box_find(moov, ("mdia", "minf", "stbl"), start_trak, end_trak)
+
+			if box_stbl:
+				box_stsd = self.mp4_box_find(moov, ("stsd",), *box_stbl)
+
+				# Version and flags, the entry count, then the first sample entry
+				if box_stsd and box_stsd[1] - box_stsd[0] >= 16:
+					start_entry = box_stsd[0] + 8
+					size_entry, type_entry = struct.unpack_from(">I4s", moov, start_entry)
+					end_entry = min(box_stsd[1], start_entry + size_entry)
+					type_entry = type_entry.decode("latin-1")
+
+					stream["codec_tag_string"] = type_entry
+					stream["codec_name"] = self.dict_codecs_mp4.get(type_entry)
+
+					if type_entry in ("mp4a", "mp4v"):
+						stream["codec_name"] = self.dict_object_types_mp4.get(
+							self.mp4_object_type_get(moov, start_entry + 8, end_entry))
+
+					if stream["codec_type"] == "video" and end_entry - start_entry >= 36:
+						stream["width"], stream["height"] = struct.unpack_from(">HH", moov, start_entry + 32)
+					elif stream["codec_type"] == "audio" and end_entry - start_entry >= 36:
+						stream["channels"], bits = struct.unpack_from(">HH", moov, start_entry + 24)
+						stream["sample_rate"] = str(struct.unpack_from(">H", moov, start_entry + 32)[0])
+
+						# Integer PCM goes by its sample size
+						if type_entry in ("sowt", "twos") and bits:
+							stream["codec_name"] = "pcm_s8" if bits == 8 else "pcm_s" + str(bits) + (
+								"le" if type_entry == "sowt" else "be")
+
+				box_stsz = self.mp4_box_find(moov, ("stsz",), *box_stbl)
+
+				if box_stsz:
+					stream["nb_frames"] = str(struct.unpack_from(">I", moov, box_stsz[0] + 8)[0])
+
+			list_streams.append(stream)
+
+		return duration, list_streams
+
+	def avi_probe(self, file_video, size_file):
+		# The header list comes first, after the RIFF header
+		file_video.seek(12)
+		head = file_video.read(12)
+
+		if head[:4] != b"LIST" or head[8:12] != b"hdrl":
+			raise ValueError("no AVI header list")
+
+		size, = struct.unpack_from("<I", head, 4)
+
+		if size > self.size_header_max:
+			raise ValueError("header too big")
+
+		hdrl = file_video.read(size - 4)
+		list_streams = []
+
+		for id_chunk, start, end in self.riff_chunks(hdrl):
+			if id_chunk != b"LIST" or hdrl[start:start + 4] != b"strl":
+				continue
+
+			stream = {}
+			strh = strf = None
+
+			for id_stream, start_stream, end_stream in self.riff_chunks(hdrl, start + 4, end):
+				if id_stream == b"strh":
+					strh = hdrl[start_stream:end_stream]
+				elif id_stream == b"strf":
+					strf = hdrl[start_stream:end_stream]
+				elif id_stream == b"strn":
+					stream["tags"] = {"title": hdrl[start_stream:end_stream].rstrip(b"\0").decode("latin-1")}
+
+			if strh is None or len(strh) < 36:
+				continue
+
+			type_stream, handler = strh[:4], strh[4:8]
+			scale, rate, _, length = struct.unpack_from("<IIII", strh, 20)
+
+			if rate:
+				stream["duration"] = length * scale / rate
+
+			if type_stream == b"vids":
+				stream["codec_type"] = "video"
+
+				if strf and len(strf) >= 20:
+					stream["width"], height = struct.unpack_from("<ii", strf, 4)
+					stream["height"] = abs(height)
+					stream["codec_tag_string"] = strf[16:20].decode("latin-1")
+					stream["codec_name"] = self.codec_fourcc_get(strf[16:20])
+				else:
+					stream["codec_name"] = self.codec_fourcc_get(handler)
+
+				# DivX subtitles ride along as video
+				if stream["codec_name"] == "xsub":
+					stream["codec_type"] = "subtitle"
+				elif rate:
+					stream["nb_frames"] = str(length)
+			elif type_stream == b"auds":
+				stream["codec_type"] = "audio"
+
+				if strf and len(strf) >= 16:
+					stream["codec_name"] = self.codec_wave_get(strf)
+					stream["channels"], sample_rate = struct.unpack_from("<HI", strf, 2)
+					stream["sample_rate"] = str(sample_rate)
+			elif type_stream == b"txts":
+				stream["codec_type"] = "subtitle"
+			else:
+				stream["codec_type"] = "data"
+
+			list_streams.append(stream)
+
+		# The container lasts as long as its longest stream
+		duration = max((stream["duration"] for stream in list_streams if "duration" in stream), default = None)
+
+		return duration, list_streams
+
+	# RIFF chunks within data[offset:end], as triples of ID, and where their data
+	# starts and ends. Chunks are padded to an even size.
+	@staticmethod
+	def riff_chunks(data, offset = 0, end = None):
+		end = len(data) if end is None else end
+
+		while offset + 8 <= end:
+			id_chunk, size = struct.unpack_from("<4sI", data, offset)
+
+			yield id_chunk, offset + 8, min(end, offset + 8 + size)
+
+			offset += 8 + size + (size & 1)
+
+
+def binary_ffprobe_get():
+	return converter_registry_get().binary_get("ffprobe")
+
+
+# Probe the container format and streams of a file in one go, as parsed JSON.
+# Results are served from the probe cache when the file hasn't changed since
+# it was last probed, and otherwise read off the headers where we can (see
+# HeaderProber), running ffprobe for the rest. Counting packets has ffprobe
+# read the whole file, rather than just the headers. Raises
+# subprocess.CalledProcessError if ffprobe fails.
+def probe_get(path_file, packets_count = False):
+	kind = "format_streams_packets" if packets_count else "format_streams"
+	fingerprint = fingerprint_get(path_file)
+
+	if probe_get.cache:
+		result = probe_get.cache.lookup(path_file, kind, fingerprint)
+
+		# Not what was read off the headers, if asked for ffprobe's word
+		if result is not None and (probe_get.header or "prober" not in result):
+			return result
+
+	if probe_get.header and not packets_count:
+		with metrics_stage("probe"):
+			result = probe_get.header.probe(path_file)
+
+		if result is not None:
+			if probe_get.cache:
+				probe_get.cache.store(path_file, kind, fingerprint, result)
+
+			return result
+
+	command = (binary_ffprobe_get(), "-v", "error", *(("-count_packets",) if packets_count else ()), "-show_format",
+	           "-show_streams", "-of", "json", "-i", path_file)
+
+	message_detail("Executing command: " + " ".join(command) + "\n")
+
+	with metrics_stage("probe"):
+		result = json.loads(process_run(command, output_keep = True))
+
+	if probe_get.cache:
+		probe_get.cache.store(path_file, kind, fingerprint, result)
+
+	return result
+
+# Set up by main(), unless disabled from the command line
+probe_get.cache = None
+probe_get.header = None
+
+
+# Container duration (in seconds) of a file, provided it's in the probe cache
+# or can be read off its headers. Never runs ffprobe; used where knowing the
+# duration is nice, but not worth a probe.
+def duration_cached_get(path_file, stat_file = None):
+	try:
+		fingerprint = fingerprint_get(path_file, stat_file)
+		result = probe_get.cache.lookup(path_file, "format_streams", fingerprint) if probe_get.cache else None
+
+		if result is None and probe_get.header:
+			result = probe_get.header.probe(path_file)
+
+			if result is not None and probe_get.cache:
+				probe_get.cache.store(path_file, "format_streams", fingerprint, result)
+
+		if result:
+			return float(result["format"]["duration"])
+	except (OSError, KeyError, ValueError):
+		pass
+
+	return None
+
+
+# Duration of a stream in seconds, if the container tells. Matroska keeps it
+# in a tag, rather than in the stream header.
+def stream_duration_get(stream):
+	try:
+		if "duration" in stream:
+			return float(stream["duration"])
+
+		for key, value in stream.get("tags", {}).items():
+			if key.upper().startswith("DURATION"):
+				hours, minutes, seconds = value.split(":")
+
+				return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+	except ValueError:
+		pass
+
+	return None
+
+
+# Compare the streams in the target with those in the source, as probed by
+# ffprobe. Each target stream has to have a counterpart in the source of the
+# same type and codec (subtitles may have been converted, so only their type
+# counts; nor do codecs when the two were probed differently, or one of them
+# couldn't be made out), of about the same duration and, in strict mode, with
+# about as many packets; and each source stream has to have made it into the
+# target. Subtitles merged in from sidecars have no counterpart; there have to
+# be exactly as many of those as expected. Returns a description of every
+# mismatch found; none means the conversion is good.
+def streams_compare(probe_source, probe_target, strict, count_subtitles_sidecar = 0):
+	list_mismatches = []
+	list_subtitles_unmatched = []
+
+	duration_source = float(probe_source.get("format", {}).get("duration", 0))
+	duration_target = float(probe_target.get("format", {}).get("duration", 0))
+
+	if abs(duration_source - duration_target) > streams_compare.tolerance_duration:
+		list_mismatches.append("container duration " + str(duration_target) + "s, source " + str(duration_source) + "s")
+
+	streams_source = probe_source.get("streams", [])
+	set_matched = set()
+	prober_same = probe_source.get("prober") == probe_target.get("prober")
+
+	for stream_target in probe_target.get("streams", []):
+		codec_type = stream_target.get("codec_type")
+
+		# Attachments and data streams don't make a video
+		if codec_type not in ("video", "audio", "subtitle"):
+			continue
+
+		description = "stream #" + str(stream_target.get("index")) + " (" + str(codec_type) + ", " + str(
+			stream_target.get("codec_name")) + ")"
+
+		index_source = next((index for index, stream_source in enumerate(streams_source)
+		                     if index not in set_matched and stream_source.get("codec_type") == codec_type and (
+				                     codec_type == "subtitle" or not prober_same or
+				                     None in (stream_source.get("codec_name"), stream_target.get("codec_name")) or
+				                     stream_source.get("codec_name") == stream_target.get("codec_name"))), None)
+
+		if index_source is None:
+			if codec_type == "subtitle":
+				list_subtitles_unmatched.append(description)
+			else:
+				list_mismatches.append(description + " not found in the source")
+
+			continue
+
+		set_matched.add(index_source)
+		stream_source = streams_source[index_source]
+
+		duration_stream_source = stream_duration_get(stream_source)
+		duration_stream_target = stream_duration_get(stream_target)
+
+		if duration_stream_source is not None and duration_stream_target is not None and abs(
+				duration_stream_source - duration_stream_target) > streams_compare.tolerance_duration:
+			list_mismatches.append(description + " duration " + str(duration_stream_target) + "s, source " + str(
+				duration_stream_source) + "s")
+
+		if strict:
+			try:
+				packets_source = int(stream_source["nb_read_packets"])
+				packets_target = int(stream_target["nb_read_packets"])
+			except (KeyError, ValueError):
+				list_mismatches.append(description + " packet count unavailable")
+			else:
+				if abs(packets_source - packets_target) > packets_source * streams_compare.tolerance_packets:
+					list_mismatches.append(description + " has " + str(packets_target) + " packets, source " + str(
+						packets_source))
+
+	if not count_subtitles_sidecar:
+		list_mismatches += [description + " not found in the source" for description in list_subtitles_unmatched]
+	elif len(list_subtitles_unmatched) != count_subtitles_sidecar:
+		list_mismatches.append(str(len(list_subtitles_unmatched)) + " subtitle stream(s) not found in the source, for " +
+		                       str(count_subtitles_sidecar) + " from sidecars")
+
+	# Nor may the converter have left anything out (as ffmpeg does, keeping but
+	# one stream of each type, unless told otherwise). Cover art is the
+	# exception, as Matroska keeps it as an attachment.
+	for index, stream_source in enumerate(streams_source):
+		codec_type = stream_source.get("codec_type")
+
+		if index not in set_matched and codec_type in ("video", "audio", "subtitle") and not stream_source.get(
+				"disposition", {}).get("attached_pic"):
+			list_mismatches.append("source stream #" + str(stream_source.get("index")) + " (" + str(codec_type) + ", " +
+			                       str(stream_source.get("codec_name")) + ") not found in the target")
+
+	return list_mismatches
+
+# Containers round off durations differently, so allow for a little slack
+streams_compare.tolerance_duration = 1.0
+# Fraction by which packet counts may differ. Remuxing may drop empty
+# packets, e.g. the placeholders AVI uses for dropped frames.
+streams_compare.tolerance_packets = 0.01
+
+
+# Verify a conversion by comparing the streams of the target with those of the
+# source. Cheap verification only looks at the headers (and reuses the
+# source's cached probe); strict verification also counts packets, which
+# reads both files in full. Returns a list of mismatches, none meaning the
+# conversion is good.
+def conversion_verify(path_file, container_target_name_abs, verification, sidecars = ()):
+	strict = verification == "strict"
+
+	message_info("Verifying \'" + container_target_name_abs + "\' against \'" + path_file + "\' (" + verification + ")\n")
+
+	try:
+		probe_source = probe_get(path_file, strict)
+		probe_target = probe_get(container_target_name_abs, strict)
+	except subprocess.CalledProcessError as error_probe:
+		message_error(error_probe.stderr)
+		message_error("Error probing \'" + str(error_probe.cmd[-1]) + "\': " + str(sys.exc_info()))
+		message_info("Command that resulted in the exception: " + str(error_probe.cmd))
+
+		return ["could not probe \'" + str(error_probe.cmd[-1]) + "\'"]
+	except Exception:
+		# Handle any generic exception
+		message_error("Undefined exception")
+		message_error(
+			"Error probing \'" + path_file + "\' or \'" + container_target_name_abs + "\': " + str(sys.exc_info()))
+
+		show_toast("Error", "Error probing \'" + path_file + "\'. Check the log.")
+
+		return ["could not probe"]
+
+	try:
+		duration_ns = float(probe_source["format"]["duration"]) * 1000000000
+
+		message_info("Duration of \'" + path_file + "\': " + total_time_in_hms_get(duration_ns) + ", approximately")
+	except (KeyError, ValueError):
+		pass
+
+	return streams_compare(probe_source, probe_target, strict, sum(sidecar.tracks_count() for sidecar in sidecars))
+
+
+# Move a verified partial file in place of the target, and delete the source,
+# along with the sidecars merged into it. Returns the outcome of the
+# conversion.
+def target_commit(path_file, container_partial_name_abs, container_target_name_abs, list_failed_conversions,
+                  sidecars = ()):
+	outcome = OUTCOME_FAILED
+
+	try:
+		file_rename_no_clobber(container_partial_name_abs, container_target_name_abs)
+	except FileExistsError:
+		# Someone beat us to it. Theirs is as good as ours; it's only there once
+		# verified.
+		outcome = OUTCOME_SKIPPED_EXISTS
+
+		message_error("Target \'" + container_target_name_abs + "\' turned up while converting. Discarding ours.\n")
+
+		file_partial_remove(container_partial_name_abs)
+	except OSError:
+		outcome = OUTCOME_ERROR
+
+		message_error("Failed to move \'" + container_partial_name_abs + "\' to \'" + container_target_name_abs +
+		              "\': " + str(sys.exc_info()))
+
+		failed_conversion_record(list_failed_conversions, path_file)
+
+		file_partial_remove(container_partial_name_abs)
+	else:
+		outcome = OUTCOME_CONVERTED
+
+		# It's the same file under another name; no need to probe it again
+		if probe_get.cache:
+			probe_get.cache.move(container_partial_name_abs, container_target_name_abs)
+
+		# TODO: This is not a platform safe check. While it works on Windows,
+		# it requires to be modified for the Unices, where the upper 8 bits of
+		# the 16 bit integer returned needs to be checked for.
+
+		# Successful exit status is zero
+		with metrics_stage("delete"):
+			status_remove = os.remove(path_file)
+
+		if not status_remove:
+			if probe_get.cache:
+				probe_get.cache.forget(path_file)
+
+			message_info("Deleted source file \'" + path_file + "\'\n")
+
+			sidecars_remove(sidecars, container_target_name_abs)
+		else:
+			message_error("Failed to delete the source file \'" + path_file + "\'\n")
+
+	return outcome
+
+
+# Delete sidecars (and their companions) merged into a conversion
+def sidecars_remove(sidecars, container_target_name_abs):
+	for path_sidecar in (path for sidecar in sidecars for path in (sidecar.path, *sidecar.paths_companion)):
+		try:
+			os.remove(path_sidecar)
+		except OSError:
+			message_error("Failed to delete \'" + path_sidecar + "\', merged into \'" + container_target_name_abs +
+			              "\': " + str(sys.exc_info()) + "\n")
+		else:
+			message_info("Deleted \'" + path_sidecar + "\', merged into \'" + container_target_name_abs + "\'\n")
+
+
+# The post conversion process. If we find the partial Matroska file, with
+# streams matching those of the source file (see conversion_verify()), we
+# assume the conversion was successful, and move it in place of the target.
+# We then delete the source file to save space. Returns the outcome of the
+# conversion; or, for a conversion staged on scratch, a future for it, as
+# it's copied back in the background.
+def post_process(root, path_file, container_target_extension, list_failed_conversions, container_partial_name_abs,
+                 stat_source = None, sidecars = ()):
+	container_target_name_abs = root + os.extsep + container_target_extension
+	outcome = OUTCOME_FAILED
+
+	# Does the target format file exist? If so, go ahead with the next steps.
+	if os.path.isfile(container_partial_name_abs):
+		with metrics_stage("verify"):
+			list_mismatches = conversion_verify(path_file, container_partial_name_abs, post_process.verification,
+			                                    sidecars)
+
+		# Do the streams match? If so, the conversion is assumed to be successful;
+		# move it in place, and delete the source. Else, leave the source file intact.
+		if not list_mismatches:
+			message_info("Conversion of \'" + path_file + "\' to \'" + container_target_name_abs + "\' seems to be valid\n")
+
+			if container_format_matroska_set.scratch:
+				outcome = container_format_matroska_set.scratch.copy_back_submit(
+					path_file, stat_source, container_partial_name_abs, path_partial_get(root, container_target_extension),
+					container_target_name_abs, list_failed_conversions, sidecars)
+			else:
+				outcome = target_commit(path_file, container_partial_name_abs, container_target_name_abs,
+				                        list_failed_conversions, sidecars)
+		else:
+			message_error(
+				"Mismatch of \'" + container_target_name_abs + "\' with source: " + "; ".join(list_mismatches) + ". Skipping deleting \'" + path_file + "\'.")
+
+			# If the streams were a mismatch, this is a failed conversion
+			failed_conversion_record(list_failed_conversions, path_file)
+
+			# Either the source itself is corrupt, or our converted version
+			# appears effed up. Don't litter.
+			file_partial_remove(container_partial_name_abs)
+	else:
+		# No target version found. How'd we even get here?
+		message_error("Target file \'" + container_partial_name_abs + "\' not found!\n")
+
+		failed_conversion_record(list_failed_conversions, path_file)
+
+	return outcome
+
+# How thorough verifying a conversion is: "cheap" or "strict". Set by main().
+post_process.verification = "cheap"
+
+
+def conversion_failure_cleanup(path_file, container_partial_name_abs, list_failed_conversions):
+	# We need to clean up the improperly constructed Matroska format. Check
+	# if the file exists in the first place.
+	if os.path.isfile(container_partial_name_abs):
+		# Mop up litter, post the futile conversion
+		message_info("\'" + container_partial_name_abs + "\', was improperly done; deleting...")
+
+		file_partial_remove(container_partial_name_abs)
+
+	failed_conversion_record(list_failed_conversions, path_file)
+
+	print_spacer()
+
+
+# Converters write to a partial file next to the target, which is moved in
+# place of the target only once verified. A target hence only ever exists
+# complete. The partial file is named after the host and process writing
+# it, so that ones left behind by a crash can be told apart and swept up.
+regex_partial = re.compile(r"\.vcc-partial-(?P<host>[^.]*)-(?P<pid>\d+)\.[^.]+$")
+
+# Partial files older than this (in seconds) are abandoned, even if we can't
+# tell whether the process writing them is still around (being on another
+# host, say)
+seconds_partial_stale = 24 * 60 * 60
+
+
+# Name of this host, fit for a file name
+def host_name_get():
+	return re.sub(r"[^A-Za-z0-9_]", "_", platform.node()) or "localhost"
+
+
+def path_partial_get(root, container_target_extension):
+	return root + ".vcc-partial-" + host_name_get() + "-" + str(os.getpid()) + os.extsep + container_target_extension
+
+
+# Is the process with the ID given running (on this host)?
+def process_alive(pid):
+	if platform.system() == "Windows":
+		import ctypes
+
+		# os.kill() would terminate it on Windows, so ask nicely
+		handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+
+		if not handle:
+			return False
+
+		code_exit = ctypes.c_ulong()
+		ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code_exit))
+		ctypes.windll.kernel32.CloseHandle(handle)
+
+		return code_exit.value == 259  # STILL_ACTIVE
+
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except PermissionError:
+		# It's there, just not ours
+		return True
+
+	return True
+
+
+# Is the partial file (as a DirEntry) left over from a conversion that won't
+# be finishing?
+def partial_stale(entry):
+	match = regex_partial.search(entry.name)
+
+	if not match:
+		return False
+
+	if match.group("host") == host_name_get() and not process_alive(int(match.group("pid"))):
+		return True
+
+	return time.time() - entry.stat().st_mtime > seconds_partial_stale
+
+
+def file_partial_remove(container_partial_name_abs):
+	try:
+		os.remove(container_partial_name_abs)
+	except OSError:
+		message_error("Failed to delete \'" + container_partial_name_abs + "\': " + str(sys.exc_info()) + "\n")
+	else:
+		if probe_get.cache:
+			probe_get.cache.forget(container_partial_name_abs)
+
+		message_info("Deleted \'" + container_partial_name_abs + "\'\n")
+
+
+# Move a file to its new name in one go, unless a file by that name exists
+def file_rename_no_clobber(path_source, path_target):
+	if platform.system() == "Windows":
+		# Won't replace an existing file on Windows
+		os.rename(path_source, path_target)
+
+		return
+
+	try:
+		# Fails if the target exists, unlike os.rename()
+		os.link(path_source, path_target)
+	except FileExistsError:
+		raise
+	except OSError:
+		# No hard links on this file system (FAT, some network shares); settle for
+		# a check before the rename
+		if os.path.exists(path_target):
+			raise FileExistsError(path_target)
+
+		os.rename(path_source, path_target)
+	else:
+		os.remove(path_source)
+
+
+# Stages conversions on a scratch directory (ideally on a fast local disk),
+# so that a slow source volume is only read from during the remux. Verified
+# conversions are copied back next to their source in the background, while
+# the next remux gets going; the source is deleted once the copy is in place.
+# Space is reserved on the scratch volume for the remux, on top of that
+# reserved on the source volume for the copy.
+class ScratchStaging:
+	def __init__(self, path_scratch, jobs, ledger = None):
+		self.path_scratch = os.path.abspath(path_scratch)
+		self.volume = os.stat(self.path_scratch).st_dev
+		self.ledger = ledger
+
+		# As many copies as remuxes can be on at once
+		self.executor = ThreadPoolExecutor(max_workers = jobs, thread_name_prefix = "copy-back")
+
+	# Partial file in the scratch directory for the conversion of a source. Named
+	# after the source's directory too, as sources in different directories may
+	# share a name.
+	def path_partial_get(self, root, container_target_extension):
+		import hashlib
+
+		return os.path.join(self.path_scratch, hashlib.sha1(os.path.dirname(os.path.abspath(root)).encode(
+			errors = "replace")).hexdigest()[:12] + "-" + os.path.basename(
+			path_partial_get(root, container_target_extension)))
+
+	# Sweep up after conversions that crashed or were killed mid-way
+	def sweep(self):
+		with os.scandir(self.path_scratch) as entries:
+			for entry in entries:
+				try:
+					if entry.is_file() and partial_stale(entry):
+						message_info("Deleting \'" + entry.path + "\', left behind by an earlier run")
+
+						file_partial_remove(entry.path)
+				except OSError:
+					logging.error("Error reading \'" + entry.path + "\': " + str(sys.exc_info()))
+
+	# Check for (and with a ledger, reserve) space for a conversion on the
+	# scratch volume. Returns whether there's enough, and how much is free.
+	def reserve(self, path_file, stat_source):
+		if self.ledger:
+			return self.ledger.reserve(("scratch", path_file), self.path_scratch, self.volume,
+			                           space_needed_get(stat_source))
+
+		free = shutil.disk_usage(self.path_scratch).free
+
+		return free > space_needed_get(stat_source), free
+
+	def release(self, path_file):
+		if self.ledger:
+			self.ledger.release(("scratch", path_file))
+
+	# Copy a verified conversion back next to its source, in the background.
+	# Returns a future for the outcome of the conversion.
+	def copy_back_submit(self, path_file, stat_source, path_scratch_file, container_partial_name_abs,
+	                     container_target_name_abs, list_failed_conversions, sidecars = ()):
+		return self.executor.submit(self.copy_back, path_file, stat_source, path_scratch_file,
+		                            container_partial_name_abs, container_target_name_abs, list_failed_conversions,
+		                            metrics_record_get(), sidecars)
+
+	def copy_back(self, path_file, stat_source, path_scratch_file, container_partial_name_abs,
+	              container_target_name_abs, list_failed_conversions, record, sidecars = ()):
+		outcome = OUTCOME_FAILED
+
+		with metrics_attach(record):
+			message_info("Copying \'" + path_scratch_file + "\' back to \'" + container_partial_name_abs + "\'\n")
+
+			try:
+				with metrics_stage("copy"):
+					shutil.copyfile(path_scratch_file, container_partial_name_abs)
+
+				if os.path.getsize(container_partial_name_abs) != os.path.getsize(path_scratch_file):
+					raise OSError("Size of the copy differs from the original")
+			except:
+				outcome = OUTCOME_ERROR
+
+				message_error("Error copying \'" + path_scratch_file + "\' back to \'" + container_partial_name_abs +
+				              "\': " + str(sys.exc_info()))
+
+				conversion_failure_cleanup(path_file, container_partial_name_abs, list_failed_conversions)
+			else:
+				outcome = target_commit(path_file, container_partial_name_abs, container_target_name_abs,
+				                        list_failed_conversions, sidecars)
+			finally:
+				file_partial_remove(path_scratch_file)
+
+				self.release(path_file)
+				disk_space_release(path_file, stat_source, container_target_name_abs)
+
+		return outcome
+
+	# Wait for copies under way to be done
+	def close(self):
+		self.executor.shutdown(wait = True)
+
+
+# Add a file to the list of failed conversions. Conversions may run on
+# several worker threads at once (see ConversionScheduler), so serialise
+# access to the list along with the rest of the conversion statistics.
+def failed_conversion_record(list_failed_conversions, path_file):
+	with container_format_matroska_set.lock_stats:
+		list_failed_conversions.append(path_file)
+
+
+# Space to set aside for converting a file: a ballpark 1.2 times the source
+# file, as that's how much maximum or lesser the Matroska version will take
+def space_needed_get(stat_source):
+	return int(1.2 * stat_source.st_size)
+
+
+# Keeps track of free space on each volume (keyed by st_dev) across jobs.
+# Space for a conversion's output is reserved before it starts and settled
+# when it's done, so concurrent jobs don't all bank on the same free space,
+# and we don't have to ask the file system for every file.
+class SpaceLedger:
+	# Measure free space afresh after these many seconds, to catch up with
+	# whatever else is writing to the volume. Only done when nothing's reserved
+	# on it, as reservations are already accounted for.
+	seconds_refresh = 60
+
+	def __init__(self):
+		self.lock = threading.Lock()
+
+		# Per volume: free space as of the last measurement (adjusted for what
+		# our conversions wrote and freed since), space reserved, and when it
+		# was measured
+		self.dict_volumes = {}
+
+		# Per file being converted: its volume and the space reserved for it
+		self.dict_reservations = {}
+
+	def volume_get(self, path_dir, volume):
+		entry = self.dict_volumes.get(volume)
+
+		if entry is None or (not entry["reserved"] and time.monotonic() - entry["time_measured"] > self.seconds_refresh):
+			entry = self.dict_volumes[volume] = {"free": shutil.disk_usage(path_dir).free, "reserved": 0,
+			                                     "time_measured": time.monotonic()}
+
+		return entry
+
+	# Space on the volume not yet spoken for
+	def available_get(self, path_dir, volume):
+		with self.lock:
+			entry = self.volume_get(path_dir, volume)
+
+			return entry["free"] - entry["reserved"]
+
+	# Reserve space for converting a file, if available. Reserving again for a
+	# file already holding a reservation is a no-op. Returns whether the space is
+	# ours, and how much was available.
+	def reserve(self, path_file, path_dir, volume, size):
+		with self.lock:
+			entry = self.volume_get(path_dir, volume)
+			available = entry["free"] - entry["reserved"]
+
+			if path_file in self.dict_reservations:
+				return True, available + self.dict_reservations[path_file][1]
+
+			if available > size:
+				entry["reserved"] += size
+				self.dict_reservations[path_file] = (volume, size)
+
+				return True, available
+
+			return False, available
+
+	# Settle a file's reservation, with the space actually written and freed
+	# on the volume. Releasing a file holding no reservation is a no-op.
+	def release(self, path_file, size_written = 0, size_freed = 0):
+		with self.lock:
+			reservation = self.dict_reservations.pop(path_file, None)
+
+			if reservation:
+				volume, size = reservation
+				entry = self.dict_volumes[volume]
+
+				entry["reserved"] -= size
+				entry["free"] += size_freed - size_written
+
+
+# Check if we have enough space to go ahead with the conversion to
+# Matroska. In doing so, we check for a ballpark 1.2 times the source
+# file, as that's how much maximum or lesser the Matroska version will
+# take. Else we report nay to the caller. With a ledger, the space is also
+# reserved; see disk_space_release().
+def disk_space_check(path_file, stat_source = None):
+	availability = False
+
+	if stat_source is None:
+		stat_source = os.stat(path_file)
+
+	path_dir = os.path.dirname(os.path.abspath(path_file))
+
+	if disk_space_check.ledger:
+		availability, free = disk_space_check.ledger.reserve(path_file, path_dir, stat_source.st_dev,
+		                                                     space_needed_get(stat_source))
+	else:
+		total, used, free = shutil.disk_usage(path_dir)
+
+		if free > space_needed_get(stat_source):
+			availability = True
+
+	return availability, free
+
+# Set up by main()
+disk_space_check.ledger = None
+
+
+# Settle the space reserved by disk_space_check() once a conversion is done,
+# with what was written (the target, if it's still around) and freed (the
+# source, if deleted)
+def disk_space_release(path_file, stat_source, container_target_name_abs):
+	if disk_space_check.ledger:
+		try:
+			size_written = os.path.getsize(container_target_name_abs)
+		except OSError:
+			size_written = 0
+
+		size_freed = 0 if os.path.exists(path_file) else stat_source.st_size
+
+		disk_space_check.ledger.release(path_file, size_written, size_freed)
+
+
+# Format size in kibi, mebi, gibi etc. for user readability
+def sizeof_fmt(num, suffix = 'B'):
+	for unit in ('', 'Ki', 'Mi', 'Gi', 'Ti', 'Pi', 'Ei', 'Zi'):
+		if abs(num) < 1024.0:
+			return "%3.1f%s%s" % (num, unit, suffix)
+		num /= 1024.0
+
+	return "%.1f%s%s" % (num, 'Yi', suffix)
+
+
+# Print a spacer after every file's processing for sifting through the output
+# and log
+def print_spacer():
+	message_info("----- ----- ----- ----- -----")
+
+
+# Converts the video file argument received to Matroska format. Returns the
+# outcome, for the manifest. Pass the source's stat result if at hand, to save
+# stat'ing it again.
+def container_format_matroska_set(path_file, list_failed_conversions, container_target_extension,
+                                  stat_source = None):
+	outcome = OUTCOME_SKIPPED_EXISTS
+	root, extension = split_root_extension(path_file)
+
+	container_target_name_abs = root + os.extsep + container_target_extension
+	scratch = container_format_matroska_set.scratch
+
+	# When staging on scratch, the conversion is written there, and copied back
+	# once verified
+	if scratch:
+		container_partial_name_abs = scratch.path_partial_get(root, container_target_extension)
+	else:
+		container_partial_name_abs = path_partial_get(root, container_target_extension)
+
+	# Proceed only if a target container version of the source file doesn't already
+	# exist. Targets are only ever moved in place once verified, so there's no need
+	# to check on it.
+	if not os.path.isfile(container_target_name_abs):
+		registry = converter_registry_get()
+		outcome = OUTCOME_UNSUPPORTED
+
+		# Proceed only if we know of a way to convert the source to the target container
+		if registry.routes_get(container_target_extension, extension):
+			# Check if disk space is available for creating the video
+			# with the new container. Else, report and skip the current
+			# file. We still continue as we may have received file(s)
+			# on other disks/drives in the next command line argument(s).
+			# Use pathlib to get the absolute path; this is vital for
+			# shutil.disk_usage, else it will fail.
+			if stat_source is None:
+				stat_source = os.stat(path_file)
+
+			availability, free = disk_space_check(path_file, stat_source)
+			path_volume = path_file
+			outcome = OUTCOME_SKIPPED_NO_SPACE
+
+			# The scratch volume needs room for the conversion as well
+			if availability and scratch:
+				availability, free = scratch.reserve(path_file, stat_source)
+				path_volume = scratch.path_scratch
+
+				if not availability:
+					disk_space_release(path_file, stat_source, container_target_name_abs)
+
+			if availability:
+				route = registry.route_pick(container_target_extension, extension, path_file)
+
+				outcome = OUTCOME_NO_TOOL
+
+				# Check if any of the tools for it works
+				if route:
+					# We got a valid tool to write metadata
+					outcome = OUTCOME_FAILED
+					progress = ProcessProgress(path_file, duration_cached_get(path_file, stat_source))
+					sidecars = sidecars_get(path_file) if route.sidecars_supported(container_target_extension) else ()
+					count_subtitles_source = None
+
+					if sidecars:
+						message_info("Merging " + ", ".join("\'" + sidecar.path + "\'" for sidecar in sidecars) +
+						             " into the conversion of \'" + path_file + "\'")
+
+						# ffmpeg tags the sidecars' languages by where their streams end up
+						if route.tool.name == "ffmpeg":
+							try:
+								count_subtitles_source = sum(1 for stream in probe_get(path_file)["streams"] if
+								                             stream.get("codec_type") == "subtitle")
+							except (subprocess.CalledProcessError, OSError, KeyError, ValueError):
+								logging.error("Could not probe \'" + path_file + "\' for its subtitles: " + str(
+									sys.exc_info()))
+
+					# Track conversion start time in nano-seconds
+					time_start = time.monotonic_ns()
+
+					try:
+						metrics_note("converter", route.tool.name)
+
+						# Output is logged as it comes
+						with metrics_stage("convert"):
+							process_run(route.command_get(path_file, container_partial_name_abs, sidecars,
+							                              count_subtitles_source), progress = progress)
+					except subprocess.CalledProcessError as error_conversion:
+						if error_conversion.stderr:
+							message_error(error_conversion.stderr)
+
+						if error_conversion.output:
+							message_error(error_conversion.output)
+
+						message_error("Error converting \'" + path_file + "\' to " + container_target_extension.capitalize() +
+						              ": " + str(sys.exc_info()))
+						message_info("Command that resulted in the exception: " + str(error_conversion.cmd))
+
+						conversion_failure_cleanup(path_file, container_partial_name_abs, list_failed_conversions)
+
+						show_toast("Error", "Error converting \'" + path_file + "\'. Check the log.")
+					# Handle any generic exception
+					except Exception:
+						message_error("Undefined exception")
+						message_error("Error converting \'" + path_file + "\': " + str(sys.exc_info()))
+
+						conversion_failure_cleanup(path_file, container_partial_name_abs, list_failed_conversions)
+
+						show_toast("Error", "Error converting \'" + path_file + "\'. Check the log.")
+
+						outcome = OUTCOME_ERROR
+					# Interrupted; the source is left as it was, for another run to convert
+					except BaseException:
+						if os.path.isfile(container_partial_name_abs):
+							file_partial_remove(container_partial_name_abs)
+
+						raise
+					else:
+						# Track conversion end time in nano-seconds
+						time_end = time.monotonic_ns()
+
+						with container_format_matroska_set.lock_stats:
+							container_format_matroska_set.total_time_conversion += time_end - time_start
+							container_format_matroska_set.total_count_conversion += 1
+
+						if registry.throughput:
+							try:
+								registry.throughput.record(route.tool.name, extension, container_target_extension,
+								                           stat_source.st_size, (time_end - time_start) / 1000000000)
+							except sqlite3.Error:
+								logging.error("Could not record the throughput of " + route.tool.name + ": " + str(
+									sys.exc_info()))
+
+						message_info(
+							"\nConversion of \'" + path_file + "\' to " + container_target_extension.capitalize() + " format complete")
+
+						outcome = post_process(root, path_file, container_target_extension, list_failed_conversions,
+						                       container_partial_name_abs, stat_source, sidecars)
+
+					finally:
+						# A conversion being copied back from scratch releases its
+						# space once done
+						if not isinstance(outcome, Future):
+							if scratch:
+								scratch.release(path_file)
+
+							disk_space_release(path_file, stat_source, container_target_name_abs)
+
+						print_spacer()
+				else:
+					message_error("No working tool found to convert \'" + path_file + "\'; tried " + ", ".join(
+						"\'" + route.tool.binary + "\'" for route in registry.routes_get(container_target_extension, extension)))
+
+					if scratch:
+						scratch.release(path_file)
+
+					print_spacer()
+			else:
+				message_error(
+					"Not enough disk space available in \'" + get_volume_label(
+						path_volume) + "\'; need " + "{:>1}".format(
+						sizeof_fmt(space_needed_get(stat_source))) + ", available " + "{:>1}".format(
+						sizeof_fmt(free)) + ". Can't process \'" + path_file + "\'.\n")
+
+				print_spacer()
+
+
+#	else:
+#		if extension == container_target_extension:
+#			print(
+#				"Target \'" + container_target_name_abs + "\' already exists. Skipping file \'" + path_file + "\'...\n")
+#			logging.error(
+#				"Target \'" + container_target_name_abs + "\' already exists. Skipping file \'" + path_file + "\'...\n")
+
+#			print_spacer()
+
+	return outcome
+
+container_format_matroska_set.total_time_conversion = 0
+container_format_matroska_set.total_count_conversion = 0
+# Guards the statistics above and the list of failed conversions when
+# running with more than one job
+container_format_matroska_set.lock_stats = threading.Lock()
+
+# Set up by main(), when staging conversions on scratch
+container_format_matroska_set.scratch = None
 
 
 # Convert the time in nanoseconds passed to hours, minutes and seconds as a string
@@ -465,75 +2924,2056 @@ def total_time_in_hms_get(total_time_ns):
 	seconds = round(seconds_raw)
 	hours = minutes = 0
 
-	if seconds >= 60:
-		minutes = round(seconds / 60)
-		seconds = seconds % 60
+	if seconds >= 60:
+		minutes = round(seconds / 60)
+		seconds = seconds % 60
+
+	if minutes >= 60:
+		hours = round(minutes / 60)
+		minutes = minutes % 60
+
+	# If the quantum is less than a second, we need show a better resolution. A fractional report matters only when
+	# it's less than 1.
+	if (not (hours and minutes)) and (seconds_raw < 1 and seconds_raw > 0):
+		# Round off to two decimals
+		seconds = round(seconds_raw, 2)
+	elif (not (hours and minutes)) and (seconds_raw < 60 and seconds_raw > 1):
+		# Round off to the nearest integer, if the quantum is less than a minute. A fractional report doesn't matter
+		# when it's more than 1.
+		seconds = round(seconds_raw)
+
+	return (str(hours) + " hour(s) " if hours else "") + (str(minutes) + " minutes " if minutes else "") + (str(
+		seconds) + " seconds")
+
+
+def stats_print(list_failed_conversions, time_wall_ns = None):
+	if container_format_matroska_set.total_count_conversion:
+		message_info("Converted a total of " + str(
+			container_format_matroska_set.total_count_conversion) + " file(s) in " + total_time_in_hms_get(
+			container_format_matroska_set.total_time_conversion) + "\n")
+
+		# With concurrent jobs, the conversion times above add up to more
+		# than the time we actually took
+		if time_wall_ns is not None:
+			message_info("Wall clock time taken: " + total_time_in_hms_get(time_wall_ns) + "\n")
+	else:
+			message_info("No files converted to Matroska format")
+
+	if list_failed_conversions:
+		message_error("Here's the list of files that failed to convert to Matroska format:\n")
+
+		for failed_conversion in list_failed_conversions:
+			message_info(failed_conversion)
+
+
+# Type checker for command line options that take a count
+def positive_int(value):
+	import argparse
+
+	try:
+		count = int(value)
+	except ValueError:
+		raise argparse.ArgumentTypeError("\'" + value + "\' is not a number")
+
+	if count < 1:
+		raise argparse.ArgumentTypeError("\'" + value + "\' has to be at least 1")
+
+	return count
+
+
+# Parse command line arguments (those this process was started with, unless
+# given, along with the directory they were given in) and return option and/or
+# values of action
+def cmd_line_parse(argv = None, cwd = None):
+	import argparse
+
+	# The configuration decides the target containers on offer, so read it first
+	parser_config = argparse.ArgumentParser(add_help = False)
+	parser_config.add_argument("--config", action = "store", default = None, dest = "config", metavar = "PATH",
+	                           help = "Read the converters to use from PATH (default: " + path_config_get() + ")")
+
+	result_config, _ = parser_config.parse_known_args(argv)
+
+	try:
+		registry = converter_registry_get(result_config.config)
+	except (OSError, ValueError, KeyError, TypeError):
+		parser_config.error("Could not read the configuration: " + str(sys.exc_info()[1]))
+
+	parser = argparse.ArgumentParser(
+		description = "Encapsulates the source video in one the target container formats specified: %s" % (
+			registry.targets_get(),),
+		add_help = True, parents = (parser_config,))
+
+	parser.add_argument("--notify", choices = ("desktop", "stdout", "none"), action = "append", default = None,
+	                    dest = "notify",
+	                    help = "Where to send notifications of errors; may be given more than once (default: "
+	                           "desktop)")
+
+	parser.add_argument("--notify-drop", action = "store", default = None, dest = "notify_drop", metavar = "DIR",
+	                    help = "Also drop notifications as JSON files in DIR, for another program to pick up")
+
+	parser.add_argument("--notify-interval", type = positive_int, action = "store", default = 30,
+	                    dest = "notify_interval", metavar = "SECONDS",
+	                    help = "Send at most one notification every SECONDS, summarizing the errors in between "
+	                           "(default: 30)")
+
+	group_verbosity = parser.add_mutually_exclusive_group()
+	group_verbosity.add_argument("-v", "--verbose", action = "store_const", const = 1, default = 0,
+	                             dest = "verbosity",
+	                             help = "Also show (and log) the commands run, and what they print")
+	group_verbosity.add_argument("-q", "--quiet", action = "store_const", const = -1, dest = "verbosity",
+	                             help = "Only show errors on the console; the log is kept as usual")
+
+	# Not needed to carry out a plan, which says
+	parser.add_argument("-c", "--container", choices = registry.targets_get(), required = False,
+	                    action = "store",
+	                    default = None, dest = "container",
+	                    help = "Specify which of the supported formats the source is to be converted to")
+
+	parser.add_argument("--resume", action = "store_true", default = False, dest = "resume",
+	                    help = "Skip files that haven't changed since they were last processed")
+
+	parser.add_argument("--no-probe-cache", action = "store_false", default = True, dest = "probe_cache",
+	                    help = "Always run ffprobe, instead of reusing results from earlier runs")
+
+	parser.add_argument("--prober", choices = ("header", "ffprobe"), action = "store", default = "ffprobe",
+	                    dest = "prober",
+	                    help = "How to probe files: always run ffprobe (ffprobe), or read Matroska, MP4 and AVI "
+	                           "headers directly, running ffprobe for anything else (header) (default: ffprobe)")
+
+	parser.add_argument("--verify", choices = ("cheap", "strict"), action = "store", default = "cheap",
+	                    dest = "verification",
+	                    help = "How to verify a conversion before deleting the source: compare stream headers "
+	                           "(cheap), or also count packets, which reads both files in full (strict) "
+	                           "(default: cheap)")
+
+	parser.add_argument("--report", action = "store", default = None, dest = "report", metavar = "PATH",
+	                    help = "Write a machine readable report of the run, with metrics per file, to PATH (JSON "
+	                           "lines, or CSV if PATH ends in .csv)")
+
+	parser.add_argument("--dedup", choices = ("hardlink", "reflink"), action = "store", default = None,
+	                    dest = "dedup",
+	                    help = "Convert only one of each set of identical files, and link its conversion for the "
+	                           "rest, as a hard link or a reflink")
+
+	parser.add_argument("--no-sidecars", action = "store_false", default = True, dest = "sidecars",
+	                    help = "Leave subtitle files next to a video (such as Movie.en.srt) alone, instead of "
+	                           "merging them into its Matroska conversion and deleting them along with it")
+
+	parser.add_argument("--lease-dir", action = "store", default = None, dest = "lease_dir", metavar = "DIR",
+	                    help = "Divide the files among hosts converting the same library, through leases kept in "
+	                           "DIR (on the share, same for all hosts)")
+
+	parser.add_argument("--watch", action = "store_true", default = False, dest = "watch",
+	                    help = "Keep watching the directories given, and convert files as they turn up")
+
+	parser.add_argument("--settle", type = positive_int, action = "store", default = 10, dest = "seconds_settle",
+	                    metavar = "SECONDS",
+	                    help = "With --watch, wait for a file to go unchanged for SECONDS before converting it "
+	                           "(default: 10)")
+
+	parser.add_argument("--scratch", action = "store", default = None, dest = "scratch", metavar = "DIR",
+	                    help = "Write conversions to DIR (say, on a local SSD) and copy them back next to their "
+	                           "source once verified, while the next conversion runs")
+
+	parser.add_argument("-j", "--jobs", type = positive_int, action = "store", default = 1, dest = "jobs",
+	                    help = "Number of conversions to run at the same time (default: 1)")
+
+	parser.add_argument("--jobs-per-volume", type = positive_int, action = "store", default = 1,
+	                    dest = "jobs_per_volume",
+	                    help = "Maximum number of conversions to run at the same time on a single disk/volume "
+	                           "(default: 1)")
+
+	parser.add_argument("--nice", type = int, choices = range(0, 20), action = "store", default = 0, dest = "nice",
+	                    metavar = "N",
+	                    help = "Run the converters at niceness N, from 0 (the usual) to 19 (only when the CPU is "
+	                           "otherwise idle) (default: 0)")
+
+	parser.add_argument("--ionice", choices = ("idle", "best-effort"), action = "store", default = None,
+	                    dest = "ionice",
+	                    help = "Run the converters in the I/O scheduling class given: idle (only when no one else "
+	                           "wants the disk), or best-effort at the lowest priority")
+
+	parser.add_argument("--read-limit", type = positive_int, action = "store", default = None,
+	                    dest = "read_limit", metavar = "MIB",
+	                    help = "Cap what the converters read, between them, to MIB MiB a second (Linux only)")
+
+	parser.add_argument("--governor", action = "store_true", default = False, dest = "governor",
+	                    help = "Run fewer conversions at once (down to one) while the system is waiting on its "
+	                           "disks or short of memory, and more (up to --jobs) once it isn't (Linux only)")
+
+	parser.add_argument("--order", choices = tuple(ConversionPlanner.dict_orders), action = "store", default = "walk",
+	                    dest = "order",
+	                    help = "Order to convert files in: as found (walk), or once all are found, the smallest, the "
+	                           "largest, or those freeing the most space (reclaim) first, or by turns across volumes "
+	                           "(interleave) (default: walk)")
+
+	group_plan = parser.add_mutually_exclusive_group()
+	group_plan.add_argument("--plan", action = "store", default = None, dest = "plan", metavar = "PATH",
+	                        help = "Only plan the run: write what would become of each file, what each volume "
+	                               "needs and how long it'd all take to PATH (JSON), without converting anything")
+	group_plan.add_argument("--execute-plan", action = "store", default = None, dest = "execute_plan",
+	                        metavar = "PATH",
+	                        help = "Carry out the plan at PATH, as planned; files changed since are left alone")
+
+	parser.add_argument("--single-instance", action = "store_true", default = False, dest = "single_instance",
+	                    help = "Hand the files over to an instance already running with the same options, if any; "
+	                           "else, take files from those started later, till none come for a while")
+
+	result_parse, files_to_process = parser.parse_known_args(argv)
+
+	# Paths relative to where we were started from won't do once main() moves
+	# to the directory of the script, nor in another instance taking our files
+	for name in cmd_line_parse.options_path:
+		if getattr(result_parse, name):
+			setattr(result_parse, name, os.path.abspath(os.path.join(cwd or os.getcwd(), getattr(result_parse, name))))
+
+	# What's to be done comes from the plan
+	result_parse.plan_executed = None
+
+	if result_parse.execute_plan:
+		if files_to_process:
+			parser.error("--execute-plan takes the files to convert from the plan alone")
+
+		if result_parse.order != "walk" or result_parse.dedup or result_parse.watch or result_parse.single_instance:
+			parser.error("--execute-plan can't be used with --order, --dedup, --watch or --single-instance; the "
+			             "plan has the order, and the duplicates, planned")
+
+		try:
+			result_parse.plan_executed = plan_read(result_parse.execute_plan)
+		except (OSError, ValueError):
+			parser.error("Could not read the plan: " + str(sys.exc_info()[1]))
+
+		if result_parse.container not in (None, result_parse.plan_executed["container"]):
+			parser.error("The plan is for converting to " + result_parse.plan_executed["container"])
+
+		result_parse.container = result_parse.plan_executed["container"]
+		result_parse.dedup = result_parse.plan_executed.get("dedup")
+	elif result_parse.container is None:
+		parser.error("the following arguments are required: -c/--container")
+
+	if result_parse.plan and (result_parse.watch or result_parse.single_instance):
+		parser.error("--plan needs all the files at hand, so it can't be used with --watch or --single-instance")
+
+	if result_parse.watch:
+		if result_parse.dedup:
+			parser.error("--dedup needs all the files at hand, so it can't be used with --watch")
+
+		if not all(os.path.isdir(path) for path in files_to_process):
+			parser.error("--watch takes directories alone")
+
+		if result_parse.single_instance:
+			parser.error("--single-instance can't be used with --watch")
+
+		if result_parse.order != "walk":
+			parser.error("--order needs all the files at hand, so it can't be used with --watch")
+
+	return result_parse, files_to_process
+
+# Options naming files or directories
+cmd_line_parse.options_path = ("lease_dir", "scratch", "report", "notify_drop", "plan", "execute_plan")
+
+
+# Identify the disk/partition/volume a file lives on. Used to cap the number
+# of conversions hitting the same volume at once.
+def volume_id_get(path_file, stat_file = None):
+	try:
+		if stat_file is None:
+			stat_file = os.stat(path_file)
+
+		return stat_file.st_dev
+	except OSError:
+		# Let the conversion report on the file; it's as good as on a volume
+		# of its own
+		return None
+
+
+# Stands in for a thread pool when running one job at a time: runs each job
+# right away, on the calling thread
+class InlineExecutor:
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+	def submit(self, function, *args):
+		future = Future()
+
+		try:
+			future.set_result(function(*args))
+		except Exception as error:
+			future.set_exception(error)
+
+		return future
+
+
+# Divides the files to convert among hosts sharing a library over the network,
+# through a directory of leases on the share. A host claims a file by creating
+# its lease exclusively, and keeps it fresh (touching it every so often) for as
+# long as it works on it; other hosts pass the file over meanwhile. A lease
+# that's gone stale (its host crashed, say) is broken, and the file claimed
+# anew. Files that fail are marked as such, so that other hosts don't try them
+# again. Files are told apart by their name, size and modification time, as
+# the share may well be mounted at different paths on different hosts.
+class LeaseDirectory:
+	seconds_heartbeat = 60
+	seconds_stale = 10 * 60
+
+	def __init__(self, path_dir):
+		self.path_dir = path_dir
+		self.owner = host_name_get() + "-" + str(os.getpid())
+
+		os.makedirs(path_dir, exist_ok = True)
+
+		# Leases held, by the path of the file
+		self.lock = threading.Lock()
+		self.dict_held = {}
+
+		self.event_closing = threading.Event()
+		self.thread = threading.Thread(target = self.heartbeat, name = "lease-heartbeat", daemon = True)
+		self.thread.start()
+
+	def path_lease_get(self, path_file, stat_file):
+		import hashlib
+
+		key = hashlib.sha1((os.path.basename(path_file) + "\0" + str(stat_file.st_size) + "\0" + str(
+			int(stat_file.st_mtime))).encode(errors = "replace")).hexdigest()
+
+		return os.path.join(self.path_dir, key + ".lease")
+
+	# The time on the share, which is what lease times are by; the hosts' clocks
+	# needn't agree with it
+	def time_share_get(self):
+		path_clock = os.path.join(self.path_dir, ".clock-" + self.owner)
+
+		with open(path_clock, "w"):
+			pass
+
+		time_share = os.stat(path_clock).st_mtime
+		os.remove(path_clock)
+
+		return time_share
+
+	def lease_read(self, path_lease):
+		try:
+			with open(path_lease, encoding = "utf-8") as file_lease:
+				return json.load(file_lease)
+		except (OSError, ValueError):
+			return {}
+
+	# Break a lease if it's gone stale. Returns whether it was.
+	def lease_break(self, path_lease):
+		try:
+			stat_lease = os.stat(path_lease)
+		except FileNotFoundError:
+			# Let go of since; up for grabs
+			return True
+
+		time_lease = stat_lease.st_mtime
+		lease = self.lease_read(path_lease)
+		host, _, pid = lease.get("owner", "").rpartition("-")
+
+		if not (host == host_name_get() and pid.isdigit() and not process_alive(int(pid))) and (
+				self.time_share_get() - time_lease < self.seconds_stale):
+			return False
+
+		# Only one host gets to move it out of the way, should several find it stale
+		path_broken = path_lease + ".broken-" + self.owner
+
+		try:
+			os.rename(path_lease, path_broken)
+		except FileNotFoundError:
+			return True
+
+		# Another host may have broken it first, and claimed the file afresh in the
+		# meantime. If what we moved isn't what we found stale, put it back; the
+		# file is theirs.
+		try:
+			stat_broken = os.stat(path_broken)
+		except FileNotFoundError:
+			return True
+
+		if stat_broken.st_mtime_ns != stat_lease.st_mtime_ns or self.lease_read(path_broken).get(
+				"owner") != lease.get("owner"):
+			try:
+				file_rename_no_clobber(path_broken, path_lease)
+			except FileExistsError:
+				# Claimed yet again; theirs all the same
+				os.remove(path_broken)
+
+			return False
+
+		logging.info("Broke the stale lease on \'" + lease.get("path", path_lease) + "\', held by " + lease.get(
+			"owner", "an unknown host"))
+
+		os.remove(path_broken)
+
+		return True
+
+	# Claim a file. Returns None if claimed, else the reason it can't be.
+	def claim(self, path_file, stat_file):
+		path_lease = self.path_lease_get(path_file, stat_file)
+
+		if os.path.exists(path_lease[:-len(".lease")] + ".failed"):
+			return "failed on " + self.lease_read(path_lease[:-len(".lease")] + ".failed").get("owner", "another host")
+
+		for _ in range(2):
+			try:
+				descriptor = os.open(path_lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+			except FileExistsError:
+				if not self.lease_break(path_lease):
+					return "being converted by " + self.lease_read(path_lease).get("owner", "another host")
+			else:
+				with os.fdopen(descriptor, "w", encoding = "utf-8") as file_lease:
+					json.dump({"owner": self.owner, "path": path_file, "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")},
+					          file_lease)
+
+				with self.lock:
+					self.dict_held[path_file] = path_lease
+
+				return None
+
+		return "being claimed by another host"
+
+	# Let go of a file, marking it so if it failed: the converter did, or its
+	# conversion didn't check out. Not so for an error on our side (a share
+	# gone away, say), which another host, or another run, may well get past.
+	def release(self, path_file, outcome):
+		with self.lock:
+			path_lease = self.dict_held.pop(path_file, None)
+
+		if path_lease is None or self.lease_read(path_lease).get("owner") != self.owner:
+			return
+
+		try:
+			if outcome == OUTCOME_FAILED:
+				os.replace(path_lease, path_lease[:-len(".lease")] + ".failed")
+			else:
+				os.remove(path_lease)
+		except OSError:
+			logging.error("Could not release the lease on \'" + path_file + "\': " + str(sys.exc_info()))
+
+	# Keep the leases held fresh
+	def heartbeat(self):
+		while not self.event_closing.wait(self.seconds_heartbeat):
+			with self.lock:
+				dict_held = dict(self.dict_held)
+
+			for path_file, path_lease in dict_held.items():
+				try:
+					if self.lease_read(path_lease).get("owner") != self.owner:
+						raise FileNotFoundError("Lease taken over")
+
+					os.utime(path_lease)
+				except OSError:
+					message_error("Lost the lease on \'" + path_file + "\'; another host may convert it too: " + str(
+						sys.exc_info()[1]))
+
+					with self.lock:
+						self.dict_held.pop(path_file, None)
+
+	def close(self):
+		self.event_closing.set()
+		self.thread.join()
+
+		with self.lock:
+			list_held = list(self.dict_held)
+
+		for path_file in list_held:
+			self.release(path_file, None)
+
+
+# Clone a file's data into a new file without copying it, on file systems that
+# support it (Btrfs, XFS and the like, on Linux). Raises OSError where not.
+def file_reflink(path_source, path_target):
+	if platform.system() != "Linux":
+		raise OSError("Reflinks are supported on Linux alone")
+
+	import fcntl
+
+	# FICLONE, from linux/fs.h
+	request_clone = 0x40049409
+
+	with open(path_source, "rb") as file_source, open(path_target, "xb") as file_target:
+		try:
+			fcntl.ioctl(file_target.fileno(), request_clone, file_source.fileno())
+		except OSError:
+			file_target.close()
+			os.remove(path_target)
+
+			raise
+
+
+# Finds byte identical copies among the files to convert, so that only one of
+# each gets converted, and the others get a link to its conversion (a hard link,
+# or a reflink), saving both the time to convert them and the space they'd
+# take. Candidates are grouped by volume and size first, then by a hash of a
+# few blocks off their head, middle and tail, and only those still alike are
+# hashed in full. Duplicates are held back until their representative is
+# done; if it isn't converted, or the link can't be made, they're converted
+# on their own after all.
+class Deduplicator:
+	size_block = 64 * 1024
+	size_chunk = 1024 * 1024
+
+	def __init__(self, mode):
+		self.mode = mode
+
+		# Duplicates held back, by the path of their representative
+		self.dict_duplicates = {}
+
+	def hash_sampled_get(self, path_file, size):
+		import hashlib
+
+		hash_sampled = hashlib.blake2b(str(size).encode())
+
+		with open(path_file, "rb") as file_source:
+			for offset in (0, max(0, size // 2 - self.size_block // 2), max(0, size - self.size_block)):
+				file_source.seek(offset)
+				hash_sampled.update(file_source.read(self.size_block))
+
+		return hash_sampled.digest()
+
+	def hash_full_get(self, path_file):
+		import hashlib
+
+		hash_full = hashlib.blake2b()
+
+		with open(path_file, "rb") as file_source:
+			for chunk in iter(lambda: file_source.read(self.size_chunk), b""):
+				hash_full.update(chunk)
+
+		return hash_full.digest()
+
+	# Split files into groups alike by the hash function given, dropping those
+	# that can't be read (their conversion will report on them)
+	def groups_split(self, group, function_hash):
+		dict_groups = {}
+
+		for path_file, stat_file in group:
+			try:
+				digest = function_hash(path_file, stat_file)
+			except OSError:
+				logging.error("Error reading \'" + path_file + "\': " + str(sys.exc_info()))
+
+				digest = path_file
+
+			dict_groups.setdefault(digest, []).append((path_file, stat_file))
+
+		return dict_groups.values()
+
+	# Filter the files received (pairs of path and stat result) down to one of
+	# each set of duplicates, in the order received. Needs all of them at hand
+	# to do so.
+	def paths_filter(self, paths):
+		list_paths = []
+		dict_sizes = {}
+		set_seen = set()
+
+		message_info("Looking for duplicates among the files to convert...\n")
+
+		for path_file, stat_file in paths:
+			# The same file reached through overlapping arguments is converted once
+			path_real = os.path.realpath(path_file)
+
+			if path_real in set_seen:
+				continue
+
+			set_seen.add(path_real)
+
+			if stat_file is None:
+				try:
+					stat_file = os.stat(path_file)
+				except OSError:
+					pass
+
+			list_paths.append((path_file, stat_file))
+
+			# Files with sidecars get them merged in; a link to another's conversion
+			# wouldn't have them
+			if stat_file is not None and not sidecars_get(path_file):
+				dict_sizes.setdefault((stat_file.st_dev, stat_file.st_size), []).append((path_file, stat_file))
+
+		set_duplicates = set()
+
+		for group_size in dict_sizes.values():
+			if len(group_size) < 2:
+				continue
+
+			for group_sampled in self.groups_split(group_size, lambda path_file, stat_file: self.hash_sampled_get(
+					path_file, stat_file.st_size)):
+				if len(group_sampled) < 2:
+					continue
+
+				# Hard links to the same file need no hashing
+				if len({stat_file.st_ino for _, stat_file in group_sampled}) == 1:
+					groups_full = (group_sampled,)
+				else:
+					groups_full = self.groups_split(group_sampled,
+					                                lambda path_file, stat_file: self.hash_full_get(path_file))
+
+				for group_full in groups_full:
+					if len(group_full) > 1:
+						representative, *duplicates = group_full
+
+						self.dict_duplicates[representative[0]] = duplicates
+						set_duplicates.update(path_file for path_file, _ in duplicates)
+
+		if set_duplicates:
+			message_info("Found " + str(len(set_duplicates)) + " duplicate(s) of " + str(
+				len(self.dict_duplicates)) + " file(s); converting one of each\n")
+
+		for path_file, stat_file in list_paths:
+			if path_file not in set_duplicates:
+				yield path_file, stat_file
+
+	# Duplicates held back for a file, if any; they're the caller's to see to
+	def duplicates_take(self, path_file):
+		return self.dict_duplicates.pop(path_file, ())
+
+	# Link the conversion of a file for a duplicate of it, in place of the
+	# duplicate's own, and delete the duplicate. Raises OSError if the link
+	# can't be made, or if the duplicate has changed since it was found to be
+	# one (as stat_duplicate has it), which may well have been hours ago.
+	def target_link(self, container_target_name_abs, path_duplicate, stat_duplicate, container_target_extension):
+		root, _ = split_root_extension(path_duplicate)
+		container_duplicate_name_abs = root + os.extsep + container_target_extension
+		container_partial_name_abs = path_partial_get(root, container_target_extension)
+
+		if fingerprint_get(path_duplicate) != fingerprint_get(path_duplicate, stat_duplicate):
+			raise OSError("\'" + path_duplicate + "\' has changed since it was found to be a duplicate")
+
+		if self.mode == "hardlink":
+			os.link(container_target_name_abs, container_partial_name_abs)
+		else:
+			file_reflink(container_target_name_abs, container_partial_name_abs)
+
+		try:
+			file_rename_no_clobber(container_partial_name_abs, container_duplicate_name_abs)
+		except OSError:
+			file_partial_remove(container_partial_name_abs)
+
+			raise
+
+		message_info("Linked \'" + container_duplicate_name_abs + "\' to \'" + container_target_name_abs +
+		             "\', as its source is a duplicate\n")
+
+		os.remove(path_duplicate)
+
+		if probe_get.cache:
+			probe_get.cache.forget(path_duplicate)
+
+		message_info("Deleted source file \'" + path_duplicate + "\'\n")
+
+
+# Plans the order to convert files in, for a batch that'd rather not spend
+# hours on huge files before the small ones are through, or run out of space
+# half way. Collects all the files to convert first, orders them under the
+# policy chosen, and estimates how long converting them will take from the
+# throughput recorded by earlier runs. The scheduler still has volumes take
+# turns, so the order holds within each volume.
+class ConversionPlanner:
+	dict_orders = {"walk": "as found", "smallest": "smallest first", "largest": "largest first",
+	               "reclaim": "those freeing the most space first", "interleave": "volumes by turns"}
+
+	def __init__(self, order, container_target, jobs = 1, jobs_per_volume = 1, deduplicator = None, probing = True):
+		self.order = order
+		self.container_target = container_target
+		self.jobs = jobs
+		self.jobs_per_volume = jobs_per_volume
+		self.deduplicator = deduplicator
+
+		# Whether files may be probed; else, only probes cached earlier are used
+		self.probing = probing
+
+	# Bytes the streams in a file come to, going by the bit rate and duration of
+	# each, as probed. Raises KeyError (or ValueError) if the probe leaves any of
+	# that out, as it often does.
+	@staticmethod
+	def size_streams_get(result):
+		duration = float(result["format"]["duration"])
+
+		return sum(int(stream["bit_rate"]) * float(stream.get("duration", duration)) / 8 for stream in
+		           result["streams"])
+
+	# Bytes converting a file is likely to free: the source goes, and its streams
+	# come back in a container of their own. The difference is what the source's
+	# container costs (AVI's chunk headers and index, say). Duplicates linked in
+	# place of conversions of their own go as well.
+	def reclaim_estimate_get(self, path_file, stat_file):
+		reclaim = 0
+
+		try:
+			if self.probing:
+				result = probe_get(path_file)
+			elif probe_get.cache:
+				result = probe_get.cache.lookup(path_file, "format_streams", fingerprint_get(path_file, stat_file))
+			else:
+				result = None
+
+			if result:
+				reclaim = max(0, stat_file.st_size - self.size_streams_get(result))
+		except (subprocess.CalledProcessError, OSError, KeyError, ValueError, TypeError, AttributeError):
+			# No telling
+			logging.debug("Could not estimate the space converting \'" + path_file + "\' frees: " + str(
+				sys.exc_info()[1]))
+
+		if self.deduplicator and stat_file:
+			for _, stat_duplicate in self.deduplicator.dict_duplicates.get(path_file, ()):
+				# Hard links to the source free nothing
+				if stat_duplicate and stat_duplicate.st_ino != stat_file.st_ino:
+					reclaim += stat_duplicate.st_size
+
+		return reclaim
+
+	# Bytes a second files of the kind given have been converted at, by the tool
+	# given, else by the fastest; None if nothing's been recorded
+	def rate_get(self, extension, name_tool = None):
+		throughput = converter_registry_get().throughput
+
+		if throughput is None:
+			return None
+
+		dict_rates = throughput.rates_get(self.container_target, extension)
+
+		if name_tool in dict_rates:
+			return dict_rates[name_tool][1]
+
+		return max((rate for _, rate in dict_rates.values()), default = None)
+
+	# Seconds converting the files planned is likely to take, going by the
+	# fastest throughput recorded for each kind of source; None if nothing's been
+	# recorded yet
+	def seconds_estimate_get(self, list_plan, count_volumes):
+		dict_rates = {}
+
+		for path_file, _ in list_plan:
+			extension = split_root_extension(path_file)[1]
+
+			if extension not in dict_rates:
+				dict_rates[extension] = self.rate_get(extension)
+
+		list_rates = [rate for rate in dict_rates.values() if rate]
+
+		if not list_rates:
+			return None
+
+		# Kinds not converted before are taken to go at the average of the others
+		rate_average = sum(list_rates) / len(list_rates)
+		seconds = sum(stat_file.st_size / (dict_rates[split_root_extension(path_file)[1]] or rate_average) for
+		              path_file, stat_file in list_plan if stat_file)
+
+		return seconds / self.count_parallel_get(count_volumes)
+
+	# Conversions on different volumes run side by side
+	def count_parallel_get(self, count_volumes):
+		return max(1, min(self.jobs, count_volumes * self.jobs_per_volume))
+
+	# Take all the files received (pairs of path and stat result), and yield
+	# them back in the order planned
+	def paths_plan(self, paths):
+		list_plan = []
+
+		message_info("Planning the order to convert files in...\n")
+
+		for item in paths:
+			# A feed taking files over (see InstanceServer) having nothing for now
+			if item is None:
+				continue
+
+			path_file, stat_file = item
+
+			if stat_file is None:
+				try:
+					stat_file = os.stat(path_file)
+				except OSError:
+					# Let the conversion report on it
+					pass
+
+			list_plan.append((path_file, stat_file))
+
+		def size_get(item):
+			return item[1].st_size if item[1] else 0
+
+		if self.order == "smallest":
+			list_plan.sort(key = size_get)
+		elif self.order == "largest":
+			list_plan.sort(key = size_get, reverse = True)
+		elif self.order == "reclaim":
+			# Probes are cached, so the conversions don't probe their sources again
+			with ThreadPoolExecutor(max_workers = self.jobs) as executor:
+				list_reclaim = list(executor.map(
+					lambda item: self.reclaim_estimate_get(*item) if item[1] else 0, list_plan))
+
+			dict_reclaim = {path_file: reclaim for (path_file, _), reclaim in zip(list_plan, list_reclaim)}
+
+			# The most freed first, and for as much, the smaller (quicker) first
+			list_plan.sort(key = lambda item: (-dict_reclaim[item[0]], size_get(item)))
+		elif self.order == "interleave":
+			dict_volumes = collections.OrderedDict()
+
+			for item in list_plan:
+				dict_volumes.setdefault(volume_id_get(*item), collections.deque()).append(item)
+
+			list_plan = []
+
+			while dict_volumes:
+				for volume in list(dict_volumes.keys()):
+					list_plan.append(dict_volumes[volume].popleft())
+
+					if not dict_volumes[volume]:
+						del dict_volumes[volume]
+
+		count_volumes = len({volume_id_get(*item) for item in list_plan})
+
+		message_info("Planned " + str(len(list_plan)) + " file(s), " + sizeof_fmt(
+			sum(size_get(item) for item in list_plan)) + " in all, on " + str(count_volumes) + " volume(s), " +
+		             self.dict_orders[self.order] + "\n")
+
+		seconds = self.seconds_estimate_get(list_plan, count_volumes)
+
+		if seconds is not None:
+			message_info("Estimated to take " + total_time_in_hms_get(seconds * 1000000000) + ", going by earlier "
+			                                                                                  "runs\n")
+
+		yield from list_plan
+
+	# Where a file stands: whether it'd be converted, by which tool, into what
+	# and how long that'd take, or else why not. Makes the same checks as
+	# container_format_matroska_set(), without converting (or probing) anything.
+	def entry_get(self, path_file, stat_file, dict_free):
+		entry = {"path": path_file, "action": "skip"}
+
+		try:
+			if stat_file is None:
+				stat_file = os.stat(path_file)
+		except OSError:
+			entry.update(outcome = OUTCOME_FAILED, error = str(sys.exc_info()[1]))
+
+			return entry, None
+
+		entry.update(size = stat_file.st_size, mtime_ns = stat_file.st_mtime_ns, inode = stat_file.st_ino)
+
+		root, extension = split_root_extension(path_file)
+		container_target_name_abs = root + os.extsep + self.container_target
+		registry = converter_registry_get()
+
+		if os.path.isfile(container_target_name_abs):
+			entry["outcome"] = OUTCOME_SKIPPED_EXISTS
+
+			return entry, stat_file
+
+		if not registry.routes_get(self.container_target, extension):
+			entry["outcome"] = OUTCOME_UNSUPPORTED
+
+			return entry, stat_file
+
+		if stat_file.st_dev not in dict_free:
+			try:
+				dict_free[stat_file.st_dev] = shutil.disk_usage(os.path.dirname(os.path.abspath(path_file))).free
+			except OSError:
+				dict_free[stat_file.st_dev] = 0
+
+		route = registry.route_pick(self.container_target, extension, path_file)
+
+		if not dict_free[stat_file.st_dev] > space_needed_get(stat_file):
+			entry["outcome"] = OUTCOME_SKIPPED_NO_SPACE
+		elif route is None:
+			entry["outcome"] = OUTCOME_NO_TOOL
+		else:
+			# A stream copy comes to about as much as the source, less what its
+			# container costs, if we've probed it before
+			size_estimate = stat_file.st_size
+
+			if probe_get.cache:
+				try:
+					result = probe_get.cache.lookup(path_file, "format_streams", fingerprint_get(path_file, stat_file))
+
+					if result:
+						size_estimate = min(size_estimate, self.size_streams_get(result))
+				except (KeyError, ValueError, TypeError):
+					pass
+
+			rate = self.rate_get(extension, route.tool.name)
+
+			entry.update(action = "convert", converter = route.tool.name, target = container_target_name_abs,
+			             size_estimate = int(size_estimate),
+			             seconds_estimate = round(stat_file.st_size / rate, 1) if rate else None,
+			             space_needed = space_needed_get(stat_file))
+
+			sidecars = sidecars_get(path_file) if route.sidecars_supported(self.container_target) else ()
+
+			if sidecars:
+				entry["sidecars"] = [sidecar.path for sidecar in sidecars]
+
+			if self.deduplicator and path_file in self.deduplicator.dict_duplicates:
+				entry["duplicates"] = [
+					{"path": path_duplicate, "size": stat_duplicate.st_size, "mtime_ns": stat_duplicate.st_mtime_ns,
+					 "inode": stat_duplicate.st_ino} for path_duplicate, stat_duplicate in
+					self.deduplicator.dict_duplicates[path_file]]
+
+		return entry, stat_file
+
+	# Write out a plan for the files received (pairs of path and stat result),
+	# in the order received, for a later run to carry out (see paths_planned()):
+	# what's to become of each, what each volume needs, and totals. Nothing is
+	# converted, and nothing deleted.
+	def plan_write(self, paths, path_plan):
+		list_entries = []
+		dict_volumes = collections.OrderedDict()
+		dict_free = {}
+		dict_skipped = collections.Counter()
+
+		for item in paths:
+			if item is None:
+				continue
+
+			entry, stat_file = self.entry_get(*item, dict_free)
+			list_entries.append(entry)
+
+			if entry["action"] != "convert":
+				dict_skipped[entry["outcome"]] += 1
+
+				continue
+
+			if stat_file.st_dev not in dict_volumes:
+				try:
+					label = get_volume_label(entry["path"])
+				except Exception:
+					label = os.path.dirname(entry["path"])
+
+				dict_volumes[stat_file.st_dev] = {"volume": label, "free": dict_free[stat_file.st_dev], "files": 0,
+				                                  "size": 0, "size_estimate": 0, "space_needed": 0,
+				                                  "list_needed": []}
+
+			volume = dict_volumes[stat_file.st_dev]
+			volume["files"] += 1
+			volume["size"] += entry["size"]
+			volume["size_estimate"] += entry["size_estimate"]
+			volume["space_needed"] += entry["space_needed"]
+			volume["list_needed"].append(entry["space_needed"])
+
+		list_volumes = []
+
+		for volume in dict_volumes.values():
+			# Sources go as their conversions are done, so a volume only needs room for
+			# those running at the same time; space_needed is for keeping them all
+			list_needed = sorted(volume.pop("list_needed"), reverse = True)
+			volume["space_needed_at_once"] = sum(list_needed[:self.jobs_per_volume])
+			volume["fits"] = volume["free"] > volume["space_needed_at_once"]
+
+			list_volumes.append(volume)
+
+		list_convert = [entry for entry in list_entries if entry["action"] == "convert"]
+		list_seconds = [entry["seconds_estimate"] for entry in list_convert if entry["seconds_estimate"] is not None]
+
+		totals = {"files": len(list_entries), "convert": len(list_convert), "skip": dict(dict_skipped),
+		          "size": sum(entry["size"] for entry in list_convert),
+		          "size_estimate": sum(entry["size_estimate"] for entry in list_convert),
+		          "seconds_estimate": round(sum(list_seconds) / self.count_parallel_get(len(list_volumes)), 1),
+		          "files_without_estimate": len(list_convert) - len(list_seconds)}
+
+		plan = {"version": 1, "container": self.container_target, "order": self.order,
+		        "dedup": self.deduplicator.mode if self.deduplicator else None, "host": host_name_get(),
+		        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "totals": totals, "volumes": list_volumes,
+		        "files": list_entries}
+
+		# Show up complete, or not at all
+		path_temporary = path_plan + ".tmp"
+
+		with open(path_temporary, "w", encoding = "utf-8") as file_plan:
+			json.dump(plan, file_plan, indent = 1)
+
+		os.replace(path_temporary, path_plan)
+
+		message_info("Plan written to \'" + path_plan + "\': " + str(totals["convert"]) + " file(s) to convert, " +
+		             sizeof_fmt(totals["size"]) + " in all" + (", taking about " + total_time_in_hms_get(
+			totals["seconds_estimate"] * 1000000000) if list_seconds else "") + (" (no estimate for " + str(
+			totals["files_without_estimate"]) + " never converted before)" if totals["files_without_estimate"] and
+		                                                                       list_seconds else ""))
+
+		for outcome, count in dict_skipped.items():
+			message_info("Skipping " + str(count) + " file(s): " + outcome)
+
+		for volume in list_volumes:
+			message_info("\'" + volume["volume"] + "\' needs " + sizeof_fmt(volume["space_needed_at_once"]) +
+			             " free at once (" + sizeof_fmt(volume["space_needed"]) + " to keep all conversions with "
+			             "their sources), and has " + sizeof_fmt(volume["free"]) +
+			             ("" if volume["fits"] else "; NOT ENOUGH"))
+
+	# The files a plan (see plan_write()) has to be converted, in the order
+	# planned, as pairs of path and stat result. Files changed since are left
+	# alone. Each is converted by the tool planned, and duplicates planned to be
+	# linked are linked.
+	def paths_planned(self, plan):
+		registry = converter_registry_get()
+
+		for entry in plan["files"]:
+			if entry["action"] != "convert":
+				continue
+
+			path_file = entry["path"]
+
+			try:
+				stat_file = os.stat(path_file)
+			except OSError:
+				message_error("\'" + path_file + "\' is gone since planned; skipping it")
+
+				continue
+
+			if fingerprint_get(path_file, stat_file) != (entry["size"], entry["mtime_ns"], entry["inode"]):
+				message_error("\'" + path_file + "\' has changed since planned; skipping it")
+
+				continue
+
+			registry.dict_tools_planned[path_file] = entry["converter"]
+
+			if self.deduplicator and entry.get("duplicates"):
+				list_duplicates = []
+
+				for duplicate in entry["duplicates"]:
+					try:
+						stat_duplicate = os.stat(duplicate["path"])
+					except OSError:
+						continue
+
+					if fingerprint_get(duplicate["path"], stat_duplicate) == (
+							duplicate["size"], duplicate["mtime_ns"], duplicate["inode"]):
+						list_duplicates.append((duplicate["path"], stat_duplicate))
+					else:
+						message_error("\'" + duplicate["path"] + "\' has changed since planned; leaving it be")
+
+				self.deduplicator.dict_duplicates[path_file] = list_duplicates
+
+			yield path_file, stat_file
+
+
+# Read a plan written by ConversionPlanner.plan_write(). Raises OSError, or
+# ValueError if it isn't one we can carry out.
+def plan_read(path_plan):
+	with open(path_plan, encoding = "utf-8") as file_plan:
+		plan = json.load(file_plan)
+
+	if not isinstance(plan, dict) or plan.get("version") != 1 or not isinstance(plan.get("files"), list):
+		raise ValueError("\'" + path_plan + "\' isn't a plan")
+
+	if plan.get("container") not in converter_registry_get().targets_get():
+		raise ValueError("no converters to " + str(plan.get("container")) + " in the configuration")
+
+	return plan
+
+
+# Scales the number of conversions run at once (up to --jobs) to how the system
+# is holding up: one fewer while the CPUs spend much of their time waiting on
+# the disks, or memory runs short, and one more once things are at ease again.
+# Starts off with one. Reads /proc, so this needs Linux.
+class LoadGovernor:
+	seconds_sample = 5
+	fraction_iowait_high = 0.15
+	fraction_iowait_low = 0.05
+	size_memory_low = 512 * 1024 * 1024
+
+	def __init__(self, jobs):
+		self.jobs = jobs
+		self.jobs_allowed = 1
+		self.times_cpu = self.times_cpu_get()
+		self.time_sampled = time.monotonic()
+
+	# Time the CPUs have spent waiting on I/O, and in all
+	@staticmethod
+	def times_cpu_get():
+		with open("/proc/stat") as file_stat:
+			# cpu user nice system idle iowait irq softirq steal ...
+			times = [int(field) for field in file_stat.readline().split()[1:9]]
+
+		return times[4], sum(times)
+
+	@staticmethod
+	def memory_available_get():
+		with open("/proc/meminfo") as file_meminfo:
+			for line in file_meminfo:
+				if line.startswith("MemAvailable:"):
+					return int(line.split()[1]) * 1024
+
+		# Kernels before 3.14 don't say; assume plenty
+		return None
+
+	def jobs_allowed_get(self):
+		time_now = time.monotonic()
+
+		if time_now - self.time_sampled < self.seconds_sample:
+			return self.jobs_allowed
+
+		try:
+			times_cpu = self.times_cpu_get()
+			memory_available = self.memory_available_get()
+		except (OSError, ValueError, IndexError):
+			return self.jobs_allowed
+
+		fraction_iowait = (times_cpu[0] - self.times_cpu[0]) / max(1, times_cpu[1] - self.times_cpu[1])
+		self.times_cpu = times_cpu
+		self.time_sampled = time_now
+
+		jobs_allowed = self.jobs_allowed
+
+		if fraction_iowait > self.fraction_iowait_high or (memory_available is not None and
+		                                                   memory_available < self.size_memory_low):
+			jobs_allowed = max(1, jobs_allowed - 1)
+		elif fraction_iowait < self.fraction_iowait_low:
+			jobs_allowed = min(self.jobs, jobs_allowed + 1)
+
+		if jobs_allowed != self.jobs_allowed:
+			logging.info("Running up to " + str(jobs_allowed) + " conversion(s) at once (I/O wait " + str(
+				round(fraction_iowait * 100)) + "%" + (", " + sizeof_fmt(memory_available) + " of memory available"
+			                                        if memory_available is not None else "") + ")")
+
+			self.jobs_allowed = jobs_allowed
+
+		return jobs_allowed
+
+
+# Runs conversions, optionally on a pool of worker threads. A stream copy remux
+# is I/O bound and the converter subprocess does the heavy lifting, so threads
+# suffice. Jobs are capped per volume, since two remuxes on the same spindle are
+# slower than one. With a space ledger, space for each job is reserved as it's
+# handed out, and jobs are ordered so that they fit in the space left.
+class ConversionScheduler:
+	# How long to wait on running jobs before checking for more files, when the
+	# feed of files has nothing for now
+	seconds_paths_idle = 1
+
+	def __init__(self, list_failed_conversions, container_target, jobs = 1, jobs_per_volume = 1, manifest = None,
+	             ledger = None, report = None, deduplicator = None, leases = None, governor = None):
+		self.list_failed_conversions = list_failed_conversions
+		self.container_target = container_target
+		self.jobs = jobs
+		self.jobs_per_volume = jobs_per_volume
+		self.manifest = manifest
+		self.ledger = ledger
+		self.report = report
+		self.deduplicator = deduplicator
+		self.leases = leases
+		self.governor = governor
+
+		# Files handed back to be converted after all (duplicates that couldn't be
+		# linked), picked up by run()
+		self.jobs_requeued = collections.deque()
+
+		# Files read ahead of the ones running, so workers on other volumes can be
+		# kept busy while one volume is saturated, and files that fit can be picked
+		# over ones that don't. Bounded to keep memory flat on huge trees.
+		self.lookahead = max(1024, jobs * 64)
+
+	# Convert a single file, and record the outcome in the manifest. Any error is
+	# contained here, so that one bad file doesn't take the whole batch (or a
+	# worker) down with it; an interrupt isn't, and leaves the file unrecorded.
+	# For a conversion staged on scratch, the outcome is only known once it's
+	# copied back; then, returns what's needed to finish the job off once it is
+	# (see job_finish()).
+	def job_run(self, path_file, stat_file = None, seconds_discovery = 0.0):
+		fingerprint = None
+		record = None
+
+		# Leave the file to the host that has it, if any
+		if self.leases and stat_file:
+			try:
+				reason = self.leases.claim(path_file, stat_file)
+			except OSError:
+				reason = "the lease directory can't be written to: " + str(sys.exc_info()[1])
+
+			if reason:
+				message_info("Skipping \'" + path_file + "\', " + reason + "\n")
+
+				if self.ledger:
+					self.ledger.release(path_file)
+
+				# Its duplicates, if any, may still be ours to convert
+				if self.deduplicator:
+					self.duplicates_finish(path_file, None)
+
+				return None
+
+		if self.report:
+			record = self.report.begin(path_file, stat_file, seconds_discovery)
+
+		# The source is gone after a successful conversion, so fingerprint it first
+		if self.manifest:
+			try:
+				fingerprint = fingerprint_get(path_file, stat_file)
+			except OSError:
+				pass
+
+		outcome = OUTCOME_FAILED
+
+		try:
+			outcome = container_format_matroska_set(path_file, self.list_failed_conversions, self.container_target,
+			                                        stat_file)
+		except Exception:
+			message_error("Undefined exception")
+			message_error("Error converting \'" + path_file + "\': " + str(sys.exc_info()))
+
+			failed_conversion_record(self.list_failed_conversions, path_file)
+
+			outcome = OUTCOME_ERROR
+
+		if isinstance(outcome, Future):
+			# The rest of the record is kept by the thread copying it back
+			metrics_stage.local.record = None
+
+			return outcome, path_file, fingerprint, record
+
+		self.job_finish(path_file, fingerprint, record, outcome)
+
+		return None
+
+	# Record the outcome of a conversion in the report and the manifest, and let
+	# go of the space reserved for it
+	def job_finish(self, path_file, fingerprint, record, outcome):
+		if self.report:
+			self.report.end(record, outcome, self.container_target)
+
+		if self.leases:
+			self.leases.release(path_file, outcome)
+
+		if fingerprint:
+			try:
+				self.manifest.record(path_file, self.container_target, fingerprint, outcome)
+			except sqlite3.Error:
+				logging.error("Could not record \'" + path_file + "\' in the manifest: " + str(sys.exc_info()))
+
+		# Conversions settle their reservation with what they wrote and freed;
+		# this is for jobs that didn't get that far
+		if self.ledger:
+			self.ledger.release(path_file)
+
+		if self.deduplicator:
+			self.duplicates_finish(path_file, outcome)
+
+	# See to the duplicates of a file once it's done: link its conversion for
+	# them, or failing that, have them converted on their own
+	def duplicates_finish(self, path_file, outcome):
+		root, _ = split_root_extension(path_file)
+
+		for path_duplicate, stat_duplicate in self.deduplicator.duplicates_take(path_file):
+			if outcome == OUTCOME_CONVERTED and self.leases:
+				try:
+					reason = self.leases.claim(path_duplicate, stat_duplicate)
+				except OSError:
+					reason = str(sys.exc_info()[1])
+
+				if reason:
+					message_info("Skipping \'" + path_duplicate + "\', " + reason + "\n")
+
+					continue
+
+			if outcome == OUTCOME_CONVERTED:
+				record = self.report.begin(path_duplicate, stat_duplicate, 0.0) if self.report else None
+				fingerprint = fingerprint_get(path_duplicate, stat_duplicate)
+
+				try:
+					metrics_note("converter", self.deduplicator.mode)
 
-	if minutes >= 60:
-		hours = round(minutes / 60)
-		minutes = minutes % 60
+					self.deduplicator.target_link(root + os.extsep + self.container_target, path_duplicate,
+					                              stat_duplicate, self.container_target)
+				except OSError:
+					logging.error("Could not link the conversion of \'" + path_file + "\' for \'" + path_duplicate +
+					              "\'; converting it instead: " + str(sys.exc_info()))
 
-	# If the quantum is less than a second, we need show a better resolution. A fractional report matters only when
-	# it's less than 1.
-	if (not (hours and minutes)) and (seconds_raw < 1 and seconds_raw > 0):
-		# Round off to two decimals
-		seconds = round(seconds_raw, 2)
-	elif (not (hours and minutes)) and (seconds_raw < 60 and seconds_raw > 1):
-		# Round off to the nearest integer, if the quantum is less than a minute. A fractional report doesn't matter
-		# when it's more than 1.
-		seconds = round(seconds_raw)
+					# As it is now, should it have changed
+					try:
+						stat_duplicate = os.stat(path_duplicate)
+					except OSError:
+						pass
 
-	return (str(hours) + " hour(s) " if hours else "") + (str(minutes) + " minutes " if minutes else "") + (str(
-		seconds) + " seconds")
+					if record:
+						metrics_stage.local.record = None
 
+					# It's claimed again when converted
+					if self.leases:
+						self.leases.release(path_duplicate, None)
+				else:
+					if self.report:
+						self.report.end(record, OUTCOME_CONVERTED, self.container_target)
 
-def stats_print(list_failed_conversions):
-	if container_format_matroska_set.total_count_conversion:
-		print("Converted a total of " + str(
-			container_format_matroska_set.total_count_conversion) + " file(s) in " + total_time_in_hms_get(
-			container_format_matroska_set.total_time_conversion) + "\n")
-		logging.info("Converted a total of " + str(
-			container_format_matroska_set.total_count_conversion) + " file(s) in " + total_time_in_hms_get(
-			container_format_matroska_set.total_time_conversion) + "\n")
-	else:
-			print("No files converted to Matroska format")
-			logging.info("No files converted to Matroska format")
+					if self.leases:
+						self.leases.release(path_duplicate, OUTCOME_CONVERTED)
 
-	if list_failed_conversions:
-		print("\aHere's the list of files that failed to convert to Matroska format:\n")
-		logging.info("Here's the list of files that failed to convert to Matroska format:\n")
+					if self.manifest:
+						try:
+							self.manifest.record(path_duplicate, self.container_target, fingerprint, OUTCOME_CONVERTED)
+						except sqlite3.Error:
+							logging.error("Could not record \'" + path_duplicate + "\' in the manifest: " + str(
+								sys.exc_info()))
 
-		for failed_conversion in list_failed_conversions:
-			print(failed_conversion)
-			logging.info(failed_conversion)
+					continue
 
+			self.jobs_requeued.append((path_duplicate, stat_duplicate, 0.0))
 
-# Parse command line arguments and return option and/or values of action
-def cmd_line_parse():
-	dict_keys_source, _ = dict_tool_metadata_get()
+	# Pick the next file to convert off a volume's queue: the first in line, if
+	# its output fits in the space left on the volume, else the largest one that
+	# does. Space is reserved for the file picked. If nothing fits, returns None
+	# to wait for running conversions to free up space (by deleting their
+	# sources), unless none are running; then the first in line goes ahead, to
+	# be reported as such.
+	def job_pick(self, volume, queue, count_running):
+		path_file, stat_file, _ = queue[0]
 
-	parser = argparse.ArgumentParser(
-		description = "Encapsulates the source video in one the target container formats specified: %s" % tuple(
-			dict_keys_source.keys()),
-		add_help = True)
+		if self.ledger is None or stat_file is None:
+			return queue.popleft()
 
-	parser.add_argument("-c", "--container", choices = tuple(dict_keys_source.keys()), required = True,
-	                    action = "store",
-	                    default = None, dest = "container",
-	                    help = "Specify which of the supported formats the source is to be converted to")
+		available = self.ledger.available_get(os.path.dirname(os.path.abspath(path_file)), volume)
+
+		if space_needed_get(stat_file) < available:
+			job = queue.popleft()
+		else:
+			job = max((job for job in queue if job[1] and space_needed_get(job[1]) < available),
+			          key = lambda job: job[1].st_size, default = None)
+
+			if job is None:
+				return None if count_running else queue.popleft()
+
+			queue.remove(job)
+
+		self.ledger.reserve(job[0], os.path.dirname(os.path.abspath(job[0])), volume, space_needed_get(job[1]))
+
+		return job
+
+	# Convert the files received, as pairs of path and stat result (None, if not
+	# at hand)
+	def run(self, paths):
+		iterator_paths = iter(paths)
+		paths_exhausted = False
+
+		# Files waiting to be converted, queued per volume
+		dict_pending = collections.OrderedDict()
+		count_pending = 0
+
+		# Conversions running, and those staged on scratch being copied back, with
+		# the volume of each, and for the latter, what's needed to finish the job
+		# off once copied
+		dict_in_flight = {}
+		count_jobs = 0
+		count_volume = collections.Counter()
+		count_staged = collections.Counter()
+
+		# Nothing to run concurrently with one job; convert on this thread
+		executor = ThreadPoolExecutor(max_workers = self.jobs) if self.jobs > 1 else InlineExecutor()
+
+		with executor:
+			while True:
+				while self.jobs_requeued:
+					path_file, stat_file, seconds_discovery = job = self.jobs_requeued.popleft()
+
+					dict_pending.setdefault(volume_id_get(path_file, stat_file), collections.deque()).append(job)
+					count_pending += 1
+
+				# A feed of files that goes on (see WatchFeed) yields None when it has
+				# nothing for now, so that we get to see to the jobs running meanwhile
+				paths_idle = False
+
+				while not paths_exhausted and count_pending < self.lookahead:
+					# Time spent finding the file, for the report
+					time_discovery = time.monotonic()
+
+					try:
+						item = next(iterator_paths)
+					except StopIteration:
+						paths_exhausted = True
+					else:
+						if item is None:
+							paths_idle = True
+
+							break
+
+						path_file, stat_file = item
+
+						if stat_file is None:
+							try:
+								stat_file = os.stat(path_file)
+							except OSError:
+								# Let the conversion report on it
+								pass
+
+						dict_pending.setdefault(volume_id_get(path_file, stat_file), collections.deque()).append(
+							(path_file, stat_file, time.monotonic() - time_discovery))
+						count_pending += 1
+
+				# As many as the system can take just now, with a governor
+				jobs_allowed = self.governor.jobs_allowed_get() if self.governor else self.jobs
+
+				# Hand out one job per volume per pass, so volumes are served round robin
+				dispatched = True
+
+				while dispatched and count_jobs < jobs_allowed:
+					dispatched = False
+
+					for volume in list(dict_pending.keys()):
+						if count_jobs >= jobs_allowed:
+							break
+
+						if count_volume[volume] < self.jobs_per_volume:
+							queue = dict_pending[volume]
+							job = self.job_pick(volume, queue, count_volume[volume] + count_staged[volume])
+
+							if job is None:
+								# Wait for space to free up on this volume
+								continue
+
+							count_pending -= 1
+
+							if not queue:
+								del dict_pending[volume]
+							else:
+								# Move to the back of the line
+								dict_pending.move_to_end(volume)
+
+							dict_in_flight[executor.submit(self.job_run, *job)] = (volume, None)
+							count_jobs += 1
+							count_volume[volume] += 1
+
+							dispatched = True
+
+				if not dict_in_flight:
+					# Nothing running means every volume had room; so nothing can be left,
+					# but what's yet to come
+					if paths_exhausted:
+						break
+
+					continue
+
+				timeout = self.seconds_paths_idle if paths_idle else None
+
+				# Held back by the governor; see if it lets up meanwhile
+				if count_pending and count_jobs >= jobs_allowed and jobs_allowed < self.jobs:
+					timeout = min(timeout or self.governor.seconds_sample, self.governor.seconds_sample)
+
+				done, _ = wait(dict_in_flight, timeout = timeout, return_when = FIRST_COMPLETED)
+
+				for future in done:
+					volume, staged = dict_in_flight.pop(future)
+
+					if staged:
+						# Copied back from scratch
+						path_file, fingerprint, record = staged
+						count_staged[volume] -= 1
+
+						try:
+							outcome = future.result()
+						except:
+							message_error("Error copying back \'" + path_file + "\': " + str(sys.exc_info()))
+
+							failed_conversion_record(self.list_failed_conversions, path_file)
+							outcome = OUTCOME_ERROR
+
+						self.job_finish(path_file, fingerprint, record, outcome)
+					else:
+						count_jobs -= 1
+						count_volume[volume] -= 1
+						staged = future.result()
+
+						if staged:
+							future_copy, *staged = staged
+							dict_in_flight[future_copy] = (volume, staged)
+							count_staged[volume] += 1
+
+
+# A subtitle file kept next to a video, named after it ("Movie.srt",
+# "Movie.en.srt", "Movie.eng.forced.srt"), to be merged into its conversion.
+# VobSub comes in pairs: the tools take the .idx, and read the pictures off
+# the .sub next to it, which goes along as a companion.
+class Sidecar:
+	def __init__(self, path, language = None, forced = False, paths_companion = ()):
+		self.path = path
+		self.language = language
+		self.forced = forced
+		self.paths_companion = tuple(paths_companion)
+		self.vobsub = split_root_extension(path)[1] == "idx"
+
+	# Subtitle tracks it makes for. A VobSub index lists one per language.
+	def tracks_count(self):
+		if not self.vobsub:
+			return 1
+
+		try:
+			with open(self.path, encoding = "latin-1") as file_index:
+				return sum(1 for line in file_index if line.startswith("id:"))
+		except OSError:
+			return 1
+
+
+extensions_sidecar = ("srt", "ass", "ssa", "sup", "idx")
+
+# What may come between the name of the video and the extension of a
+# sidecar: a language code, and a flag or two
+regex_sidecar = re.compile(r"^(?:\.(?!(?:forced|sdh|cc)$)(?P<language>[A-Za-z]{2,3}(?:-[A-Za-z0-9]{2,4})?))?"
+                           r"(?:\.(?:forced|sdh|cc))*$", re.IGNORECASE)
+
+
+# Match up the sidecars in a directory with the videos they go with, off the
+# names of the files in it. A sidecar that could go with more than one video
+# ("Movie.srt", with "Movie.avi" and "Movie.mp4") is left alone. Returns the
+# sidecars of each video that has any.
+def sidecars_match(path_dir, names, dict_extension_source):
+	dict_videos = {}
+
+	for name in names:
+		root, extension = split_root_extension(name)
+
+		if extension in dict_extension_source and ".vcc-partial-" not in name:
+			dict_videos.setdefault(root, []).append(os.path.join(path_dir, name))
+
+	dict_names_lower = {name.lower(): name for name in names}
+	dict_sidecars = {}
+
+	for name in sorted(names):
+		root, extension = split_root_extension(name)
+
+		if extension not in extensions_sidecar:
+			continue
+
+		parts = root.split(".")
+
+		# The longest name of a video it starts with wins
+		for count in range(len(parts), max(0, len(parts) - 3), -1):
+			root_video = ".".join(parts[:count])
+			match = regex_sidecar.match(root[len(root_video):])
+
+			if not match or root_video not in dict_videos:
+				continue
+
+			if len(dict_videos[root_video]) == 1:
+				name_companion = dict_names_lower.get((root + ".sub").lower()) if extension == "idx" else None
+
+				dict_sidecars.setdefault(dict_videos[root_video][0], []).append(
+					Sidecar(os.path.join(path_dir, name), match.group("language"),
+					        ".forced" in match.group(0).lower(),
+					        (os.path.join(path_dir, name_companion),) if name_companion else ()))
+
+			break
+
+	return {path_file: tuple(list_sidecars) for path_file, list_sidecars in dict_sidecars.items()}
+
+
+# Sidecars of a video, if merging them. Directories walked by process_dir()
+# have their sidecars matched up off the listing at hand; for files found
+# otherwise, the directory is listed once.
+def sidecars_get(path_file):
+	if sidecars_get.container_target is None:
+		return ()
+
+	path_dir = os.path.dirname(path_file)
+
+	with sidecars_get.lock:
+		if path_dir not in sidecars_get.dict_sidecars:
+			try:
+				with os.scandir(path_dir or os.curdir) as entries:
+					names = [entry.name for entry in entries if not entry.is_dir()]
+			except OSError:
+				names = []
+
+			sidecars_list(path_dir, names)
+
+		return sidecars_get.dict_sidecars[path_dir].get(path_file, ())
+
+
+# Note the sidecars in a directory, off the names of the files in it
+def sidecars_list(path_dir, names):
+	dict_extension_source = converter_registry_get().extensions_get(sidecars_get.container_target)
+
+	sidecars_get.dict_sidecars[path_dir] = sidecars_match(path_dir, names, dict_extension_source)
+
+# Set up by main(): the target container, if sidecars are to be merged
+sidecars_get.container_target = None
+# Sidecars found, by directory listed, then video
+sidecars_get.dict_sidecars = {}
+sidecars_get.lock = threading.Lock()
+
+
+# Recurse and yield files within that we have a converter for, along with
+# their stat results. Files are weeded out by their extension straight off
+# the directory listing, so trees full of thumbnails, subtitles and the like
+# cost next to nothing; the subtitles are matched up with their videos off the
+# same listing (see sidecars_get()). Partial files left behind by earlier runs
+# are swept up along the way.
+def process_dir(path, container_target):
+	dict_extension_source = converter_registry_get().extensions_get(container_target)
+	stack_dirs = [path]
+
+	while stack_dirs:
+		path_dir = stack_dirs.pop()
+		list_files = []
+		list_names = []
+
+		try:
+			with os.scandir(path_dir) as entries:
+				for entry in entries:
+					try:
+						# Don't follow symlinks to directories, same as os.walk()
+						if entry.is_dir(follow_symlinks = False):
+							stack_dirs.append(entry.path)
+
+							continue
+
+						list_names.append(entry.name)
+
+						if ".vcc-partial-" in entry.name:
+							# Sweep up after conversions that crashed or were killed, unless we're
+							# only planning
+							if process_dir.sweep and partial_stale(entry):
+								message_info("Deleting \'" + entry.path + "\', left behind by an earlier run")
+
+								file_partial_remove(entry.path)
+						elif split_root_extension(entry.name)[1] in dict_extension_source and entry.is_file():
+							# The stat result is cached in the entry (and on Windows, comes for
+							# free with the listing)
+							list_files.append((entry.path, entry.stat()))
+					except OSError:
+						# Vanished or inaccessible; nothing we can do about it
+						logging.error("Error reading \'" + entry.path + "\': " + str(sys.exc_info()))
+		except OSError:
+			message_error("Error listing directory \'" + path_dir + "\': " + str(sys.exc_info()))
+
+		# Sidecars are matched up off the same listing, so the whole of it is
+		# needed first
+		if list_files and sidecars_get.container_target == container_target:
+			with sidecars_get.lock:
+				sidecars_list(path_dir, list_names)
+
+		yield from list_files
+
+# Cleared by main() when only planning
+process_dir.sweep = True
+
+
+# Yield every file to process from the paths received on the command line, as
+# pairs of path and stat result (None, if we don't have one yet)
+def files_to_process_iterate(files_to_process, container_target):
+	for path in files_to_process:
+		if os.path.isdir(path):
+			yield from process_dir(path, container_target)
+		else:
+			# We got a file, do the needful
+			yield path, None
+
+
+# Watches directories for video files turning up (or changing), and feeds
+# them to the scheduler once they're done being written: once their size and
+# modification time have held for seconds_settle. Uses inotify on Linux, and
+# falls back on looking over the directories every so often elsewhere. Files
+# already there are fed to begin with. The feed goes on until interrupted,
+# yielding None whenever it has nothing for now (see ConversionScheduler.run()).
+class WatchFeed:
+	# inotify events, from sys/inotify.h
+	IN_MODIFY = 0x2
+	IN_CLOSE_WRITE = 0x8
+	IN_MOVED_TO = 0x80
+	IN_CREATE = 0x100
+	IN_Q_OVERFLOW = 0x4000
+	IN_IGNORED = 0x8000
+	IN_ONLYDIR = 0x1000000
+	IN_ISDIR = 0x40000000
+
+	mask_watch = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+
+	seconds_tick = 1
+	seconds_poll = 60
+
+	def __init__(self, paths_dir, container_target, seconds_settle = 10):
+		self.paths_dir = paths_dir
+		self.container_target = container_target
+		self.seconds_settle = seconds_settle
+		self.dict_extension_source = converter_registry_get().extensions_get(container_target)
+
+		# Files being written, with their size and modification time when last
+		# looked at, and since when they've held
+		self.dict_settling = {}
+
+		self.descriptor_inotify = None
+		self.dict_watches = {}
+
+		if platform.system() == "Linux":
+			try:
+				self.inotify_initialize()
+			except OSError:
+				message_error("Could not watch for changes through inotify (" + str(sys.exc_info()[1]) +
+				              "); looking over the directories every " + str(self.seconds_poll) + " seconds instead")
+
+				self.descriptor_inotify = None
+
+		# What polling last saw of each file
+		self.dict_seen = {}
+
+	def inotify_initialize(self):
+		import ctypes
+
+		self.libc = ctypes.CDLL(None, use_errno = True)
+		self.libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+
+		descriptor = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+		if descriptor < 0:
+			raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+		self.descriptor_inotify = descriptor
+
+	# Watch a directory and those within. Returns the files already there.
+	def watch_add(self, path):
+		import ctypes
+
+		list_files = []
+		stack_dirs = [path]
+
+		while stack_dirs:
+			path_dir = stack_dirs.pop()
+			watch = self.libc.inotify_add_watch(self.descriptor_inotify, os.fsencode(path_dir), self.mask_watch)
+
+			if watch < 0:
+				message_error("Could not watch \'" + path_dir + "\': " + os.strerror(ctypes.get_errno()))
+
+				continue
+
+			self.dict_watches[watch] = path_dir
+
+			try:
+				with os.scandir(path_dir) as entries:
+					for entry in entries:
+						if entry.is_dir(follow_symlinks = False):
+							stack_dirs.append(entry.path)
+						else:
+							list_files.append(entry.path)
+			except OSError:
+				message_error("Error listing directory \'" + path_dir + "\': " + str(sys.exc_info()))
+
+		return list_files
+
+	def wanted(self, path_file):
+		return ".vcc-partial-" not in path_file and split_root_extension(path_file)[1] in self.dict_extension_source
+
+	# Keep an eye on a file till it's done being written
+	def settle(self, path_file):
+		if self.wanted(path_file):
+			# Looked at on the next tick
+			self.dict_settling.setdefault(path_file, None)
+
+	# Read what's happened, waiting a tick at the most
+	def events_read(self):
+		import select
+
+		readable, _, _ = select.select((self.descriptor_inotify,), (), (), self.seconds_tick)
+
+		if not readable:
+			return
+
+		try:
+			data = os.read(self.descriptor_inotify, 1 << 16)
+		except BlockingIOError:
+			return
+
+		offset = 0
+
+		while offset < len(data):
+			watch, mask, _, length = struct.unpack_from("iIII", data, offset)
+			name = os.fsdecode(data[offset + 16:offset + 16 + length].rstrip(b"\0"))
+			offset += 16 + length
+
+			if mask & self.IN_Q_OVERFLOW:
+				# Missed some; look over everything once
+				logging.error("Missed changes being watched for; looking over the directories")
+
+				for path in self.paths_dir:
+					for path_file, _ in process_dir(path, self.container_target):
+						self.settle(path_file)
+			elif mask & self.IN_IGNORED:
+				self.dict_watches.pop(watch, None)
+			elif watch in self.dict_watches and name:
+				path = os.path.join(self.dict_watches[watch], name)
+
+				if mask & self.IN_ISDIR:
+					if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+						# Whatever's in there got in before we were watching
+						for path_file in self.watch_add(path):
+							self.settle(path_file)
+				else:
+					self.settle(path)
 
-	result_parse, files_to_process = parser.parse_known_args()
+	# Look over the directories for files that are new or have changed
+	def poll(self):
+		dict_seen = {}
 
-	return result_parse.container, files_to_process
+		for path in self.paths_dir:
+			for path_file, stat_file in process_dir(path, self.container_target):
+				dict_seen[path_file] = (stat_file.st_size, stat_file.st_mtime_ns)
 
+				if self.dict_seen.get(path_file) != dict_seen[path_file]:
+					self.settle(path_file)
 
-# Recurse and process files within
-def process_dir(path, list_failed_conversions, container_target):
-	# If it's a directory, walk through for files below
-	for path_dir, _, file_names in os.walk(path):
-		for file_name in file_names:
-			path_file = os.path.join(path_dir, file_name)
-			container_format_matroska_set(path_file, list_failed_conversions, container_target)
+		self.dict_seen = dict_seen
+
+	# Files that are done being written, as pairs of path and stat result
+	def settled_get(self):
+		time_now = time.monotonic()
+
+		for path_file, state in list(self.dict_settling.items()):
+			try:
+				stat_file = os.stat(path_file)
+			except OSError:
+				# Gone (converted, or moved away) before it settled
+				del self.dict_settling[path_file]
+
+				continue
+
+			signature = (stat_file.st_size, stat_file.st_mtime_ns)
+
+			if state is None or state[0] != signature:
+				self.dict_settling[path_file] = (signature, time_now)
+			elif time_now - state[1] >= self.seconds_settle:
+				del self.dict_settling[path_file]
+
+				# Its sidecars may have turned up since the directory was last listed
+				with sidecars_get.lock:
+					sidecars_get.dict_sidecars.pop(os.path.dirname(path_file), None)
+
+				yield path_file, stat_file
+
+	def paths_get(self):
+		message_info("Watching " + ", ".join("\'" + path + "\'" for path in self.paths_dir) + " for files to convert "
+		             "(" + ("inotify" if self.descriptor_inotify is not None else "polling") + "); interrupt to stop\n")
+
+		# Files already there have long been written, unless they're recent
+		time_now = time.time()
+
+		for path in self.paths_dir:
+			if self.descriptor_inotify is not None:
+				list_files = self.watch_add(path)
+			else:
+				list_files = []
+
+				for path_file, stat_file in process_dir(path, self.container_target):
+					self.dict_seen[path_file] = (stat_file.st_size, stat_file.st_mtime_ns)
+					list_files.append(path_file)
+
+			for path_file in list_files:
+				if self.wanted(path_file):
+					try:
+						stat_file = os.stat(path_file)
+					except OSError:
+						continue
+
+					if time_now - stat_file.st_mtime >= self.seconds_settle:
+						yield path_file, stat_file
+					else:
+						self.settle(path_file)
+
+		time_polled = time.monotonic()
+
+		while True:
+			if self.descriptor_inotify is not None:
+				self.events_read()
+			else:
+				time.sleep(self.seconds_tick)
+
+				if time.monotonic() - time_polled >= self.seconds_poll:
+					self.poll()
+					time_polled = time.monotonic()
+
+			yield from self.settled_get()
+
+			yield None
+
+	def close(self):
+		if self.descriptor_inotify is not None:
+			os.close(self.descriptor_inotify)
+			self.descriptor_inotify = None
+
+
+# Takes files over from invocations started after us (see instance_handoff(), in
+# video_container_convert_instance.py), and feeds them to the scheduler along
+# with those we were started with. Stops taking them once none have come for
+# seconds_linger; those started after that run on their own.
+class InstanceServer:
+	seconds_linger = 10
+	seconds_tick = 1
+
+	def __init__(self, options, container_target):
+		# Only files to be converted the same way are taken over
+		self.options = options
+		self.container_target = container_target
+
+		self.queue_files = queue.Queue()
+		self.lock = threading.Lock()
+		self.listening = True
+		self.time_received = time.monotonic()
+
+		self.path_token = None
+		self.token = None
+
+		if platform.system() == "Linux":
+			self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+			try:
+				# Fails if another is serving
+				self.listener.bind(instance_address_get(name_script_executable_get()))
+				self.listener.listen(socket.SOMAXCONN)
+			except OSError:
+				self.listener.close()
+
+				raise
+		else:
+			import secrets
+
+			self.listener = socket.create_server(("127.0.0.1", 0), backlog = socket.SOMAXCONN)
+			self.token = secrets.token_hex(16)
+
+			try:
+				self.token_write()
+			except OSError:
+				self.listener.close()
+
+				raise
+
+		self.listener.settimeout(self.seconds_tick)
+
+		self.thread = threading.Thread(target = self.serve, name = "instance-server", daemon = True)
+		self.thread.start()
+
+	# Is the token file left behind by an instance that's gone?
+	def token_stale(self):
+		try:
+			with open(self.path_token, encoding = "utf-8") as file_token:
+				return not process_alive(json.load(file_token)["pid"])
+		except FileNotFoundError:
+			return True
+		except (ValueError, KeyError, TypeError):
+			# Half written by one starting up; or garbled, if it's been a while
+			try:
+				return time.time() - os.stat(self.path_token).st_mtime > self.seconds_linger
+			except FileNotFoundError:
+				return True
+
+	# Claim the token file, which only one instance can hold. Raises
+	# FileExistsError if another does.
+	def token_write(self):
+		path_token = instance_path_token_get(name_script_executable_get())
+
+		while True:
+			try:
+				descriptor = os.open(path_token, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+			except FileExistsError:
+				self.path_token = path_token
+
+				if not self.token_stale():
+					self.path_token = None
+
+					raise
+
+				with contextlib.suppress(FileNotFoundError):
+					os.remove(path_token)
+
+				continue
+
+			self.path_token = path_token
+
+			with os.fdopen(descriptor, "w", encoding = "utf-8") as file_token:
+				json.dump({"pid": os.getpid(), "port": self.listener.getsockname()[1], "token": self.token},
+				          file_token)
+
+			return
+
+	def serve(self):
+		with self.listener:
+			while self.listening:
+				try:
+					connection, _ = self.listener.accept()
+				except socket.timeout:
+					continue
+
+				with connection:
+					try:
+						self.receive(connection)
+					except (OSError, ValueError, KeyError, TypeError):
+						logging.error("Error taking files over from another invocation: " + str(sys.exc_info()))
+
+		# Those waiting to be taken on find the connection closed, and run on their own
+
+	def receive(self, connection):
+		import hmac
+
+		connection.settimeout(instance_handoff.seconds_timeout)
+
+		if self.token is None and instance_peer_uid_get(connection) != os.getuid():
+			return
+
+		message = json.loads(connection.makefile("rb").readline())
+
+		if self.token is not None and not hmac.compare_digest(str(message.get("token")), self.token):
+			return
+
+		try:
+			result_parse, files_to_process = cmd_line_parse(message["argv"], message["cwd"])
+		except SystemExit:
+			# Let it report what's wrong itself
+			result_parse = None
+
+		if result_parse is None or vars(result_parse) != self.options:
+			connection.sendall(b"differs\n")
+
+			return
+
+		files_to_process = [os.path.abspath(os.path.join(message["cwd"], path)) for path in files_to_process]
+
+		with self.lock:
+			if not self.listening:
+				return
+
+			self.queue_files.put(files_to_process)
+			self.time_received = time.monotonic()
+
+		connection.sendall(b"ok\n")
+
+	# The files we were started with, then those taken over, as pairs of path
+	# and stat result. Yields None whenever it has nothing for now (see
+	# ConversionScheduler.run()).
+	def paths_get(self, files_to_process):
+		set_files = set(files_to_process)
+
+		yield from files_to_process_iterate(files_to_process, self.container_target)
+
+		while True:
+			try:
+				files_to_process = self.queue_files.get(timeout = self.seconds_tick)
+			except queue.Empty:
+				with self.lock:
+					if self.queue_files.empty() and time.monotonic() - self.time_received >= self.seconds_linger:
+						self.listening = False
+
+						return
+
+				yield None
+
+				continue
+
+			# The same file selected twice, say
+			files_to_process = [path for path in files_to_process if path not in set_files]
+			set_files.update(files_to_process)
+
+			if files_to_process:
+				logging.info("Took over " + ", ".join("\'" + path + "\'" for path in files_to_process) +
+				             " from another invocation")
+
+				yield from files_to_process_iterate(files_to_process, self.container_target)
+
+	def close(self):
+		with self.lock:
+			self.listening = False
+
+		self.thread.join()
+
+		if self.path_token:
+			with contextlib.suppress(OSError):
+				os.remove(self.path_token)
+
+			self.path_token = None
 
 
 def main(argv):
@@ -541,49 +4981,242 @@ def main(argv):
 
 	# We support only Windows and Unix like OSes
 	if is_supported_platform():
-		logging_initialize()
+		result_parse, files_to_process = cmd_line_parse()
+
+		server = None
+
+		if result_parse.single_instance:
+			try:
+				server = InstanceServer(vars(result_parse), result_parse.container)
+			except OSError:
+				# Another started serving since we looked; unless it won't take our files,
+				# there's nothing left for us to do
+				if instance_handoff(name_script_executable_get(), argv[1:]):
+					return exit_code
+
+		logging_initialize(result_parse.verbosity)
+
+		# Paths relative to where we were started from won't do once we move
+		files_to_process = [os.path.abspath(path) for path in files_to_process]
 
 		# Change to the working directory of this Python script. Else, any dependencies will not be found.
 		os.chdir(os.path.dirname(os.path.abspath(sys.argv[0])))
 
-		print("Changing working directory to \'" + os.path.dirname(os.path.abspath(sys.argv[0])) + "\'...\n")
-		logging.info("Changing working directory to \'" + os.path.dirname(os.path.abspath(sys.argv[0])) + "\'...\n")
+		message_info("Changing working directory to \'" + os.path.dirname(os.path.abspath(sys.argv[0])) + "\'...\n")
 
-		container_target, files_to_process = cmd_line_parse()
-
-		if len(files_to_process) >= 1:
-			# Remove duplicates from the source path(s)
-			files_to_process = [*set(files_to_process)]
+		if len(files_to_process) >= 1 or result_parse.plan_executed:
+			# Remove duplicates from the source path(s), keeping them in the order given
+			files_to_process = [*dict.fromkeys(files_to_process)]
 
 			# A list to keep track of files for which conversion to Matroska
 			# format failed
 			list_failed_conversions = []
 
-			for path in files_to_process:
-				if os.path.isdir(path):
-					process_dir(path, list_failed_conversions, container_target)
-				else:
-					# We got a file, do the needful
-					container_format_matroska_set(path, list_failed_conversions, container_target)
+			post_process.verification = result_parse.verification
+
+			# Planning leaves everything as it is, partial files left behind included
+			process_dir.sweep = not result_parse.plan
+
+			converter_registry_get().preflight(result_parse.container)
+
+			sinks = []
+
+			for sink in dict.fromkeys(result_parse.notify or ("desktop",)):
+				if sink == "desktop":
+					sinks.append(NotifySinkDesktop())
+				elif sink == "stdout":
+					sinks.append(NotifySinkStdout())
+
+			if result_parse.notify_drop:
+				try:
+					sinks.append(NotifySinkDrop(result_parse.notify_drop))
+				except OSError:
+					message_error("Could not use the notification directory \'" + result_parse.notify_drop +
+					              "\'. Continuing without it. " + str(sys.exc_info()))
+
+			if sinks:
+				show_toast.notifier = Notifier(sinks, result_parse.notify_interval)
+
+			database = manifest = None
+
+			if result_parse.prober == "header":
+				probe_get.header = HeaderProber()
+
+			if result_parse.sidecars:
+				sidecars_get.container_target = result_parse.container
+
+			try:
+				database = StateDatabase(path_database_get())
+				manifest = Manifest(database)
+
+				converter_registry_get().throughput = ThroughputStats(database)
+
+				if result_parse.probe_cache:
+					probe_get.cache = ProbeCache(database)
+			except (OSError, sqlite3.Error):
+				# We can do without; it only saves time
+				message_error("Could not open the state database. Continuing without the probe cache and manifest. " +
+				              str(sys.exc_info()))
+
+			if result_parse.resume and not manifest:
+				message_error("No manifest to resume from; processing all files")
+
+			disk_space_check.ledger = SpaceLedger()
+
+			if result_parse.nice or result_parse.ionice:
+				process_run.priority = ProcessPriority(result_parse.nice, result_parse.ionice)
+
+			if result_parse.read_limit:
+				try:
+					process_run.throttle = ReadThrottle(result_parse.read_limit * 1024 * 1024)
+				except OSError:
+					message_error("Could not cap what the converters read (" + str(sys.exc_info()[1]) +
+					              "); running them unchecked")
+
+			governor = None
+
+			if result_parse.governor and result_parse.jobs > 1:
+				try:
+					governor = LoadGovernor(result_parse.jobs)
+				except (OSError, ValueError, IndexError):
+					message_error("Could not keep an eye on the system's load (" + str(sys.exc_info()[1]) +
+					              "); running up to " + str(result_parse.jobs) + " conversion(s) at once")
+
+			report = None
+
+			if result_parse.report and not result_parse.plan:
+				try:
+					report = MetricsReport(result_parse.report)
+				except OSError:
+					message_error("Could not open the report file \'" + result_parse.report + "\'. " + str(
+						sys.exc_info()))
+
+			if result_parse.scratch and not result_parse.plan:
+				try:
+					container_format_matroska_set.scratch = ScratchStaging(result_parse.scratch, result_parse.jobs,
+					                                                       disk_space_check.ledger)
+					container_format_matroska_set.scratch.sweep()
+				except OSError:
+					message_error("Could not use the scratch directory \'" + result_parse.scratch + "\'. " + str(
+						sys.exc_info()))
+
+			deduplicator = Deduplicator(result_parse.dedup) if result_parse.dedup else None
+			leases = None
+
+			if result_parse.lease_dir and not result_parse.plan:
+				try:
+					leases = LeaseDirectory(result_parse.lease_dir)
+				except OSError:
+					message_error("Could not use the lease directory \'" + result_parse.lease_dir + "\': " + str(
+						sys.exc_info()))
+
+					exit_code = 1
+
+			scheduler = ConversionScheduler(list_failed_conversions, result_parse.container, result_parse.jobs,
+			                                result_parse.jobs_per_volume, manifest, disk_space_check.ledger, report,
+			                                deduplicator, leases, governor)
+			planner = ConversionPlanner(result_parse.order, result_parse.container, result_parse.jobs,
+			                            result_parse.jobs_per_volume, deduplicator, not result_parse.plan)
+
+			# Track the time taken overall in nano-seconds
+			time_start = time.monotonic_ns()
+
+			feed = None
+
+			if result_parse.watch:
+				feed = WatchFeed(files_to_process, result_parse.container, result_parse.seconds_settle)
+				paths = feed.paths_get()
+			elif result_parse.plan_executed:
+				message_info("Carrying out the plan \'" + result_parse.execute_plan + "\'\n")
+
+				paths = planner.paths_planned(result_parse.plan_executed)
+			elif server:
+				message_info("Taking files over from invocations started with the same options meanwhile\n")
+
+				paths = server.paths_get(files_to_process)
+			else:
+				paths = files_to_process_iterate(files_to_process, result_parse.container)
+
+			if result_parse.resume and manifest:
+				paths = manifest.paths_unfinished(paths, result_parse.container)
+
+			# A plan carried out has its duplicates at hand already
+			if deduplicator and not result_parse.plan_executed:
+				paths = deduplicator.paths_filter(paths)
+
+			if result_parse.order != "walk":
+				paths = planner.paths_plan(paths)
+
+			if result_parse.plan:
+				try:
+					planner.plan_write(paths, result_parse.plan)
+				except OSError:
+					message_error("Could not write the plan \'" + result_parse.plan + "\': " + str(sys.exc_info()))
+
+					exit_code = 1
+			# Converting without the leases asked for would trample on other hosts
+			elif not exit_code:
+				try:
+					scheduler.run(paths)
+				except KeyboardInterrupt:
+					# Jobs running have been seen through by now
+					message_info("Interrupted; stopping\n")
+
+			if feed:
+				feed.close()
+
+			if server:
+				server.close()
+
+			if leases:
+				leases.close()
+
+			if process_run.throttle:
+				process_run.throttle.close()
+				process_run.throttle = None
+
+			process_run.priority = None
+
+			if container_format_matroska_set.scratch:
+				container_format_matroska_set.scratch.close()
+				container_format_matroska_set.scratch = None
+
+			time_wall = time.monotonic_ns() - time_start
+
+			disk_space_check.ledger = None
 			# Slows down the script exit, so disabled for now
 			# show_completion_toast(argv[0])
 
-			stats_print(list_failed_conversions)
+			if not result_parse.plan:
+				stats_print(list_failed_conversions, time_wall if result_parse.jobs > 1 else None)
+
+			if report:
+				report.close()
+
+			probe_get.cache = None
+			probe_get.header = None
+			sidecars_get.container_target = None
+			sidecars_get.dict_sidecars.clear()
+			converter_registry_get().throughput = None
+
+			if database:
+				database.close()
+
+			if show_toast.notifier:
+				show_toast.notifier.close()
+				show_toast.notifier = None
 		else:
-			print("\aThis program requires at least one argument")
-			logging.error("This program requires at least one argument")
+			message_error("This program requires at least one argument")
 
 			exit_code = 1
 	else:
-		print("\aUnsupported OS")
-		logging.error("Unsupported OS")
+		message_error("Unsupported OS")
 
 		exit_code = 1
 
-	logging.shutdown()
+	logging_finalize()
 
 	return exit_code
 
-
 if __name__ == '__main__':
 	main(sys.argv)
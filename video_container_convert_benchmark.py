@@ -0,0 +1,318 @@
+# -------------------------------------------------------------------------------
+# Name        : Video Container Convert - Benchmark
+# Purpose     : Measures the throughput of video_container_convert.py end to end,
+#             : on fixtures generated on the fly
+# Author      : Jayendran Jayamkondam Ramani
+# Copyright   : (c) Jayendran Jayamkondam Ramani
+# Licence     : GPL v3
+# Dependencies: Same as video_container_convert.py, less appdirs (state and logs
+#               are kept in the benchmark's working directory). Stub converters
+#               (the default) need a Unix like OS; use --fixtures ffmpeg and
+#               --tools real to benchmark the real tools elsewhere.
+# -------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import video_container_convert as vcc
+
+
+# Stand-in for ffmpeg, mkvmerge and ffprobe, picked by the name it's invoked
+# with. The converters copy the input to the output at a set rate, reporting
+# progress the way the real tools do; ffprobe makes up a duration from the
+# file size. Each answers the version (and ffmpeg, the formats) check too. Good enough to measure everything but the tools themselves.
+STUB_SOURCE = r'''
+import json, os, sys, time
+
+RATE = float(os.environ.get("VCC_BENCHMARK_STUB_RATE", "0")) * 1000000
+BITRATE = 1000000
+
+name = os.path.basename(sys.argv[0])
+arguments = sys.argv[1:]
+
+
+def copy(path_input, path_output, progress):
+	size = os.path.getsize(path_input)
+	copied = 0
+	time_start = time.monotonic()
+
+	with open(path_input, "rb") as file_input, open(path_output, "wb") as file_output:
+		while True:
+			chunk = file_input.read(1 << 20)
+
+			if not chunk:
+				break
+
+			file_output.write(chunk)
+			copied += len(chunk)
+
+			if RATE:
+				time_behind = copied / RATE - (time.monotonic() - time_start)
+
+				if time_behind > 0:
+					time.sleep(time_behind)
+
+			progress(copied, size)
+
+
+def duration_get(path):
+	return os.path.getsize(path) * 8 / BITRATE
+
+
+if "-version" in arguments or "--version" in arguments:
+	print(name + " version stub")
+elif "-muxers" in arguments:
+	print("File formats:\n E matroska        Matroska\n E mp4             MP4 (MPEG-4 Part 14)\n E webm            WebM")
+elif name.startswith("ffprobe"):
+	path = arguments[arguments.index("-i") + 1]
+	duration = duration_get(path)
+	streams = [{"index": 0, "codec_type": "video", "codec_name": "h264", "duration": str(duration)},
+	           {"index": 1, "codec_type": "audio", "codec_name": "aac", "duration": str(duration)}]
+
+	if "-count_packets" in arguments:
+		streams[0]["nb_read_packets"] = str(int(duration * 25))
+		streams[1]["nb_read_packets"] = str(int(duration * 43))
+
+	print(json.dumps({"format": {"duration": str(duration), "size": str(os.path.getsize(path))}, "streams": streams}))
+elif name.startswith("mkvmerge"):
+	path_output = arguments[arguments.index("-o") + 1]
+
+	def progress(copied, size):
+		print("Progress: " + str(copied * 100 // max(size, 1)) + "%", end = "\r", flush = True)
+
+	copy(arguments[0], path_output, progress)
+elif name.startswith("ffmpeg"):
+	path_input = arguments[arguments.index("-i") + 1]
+	duration = duration_get(path_input)
+
+	def progress(copied, size):
+		seconds = duration * copied / max(size, 1)
+		sys.stderr.write("size=%dkB time=%02d:%02d:%05.2f\r" % (copied // 1024, seconds // 3600, seconds % 3600 // 60,
+		                                                        seconds % 60))
+
+	copy(path_input, arguments[-1], progress)
+else:
+	sys.exit("Unknown tool " + name)
+'''
+
+
+# Write the stub tools into the directory given, and return their paths
+def stubs_write(path_dir):
+	os.makedirs(path_dir, exist_ok = True)
+
+	dict_stubs = {}
+
+	for name in ("ffmpeg", "mkvmerge", "ffprobe"):
+		path_stub = os.path.join(path_dir, name)
+
+		with open(path_stub, "w") as file_stub:
+			file_stub.write("#!" + sys.executable + "\n" + STUB_SOURCE)
+
+		os.chmod(path_stub, os.stat(path_stub).st_mode | stat.S_IXUSR)
+
+		dict_stubs[name] = path_stub
+
+	return dict_stubs
+
+
+# Write a configuration pointing the script at the tools given, instead of the
+# ones it'd find, and return its path
+def config_write(path_dir, dict_tools):
+	path_config = os.path.join(path_dir, "config.json")
+
+	with open(path_config, "w") as file_config:
+		json.dump({"tools": dict_tools}, file_config, indent = "\t")
+
+	return path_config
+
+
+# Generate the fixtures: count files of each format, of about the size given,
+# spread over a few directories, with clutter (thumbnails, subtitles, .nfo)
+# the walk has to wade through. Synthetic fixtures are random data; ffmpeg
+# fixtures are real (test pattern) videos, for benchmarking the real tools.
+def fixtures_generate(path_dir, formats, count, size_mb, clutter, kind, binary_ffmpeg):
+	data_block = os.urandom(1 << 20)
+	size_total = 0
+	count_files = 0
+
+	for format in formats:
+		for index in range(count):
+			path_subdir = os.path.join(path_dir, format, "%03d" % (index // 50))
+			os.makedirs(path_subdir, exist_ok = True)
+
+			path_file = os.path.join(path_subdir, "clip%05d.%s" % (index, format))
+
+			if kind == "ffmpeg":
+				# A clip at 2 Mbps runs for about 4 seconds per MB
+				subprocess.run((binary_ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i",
+				                "testsrc=size=640x360:rate=25:duration=" + str(max(1, int(size_mb * 4))), "-f",
+				                "lavfi", "-i", "sine=duration=" + str(max(1, int(size_mb * 4))), "-b:v", "2M",
+				                "-shortest", path_file), check = True)
+			else:
+				with open(path_file, "wb") as file_fixture:
+					size_left = int(size_mb * (1 << 20))
+
+					while size_left > 0:
+						file_fixture.write(data_block[:size_left])
+						size_left -= len(data_block)
+
+			size_total += os.path.getsize(path_file)
+			count_files += 1
+
+			for index_clutter in range(clutter):
+				with open(os.path.join(path_subdir, "clip%05d-%d.%s" % (
+						index, index_clutter, ("jpg", "srt", "nfo")[index_clutter % 3])), "wb") as file_clutter:
+					file_clutter.write(data_block[:4096])
+
+	return count_files, size_total
+
+
+# Peak resident set size, in bytes, of this process and of its largest child
+def peak_rss_get():
+	try:
+		import resource
+	except ImportError:
+		# Not on Windows
+		return None, None
+
+	# Linux reports kilobytes, macOS bytes
+	scale = 1 if platform.system() == "Darwin" else 1024
+
+	return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+	        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def cmd_line_parse():
+	parser = argparse.ArgumentParser(description = "Benchmarks video_container_convert.py end to end on generated "
+	                                               "fixtures", add_help = True)
+
+	parser.add_argument("--count", type = vcc.positive_int, default = 50,
+	                    help = "Number of files to generate per format (default: 50)")
+	parser.add_argument("--size", type = float, default = 8, dest = "size_mb",
+	                    help = "Size of each file in MiB (default: 8)")
+	parser.add_argument("--formats", default = "avi,mp4,mts,wmv",
+	                    help = "Comma separated source formats to generate (default: avi,mp4,mts,wmv)")
+	parser.add_argument("--clutter", type = int, default = 3,
+	                    help = "Non video files to generate alongside each video (default: 3)")
+	parser.add_argument("--fixtures", choices = ("synthetic", "ffmpeg"), default = "synthetic",
+	                    help = "Generate random data, or real videos with ffmpeg (default: synthetic)")
+	parser.add_argument("--tools", choices = ("stub", "real"), default = "stub",
+	                    help = "Convert with stub tools that mimic the real ones, or the real tools (default: stub)")
+	parser.add_argument("--stub-rate", type = float, default = 0, dest = "stub_rate",
+	                    help = "Rate in MB/s at which the stub converters copy; 0 for as fast as possible (default: 0)")
+	parser.add_argument("--dir", default = None, dest = "path_dir",
+	                    help = "Directory to benchmark in, ideally on the volume of interest (default: a temporary "
+	                           "directory)")
+	parser.add_argument("--keep", action = "store_true", default = False,
+	                    help = "Keep the benchmark directory afterwards")
+	parser.add_argument("--json", action = "store_true", default = False, dest = "output_json",
+	                    help = "Print the results as JSON")
+
+	# Everything else goes to video_container_convert.py, e.g. --jobs 4
+	return parser.parse_known_args()
+
+
+def main():
+	result_parse, arguments_convert = cmd_line_parse()
+
+	# The script moves to its own directory, so relative paths won't do
+	path_dir = os.path.abspath(tempfile.mkdtemp(prefix = "vcc-benchmark-", dir = result_parse.path_dir))
+	path_library = os.path.join(path_dir, "library")
+	path_state = os.path.join(path_dir, "state")
+
+	try:
+		# Real fixtures need the real ffmpeg, whichever tools we benchmark
+		binary_ffmpeg = vcc.ConverterRegistry().binary_get("ffmpeg")
+		arguments_config = []
+
+		if result_parse.tools == "stub":
+			dict_tools = stubs_write(os.path.join(path_dir, "bin"))
+			os.environ["VCC_BENCHMARK_STUB_RATE"] = str(result_parse.stub_rate)
+
+			arguments_config = ["--config", config_write(path_dir, dict_tools)]
+
+		print("Generating fixtures in \'" + path_library + "\'...")
+
+		time_start = time.monotonic()
+		count_files, size_total = fixtures_generate(path_library, result_parse.formats.split(","), result_parse.count,
+		                                            result_parse.size_mb, result_parse.clutter, result_parse.fixtures,
+		                                            binary_ffmpeg)
+		seconds_generate = time.monotonic() - time_start
+
+		# Keep the script's log and state out of the user's directories
+		vcc.app_dirs_get.dirs = types.SimpleNamespace(user_log_dir = os.path.join(path_state, "log"),
+		                                              user_data_dir = os.path.join(path_state, "data"),
+		                                              user_config_dir = os.path.join(path_state, "config"))
+
+		# The walk alone, to tell discovery overhead from the rest
+		time_start = time.monotonic()
+		vcc.converter_registry_get(arguments_config[1] if arguments_config else None)
+		count_walked = sum(1 for _ in vcc.process_dir(path_library, "mkv"))
+		seconds_walk = time.monotonic() - time_start
+
+		path_report = os.path.join(path_dir, "report.jsonl")
+		sys.argv = [vcc.__file__, "--container", "mkv", "--report", path_report, *arguments_config, *arguments_convert,
+		            path_library]
+
+		# The script's chatter isn't what we're here for
+		with open(os.path.join(path_dir, "output.txt"), "w") as file_output:
+			stdout = sys.stdout
+			sys.stdout = file_output
+
+			try:
+				time_start = time.monotonic()
+				exit_code = vcc.main(sys.argv)
+				seconds_run = time.monotonic() - time_start
+			finally:
+				sys.stdout = stdout
+
+		with open(path_report) as file_report:
+			summary = [json.loads(line) for line in file_report][-1]["summary"]
+
+		rss_self, rss_children = peak_rss_get()
+
+		results = {"files": count_files, "bytes": size_total, "seconds_generate": seconds_generate,
+		           "files_walked": count_walked, "seconds_walk": seconds_walk, "seconds_run": seconds_run,
+		           "exit_code": exit_code, "files_per_second": count_files / seconds_run,
+		           "mb_per_second": size_total / seconds_run / 1000000, "outcomes": summary["outcomes"],
+		           "seconds_per_file_stages": {stage: seconds / max(summary["files"], 1)
+		                                       for stage, seconds in summary["seconds_stages"].items()},
+		           "seconds_per_file": summary["seconds_total"], "peak_rss_self": rss_self,
+		           "peak_rss_children": rss_children, "arguments": arguments_convert}
+
+		if result_parse.output_json:
+			print(json.dumps(results, indent = "\t"))
+		else:
+			print("Converted " + str(count_files) + " file(s), " + vcc.sizeof_fmt(size_total) + " in " + str(
+				round(seconds_run, 2)) + "s: " + str(round(results["files_per_second"], 2)) + " files/s, " + str(
+				round(results["mb_per_second"], 2)) + " MB/s")
+			print("Outcomes: " + str(summary["outcomes"]))
+			print("Walk alone: " + str(count_walked) + " file(s) in " + str(round(seconds_walk, 3)) + "s")
+			print("Time per file by stage: " + ", ".join(
+				stage + " " + str(round(seconds * 1000, 2)) + "ms" for stage, seconds in
+				results["seconds_per_file_stages"].items()))
+			print("Time per file: median " + str(round(summary["seconds_total"]["p50"] or 0, 3)) + "s, 90th percentile " +
+			      str(round(summary["seconds_total"]["p90"] or 0, 3)) + "s")
+
+			if rss_self is not None:
+				print("Peak RSS: " + vcc.sizeof_fmt(rss_self) + " (script), " + vcc.sizeof_fmt(
+					rss_children) + " (largest tool)")
+	finally:
+		if result_parse.keep:
+			print("Kept the benchmark directory \'" + path_dir + "\'")
+		else:
+			shutil.rmtree(path_dir, ignore_errors = True)
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,105 @@
+# -------------------------------------------------------------------------------
+# Name        : Video Container Convert - Instance
+# Purpose     : Hands the files over to the instance of video_container_convert.py
+#             : already running with --single-instance; runs the script itself
+#             : only if there's none to take them. Point file managers that
+#             : start a command per file at this rather than at the script, so
+#             : each of those pays for connecting, and nothing else.
+# Author      : Jayendran Jayamkondam Ramani
+# Copyright   : (c) Jayendran Jayamkondam Ramani
+# Licence     : GPL v3
+# Dependencies: None but video_container_convert.py, next to this
+# -------------------------------------------------------------------------------
+import json
+import os
+import socket
+import struct
+import sys
+
+
+# Invocations started one per file (from a file manager's context menu, say)
+# with --single-instance hand their files over to the instance already running
+# with the same options, instead of each starting a batch of its own; see
+# instance_handoff() and InstanceServer (in video_container_convert.py). On
+# Linux, the instance listens on a Unix socket in the abstract namespace, so
+# there's no file left behind to go stale, and only deals with processes of the
+# same user. Elsewhere, it listens on the loopback, with the port and a token to
+# present written to a file in the (per user) temporary directory. Both are
+# named after the script (name_script), so copies renamed don't mix.
+def instance_address_get(name_script):
+	return "\0" + name_script + "-instance-" + str(os.getuid())
+
+
+def instance_path_token_get(name_script):
+	import tempfile
+
+	return os.path.join(tempfile.gettempdir(), name_script + "-instance.json")
+
+
+# User ID of the process at the other end of a Unix socket
+def instance_peer_uid_get(connection):
+	_, uid, _ = struct.unpack("3i", connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+	                                                      struct.calcsize("3i")))
+
+	return uid
+
+
+# Hand the command line over to the instance already running. Returns whether
+# it took the files on; if not, we're on our own. Runs before anything else is
+# set up (or imported), so keep it light.
+def instance_handoff(name_script, argv):
+	message = {"argv": argv, "cwd": os.getcwd()}
+
+	try:
+		if sys.platform.startswith("linux"):
+			connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			address = instance_address_get(name_script)
+		else:
+			with open(instance_path_token_get(name_script), encoding = "utf-8") as file_token:
+				token = json.load(file_token)
+
+			message["token"] = token["token"]
+			connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+			address = ("127.0.0.1", token["port"])
+
+		with connection:
+			connection.settimeout(instance_handoff.seconds_timeout)
+			connection.connect(address)
+
+			# Not for another user's to convert
+			if connection.family == socket.AF_UNIX and instance_peer_uid_get(connection) != os.getuid():
+				return False
+
+			connection.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+			return connection.makefile("rb").readline().strip() == b"ok"
+	except (OSError, ValueError, KeyError, TypeError):
+		return False
+
+instance_handoff.seconds_timeout = 10
+
+
+# The script we hand over for, or stand in for: named as we are, less our
+# suffix (so it follows the pair being renamed together)
+def name_script_get():
+	# Use realpath instead to get through symlinks
+	return os.path.basename(os.path.realpath(__file__)).partition(".")[0].rpartition("_instance")[0]
+
+
+def main(argv):
+	name_script = name_script_get()
+
+	if "--single-instance" in argv[1:] and instance_handoff(name_script, argv[1:]):
+		return 0
+
+	# None to take the files; load the script (compiled once, and cached) and
+	# run it as if started directly. It won't try handing them over again.
+	import importlib
+
+	sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+	return importlib.import_module(name_script).main(argv)
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))